@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 14:03:17 2026
+
+@author: cyrilvallez
+"""
+
+import asyncio
+import aiohttp
+from urllib.parse import urlsplit
+from collections import defaultdict
+
+# Default maximum number of simultaneous requests, in total and per host
+MAX_CONNECTIONS = 100
+MAX_PER_HOST = 8
+
+# Default timeout (in seconds) for connecting to a server, and for each read
+TIMEOUT = 10
+
+# Default maximum time (in seconds) for resolving a single URL, with all its redirections
+URL_TIMEOUT = 30
+
+
+async def _follow(session: aiohttp.ClientSession, url: str, max_redirects: int) -> tuple[str, bool]:
+    """
+    Follow the redirections of `url` and return the final URL, or None if this fails.
+    We first try a HEAD request, and fall back to GET for servers not supporting it.
+    Also return whether the failure was a timeout (which may succeed later), and not
+    an answer from the server.
+    """
+
+    timed_out = False
+    for method in (session.head, session.get):
+        try:
+            async with method(url, allow_redirects=True, max_redirects=max_redirects) as response:
+                if response.status < 400:
+                    return str(response.url), False
+                timed_out = False
+        except asyncio.TimeoutError:
+            timed_out = True
+        except (aiohttp.ClientError, ValueError):
+            timed_out = False
+
+    return None, timed_out
+
+
+
+async def _resolve(session: aiohttp.ClientSession, url: str, semaphore: asyncio.Semaphore,
+                   host_semaphore: asyncio.Semaphore, max_redirects: int, url_timeout: float) -> tuple[str, bool]:
+    """
+    Resolve `url` (see `_follow`) once a request to its host can be sent, in at most `url_timeout`
+    seconds.
+    """
+
+    # The host slot is taken first, so that the requests waiting for a busy host do not hold
+    # global slots which requests to other hosts could use. The timeout only starts once the
+    # request can actually be sent, so that waiting for the other requests does not count.
+    async with host_semaphore, semaphore:
+        try:
+            return await asyncio.wait_for(_follow(session, url, max_redirects), url_timeout)
+        except asyncio.TimeoutError:
+            return None, True
+
+
+
+async def _resolve_all(urls: list[str], max_connections: int, max_per_host: int, timeout: float,
+                       url_timeout: float, max_redirects: int) -> list[tuple[str, bool]]:
+    """
+    Resolve all `urls` concurrently over a single connection pool.
+    """
+
+    # A global semaphore caps the total number of simultaneous requests, and one semaphore
+    # per host of the short URLs caps the number of simultaneous requests to each shortener.
+    # They are acquired before the requests start, so that requests never wait for a
+    # connection of the pool (which has the same size) once their timeouts run.
+    semaphore = asyncio.Semaphore(max_connections)
+    host_semaphores = defaultdict(lambda: asyncio.Semaphore(max_per_host))
+    connector = aiohttp.TCPConnector(limit=max_connections, limit_per_host=0)
+    # Timeouts on each connection and read, and not on the whole request (which would include
+    # the time waiting for a free connection when redirections lead to the same host). The
+    # whole resolution is bounded by `url_timeout` in `_resolve`.
+    client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        tasks = [_resolve(session, url, semaphore, host_semaphores[urlsplit(url).netloc], max_redirects,
+                          url_timeout)
+                 for url in urls]
+        return await asyncio.gather(*tasks)
+
+
+
+def expand_urls(urls: list[str], max_connections: int = MAX_CONNECTIONS, max_per_host: int = MAX_PER_HOST,
+                timeout: float = TIMEOUT, url_timeout: float = URL_TIMEOUT, max_redirects: int = 10) -> dict:
+    """
+    Expand a batch of (short) URLs concurrently, by following their HTTP redirections.
+
+    Parameters
+    ----------
+    urls : list[str]
+        The URLs to expand. Duplicates are only resolved once.
+    max_connections : int, optional
+        The maximum number of simultaneous requests. The default is MAX_CONNECTIONS.
+    max_per_host : int, optional
+        The maximum number of simultaneous requests to the same host. The default is MAX_PER_HOST.
+    timeout : float, optional
+        Timeout in seconds for connecting to each server, and for each read. The default is TIMEOUT.
+    url_timeout : float, optional
+        Maximum time in seconds for resolving each URL, with all its redirections, once its
+        request is sent. The default is URL_TIMEOUT.
+    max_redirects : int, optional
+        The maximum number of redirections to follow. The default is 10.
+
+    Returns
+    -------
+    dict
+        Mapping from each URL to its expanded version, or None if the expansion failed.
+        URLs which timed out are not in the mapping, since they may be expanded later.
+
+    """
+
+    unique = list(dict.fromkeys(urls))
+    if len(unique) == 0:
+        return {}
+
+    results = asyncio.run(_resolve_all(unique, max_connections, max_per_host, timeout, url_timeout, max_redirects))
+
+    return {url: long for url, (long, timed_out) in zip(unique, results) if not timed_out}
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 19:02:13 2026
+
+@author: cyrilvallez
+"""
+
+import os
+import json
+import threading
+
+
+def manifest_path(filename: str, folder: str) -> str:
+    """
+    Return the path of the checkpoint manifest of the query saved under `filename`
+    in `folder` (see `utils.format_filename`). This is a hidden file, so that it
+    is ignored when processing the folder.
+    """
+
+    if folder[-1] != '/':
+        folder += '/'
+    return folder + '.' + filename + '.checkpoint.json'
+
+
+
+class Checkpoint(object):
+    """
+    Manifest recording the progress of a query to the Twitter API, split into
+    multiple intervals (one output file each). For each interval, we record the
+    pagination token of the next page to request, the number of pages and tweets
+    already written, and the size of the output file at that point. This allows to
+    resume a query in the middle of an interval after a crash.
+
+    `job` describes the query (query, dates, etc.), and a manifest can only be
+    resumed with the same job. Intervals can be updated from multiple threads.
+    """
+
+    def __init__(self, path: str, job: dict):
+
+        self.path = path
+        self.job = job
+        self.intervals = {}
+        self.lock = threading.RLock()
+
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                manifest = json.load(file)
+            # Round trip through json, so that e.g. tuples and lists compare equal
+            if manifest['job'] != json.loads(json.dumps(job)):
+                raise ValueError((f'The checkpoint {path} corresponds to another query. Remove '
+                                  'it or choose another name.'))
+            self.intervals = manifest['intervals']
+
+
+    @property
+    def resumed(self) -> bool:
+        """
+        Whether some progress was already recorded.
+        """
+
+        return len(self.intervals) > 0
+
+
+    @property
+    def done(self) -> bool:
+        """
+        Whether all intervals recorded in the manifest are complete.
+        """
+
+        return self.resumed and all(state['done'] for state in self.intervals.values())
+
+
+    def state(self, filename: str) -> dict:
+        """
+        Return the progress of the interval saved in `filename`.
+
+        Parameters
+        ----------
+        filename : str
+            The output file of the interval.
+
+        Returns
+        -------
+        dict
+            The 'next_token', 'pages', 'tweets', 'size' and 'done' entries of the interval.
+
+        """
+
+        key = os.path.basename(filename)
+        with self.lock:
+            if key not in self.intervals:
+                self.intervals[key] = {'next_token': None, 'pages': 0, 'tweets': 0, 'size': 0, 'done': False}
+            return self.intervals[key]
+
+
+    def update(self, filename: str, **kwargs) -> None:
+        """
+        Update the progress of the interval saved in `filename` (see `state`), and
+        write the manifest to disk.
+        """
+
+        with self.lock:
+            self.state(filename).update(kwargs)
+            self.save()
+
+
+    def save(self) -> None:
+        """
+        Atomically write the manifest to disk.
+        """
+
+        tmp = self.path + '.tmp'
+        with self.lock, open(tmp, 'w') as file:
+            json.dump({'job': self.job, 'intervals': self.intervals}, file, indent=1)
+            file.flush()
+            os.fsync(file.fileno())
+            os.replace(tmp, self.path)
+
+
+    def summary(self) -> str:
+        """
+        Return a short human-readable summary of the progress.
+        """
+
+        done = sum(state['done'] for state in self.intervals.values())
+        tweets = sum(state['tweets'] for state in self.intervals.values())
+        pages = sum(state['pages'] for state in self.intervals.values())
+        return f'Checkpoint: {done}/{len(self.intervals)} intervals complete, {tweets} tweets in {pages} pages.'
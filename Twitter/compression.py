@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 21:37:50 2026
+
+@author: cyrilvallez
+"""
+
+import os
+import io
+import bz2
+import gzip
+import zlib
+
+# Optional dependency, only needed for zstd compressed files
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Supported compressions, and the corresponding file extension
+EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst', 'bz2': '.bz2'}
+
+# Default compression levels
+LEVELS = {'gzip': 6, 'zstd': 3, 'bz2': 9}
+
+# Number of threads used to compress zstd files (-1 means all cores)
+ZSTD_THREADS = -1
+
+# Number of bytes of text kept in memory before being written to the file
+BUFFER_SIZE = 1024**2
+
+
+def compression_of(path: str) -> str:
+    """
+    Infer the compression of a file from its extension.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+
+    Returns
+    -------
+    str
+        The compression, one of EXTENSIONS, or None if the file is not compressed.
+
+    """
+
+    for compression, extension in EXTENSIONS.items():
+        if path.endswith(extension):
+            return compression
+    return None
+
+
+
+def strip_extension(path: str) -> str:
+    """
+    Remove the compression extension of `path` (if any), e.g. 'tweets.json.gz' -> 'tweets.json'.
+    """
+
+    compression = compression_of(path)
+    return path[:-len(EXTENSIONS[compression])] if compression is not None else path
+
+
+
+def with_extension(path: str, compression: str = None) -> str:
+    """
+    Replace the compression extension of `path` by the one of `compression` (or
+    remove it if `compression` is None).
+    """
+
+    path = strip_extension(path)
+    return path + EXTENSIONS[compression] if compression is not None else path
+
+
+
+def _check(compression: str) -> None:
+
+    if compression is not None and compression not in EXTENSIONS:
+        raise ValueError(f'The compression must be None or one of {list(EXTENSIONS.keys())}.')
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError('zstd files require the zstandard package (`pip install zstandard`).')
+
+
+
+def reader(raw, compression: str):
+    """
+    Return a binary stream of the decompressed content of the file object `raw`.
+    Closing the stream does not close `raw`. Files made of multiple gzip members
+    or zstd frames are read entirely.
+
+    Parameters
+    ----------
+    raw : file object
+        The compressed file, opened in binary mode.
+    compression : str
+        The compression, one of EXTENSIONS, or None.
+
+    Returns
+    -------
+    file object
+        The decompressed stream (`raw` itself if `compression` is None).
+
+    """
+
+    _check(compression)
+    if compression is None:
+        return raw
+    elif compression == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    elif compression == 'bz2':
+        return bz2.BZ2File(raw, mode='rb')
+    else:
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=False)
+        return io.BufferedReader(stream)
+
+
+
+def open_file(path: str, mode: str = 'rb', compression: str = 'infer'):
+    """
+    Open a file which may be compressed, with streaming (de)compression. This can
+    be used as the builtin `open` (text modes use utf-8). zstd files are compressed
+    with ZSTD_THREADS threads.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+    mode : str, optional
+        One of 'rb', 'rt', 'wb', 'wt', 'ab', 'at'. The default is 'rb'.
+    compression : str, optional
+        The compression, one of EXTENSIONS, or None. By default, it is inferred from
+        the extension of `path`.
+
+    Returns
+    -------
+    file object
+        The file.
+
+    """
+
+    if compression == 'infer':
+        compression = compression_of(path)
+    _check(compression)
+    binary_mode = mode[0] + 'b'
+
+    if compression is None:
+        file = open(path, binary_mode)
+    elif compression == 'gzip':
+        file = gzip.open(path, binary_mode, compresslevel=LEVELS['gzip'])
+    elif compression == 'bz2':
+        file = bz2.open(path, binary_mode, compresslevel=LEVELS['bz2'])
+    elif mode[0] == 'r':
+        stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True,
+                                                            closefd=True)
+        file = io.BufferedReader(stream)
+    else:
+        compressor = zstandard.ZstdCompressor(level=LEVELS['zstd'], threads=ZSTD_THREADS)
+        file = compressor.stream_writer(open(path, binary_mode), closefd=True)
+
+    if mode.endswith('t'):
+        return io.TextIOWrapper(file, encoding='utf-8')
+    return file
+
+
+
+def _compressor(compression: str, level: int):
+    """
+    Return a new compressor object, producing a complete gzip member or zstd frame
+    once flushed.
+    """
+
+    _check(compression)
+    if compression == 'gzip':
+        # wbits=31 gives the gzip format (header and trailer)
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    elif compression == 'bz2':
+        return bz2.BZ2Compressor(level)
+    else:
+        return zstandard.ZstdCompressor(level=level, threads=ZSTD_THREADS).compressobj()
+
+
+
+class LineSink(object):
+    """
+    Append lines of text to a file, through a single file handle. Lines are kept in
+    a buffer of about `buffer_size` bytes and written in batches. If `compression` is
+    given (by default, it is inferred from the extension of `path`), the file is
+    compressed on the fly. Use `mode='w'` to overwrite the file instead of appending
+    to it.
+
+    `checkpoint` makes sure that everything written so far is on disk, and returns
+    the size of the file. For compressed files, the current gzip member (or zstd frame)
+    is then ended, so that the file truncated to this size is always valid (multiple
+    members/frames are read as a single stream, see `reader`).
+    """
+
+    def __init__(self, path: str, compression: str = 'infer', level: int = None,
+                 buffer_size: int = BUFFER_SIZE, mode: str = 'a'):
+
+        if compression == 'infer':
+            compression = compression_of(path)
+        _check(compression)
+
+        self.path = path
+        self.compression = compression
+        self.level = level if level is not None else LEVELS.get(compression)
+        self.buffer_size = buffer_size
+        self.file = open(path, mode + 'b')
+        self.buffer = []
+        self.buffered = 0
+        # Created lazily for each member/frame
+        self.compressor = None
+
+
+    def write(self, line: str) -> None:
+        """
+        Write a line (the new line character is added).
+        """
+
+        self.buffer.append(line)
+        self.buffered += len(line) + 1
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+
+    def write_lines(self, lines) -> None:
+        """
+        Write all `lines` (the new line characters are added).
+        """
+
+        for line in lines:
+            self.write(line)
+
+
+    def flush(self) -> None:
+        """
+        Pass the buffered lines to the compressor (if any) and the file.
+        """
+
+        if len(self.buffer) == 0:
+            return
+
+        data = ('\n'.join(self.buffer) + '\n').encode('utf-8')
+        self.buffer = []
+        self.buffered = 0
+
+        if self.compression is None:
+            self.file.write(data)
+        else:
+            if self.compressor is None:
+                self.compressor = _compressor(self.compression, self.level)
+            self.file.write(self.compressor.compress(data))
+
+
+    def _end_member(self) -> None:
+
+        if self.compressor is not None:
+            self.file.write(self.compressor.flush())
+            self.compressor = None
+
+
+    def checkpoint(self) -> int:
+        """
+        Write everything to disk (with fsync), and return the size of the file.
+        """
+
+        self.flush()
+        self._end_member()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+
+    def close(self) -> None:
+
+        self.flush()
+        self._end_member()
+        self.file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:05:32 2026
+
+@author: cyrilvallez
+"""
+
+import os
+import functools
+import numpy as np
+
+
+class TweetIndex(object):
+    """
+    Persistent index of the tweet ids already processed, used to skip tweets present in
+    multiple raw files (overlapping queries, reruns, etc.). Ids are stored as a sorted
+    uint64 array (8 bytes per tweet, plus 4 bytes for the index of the file the tweet
+    was kept from), so that lookups are binary searches and the index never needs to
+    load previous outputs.
+
+    Tweets are `claim`ed when they are read. Claims are kept in memory (`pending`) until
+    `merge` is called, which should be done once the outputs of a file are complete.
+    Keeping the file each tweet was kept from allows to process a file again: its own
+    tweets are first removed from the index with `forget`.
+    """
+
+    def __init__(self, path: str):
+
+        self.path = path
+        if os.path.exists(path):
+            with np.load(path) as data:
+                self.ids = data['ids']
+                self.owners = data['owners']
+                self.files = list(data['files'])
+        else:
+            self.ids = np.empty(0, dtype=np.uint64)
+            self.owners = np.empty(0, dtype=np.uint32)
+            self.files = []
+        # Mapping from tweet id to the index of the file in `files`, for the tweets
+        # claimed since the last merge
+        self.pending = {}
+        self.codes = {file: i for i, file in enumerate(self.files)}
+
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self.pending)
+
+
+    def _stored(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Return a boolean mask of the `ids` which are in the merged index.
+        """
+
+        if len(self.ids) == 0:
+            return np.zeros(len(ids), dtype=bool)
+        positions = np.searchsorted(self.ids, ids)
+        positions[positions == len(self.ids)] = 0
+        return self.ids[positions] == ids
+
+
+    def __contains__(self, tweet_id: int) -> bool:
+
+        if tweet_id in self.pending:
+            return True
+        position = np.searchsorted(self.ids, np.uint64(tweet_id))
+        return position < len(self.ids) and self.ids[position] == tweet_id
+
+
+    def _code(self, filename: str) -> int:
+
+        filename = os.path.abspath(filename)
+        if filename not in self.codes:
+            self.codes[filename] = len(self.files)
+            self.files.append(filename)
+        return self.codes[filename]
+
+
+    def claim(self, tweet_id: int, filename: str) -> bool:
+        """
+        Record that the tweet `tweet_id` is kept from `filename`, if it was not already
+        seen.
+
+        Parameters
+        ----------
+        tweet_id : int
+            The id of the tweet.
+        filename : str
+            The file the tweet was read from.
+
+        Returns
+        -------
+        bool
+            Whether the tweet is new (and should be kept).
+
+        """
+
+        if tweet_id in self:
+            return False
+        self.pending[tweet_id] = self._code(filename)
+        return True
+
+
+    def claim_new(self, ids: np.ndarray, filename: str) -> np.ndarray:
+        """
+        Claim all `ids` (which must be distinct) which were not already seen, at once.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean mask of the ids which are new (and were claimed).
+
+        """
+
+        ids = np.asarray(ids, dtype=np.uint64)
+        new = ~self._stored(ids)
+        new[new] = [tweet_id not in self.pending for tweet_id in ids[new].tolist()]
+        code = self._code(filename)
+        self.pending.update(dict.fromkeys(ids[new].tolist(), code))
+        return new
+
+
+    def merge(self) -> None:
+        """
+        Add the pending claims to the sorted index.
+        """
+
+        if len(self.pending) == 0:
+            return
+        ids = np.fromiter(self.pending.keys(), dtype=np.uint64, count=len(self.pending))
+        owners = np.fromiter(self.pending.values(), dtype=np.uint32, count=len(self.pending))
+        order = np.argsort(ids)
+        ids, owners = ids[order], owners[order]
+        positions = np.searchsorted(self.ids, ids)
+        self.ids = np.insert(self.ids, positions, ids)
+        self.owners = np.insert(self.owners, positions, owners)
+        self.pending = {}
+
+
+    def forget(self, filenames: list[str]) -> None:
+        """
+        Remove the tweets kept from `filenames` (including pending claims), so that
+        those files can be processed again.
+        """
+
+        codes = [self.codes[file] for file in map(os.path.abspath, filenames) if file in self.codes]
+        if len(codes) == 0:
+            return
+        mask = ~np.isin(self.owners, codes)
+        self.ids, self.owners = self.ids[mask], self.owners[mask]
+        self.pending = {tweet_id: code for tweet_id, code in self.pending.items() if code not in codes}
+
+
+    def save(self) -> None:
+        """
+        Merge the pending claims, and atomically write the index to disk.
+        """
+
+        self.merge()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as file:
+            np.savez(file, ids=self.ids, owners=self.owners, files=np.array(self.files, dtype=str))
+        os.replace(tmp, self.path)
+
+
+
+@functools.lru_cache(maxsize=1)
+def load_index(path: str) -> TweetIndex:
+    """
+    Return the index saved at `path`. It is only loaded once per process (this is
+    used by the worker processes, which only read the index).
+    """
+
+    return TweetIndex(path)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 18:20:47 2026
+
+@author: cyrilvallez
+"""
+
+import functools
+import tldextract
+from tldextract.remote import lenient_netloc
+
+# Path to a local copy of the public suffix list (https://publicsuffix.org/list/). If None,
+# the snapshot bundled with tldextract is used. In both cases, the network is never accessed.
+SUFFIX_LIST = None
+
+# Maximum number of hosts for which the domain is kept in memory
+MAX_HOSTS = 200_000
+
+
+@functools.lru_cache(maxsize=1)
+def get_extractor(suffix_list: str = SUFFIX_LIST) -> tldextract.TLDExtract:
+    """
+    Return a domain extractor working offline, from the suffix list in the file
+    `suffix_list`, or from the snapshot bundled with tldextract if it is None.
+    The extractor is only created once.
+
+    Parameters
+    ----------
+    suffix_list : str, optional
+        Path to a local copy of the public suffix list. The default is SUFFIX_LIST.
+
+    Returns
+    -------
+    tldextract.TLDExtract
+        The extractor.
+
+    """
+
+    urls = () if suffix_list is None else ('file://' + suffix_list,)
+    # Without cache dir, the suffix list is not written to (or read from) disk
+    return tldextract.TLDExtract(cache_dir=None, suffix_list_urls=urls, fallback_to_snapshot=True)
+
+
+
+@functools.lru_cache(maxsize=MAX_HOSTS)
+def host_domain(host: str) -> str:
+    """
+    Returns the domain and domain suffix of a host (e.g. 'www.bbc.co.uk' -> 'bbc.co.uk').
+    Results are cached, since a small number of hosts account for most URLs.
+
+    Parameters
+    ----------
+    host : str
+        The host.
+
+    Returns
+    -------
+    str
+        The domain and suffix.
+
+    """
+
+    parsing = get_extractor()(host)
+    # Join the domain and suffix into a single string
+    return '.'.join(part for part in parsing[1:] if part)
+
+
+
+def get_domain_and_suffix(urls: list[str]) -> list[str]:
+    """
+    Returns the domain and domain suffix of URLs. This is the same as using
+    `tldextract.extract` on each URL, but each host is only parsed once.
+
+    Parameters
+    ----------
+    urls : list[str]
+        The URLs to extract data from.
+
+    Returns
+    -------
+    domain : list[str]
+        The domain and suffix associated with each URL.
+
+    """
+
+    return [host_domain(lenient_netloc(url)) for url in urls]
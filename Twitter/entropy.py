@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 16:03:52 2026
+
+@author: cyrilvallez
+"""
+
+import numpy as np
+
+
+def _counts(codes: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """
+    Return the number of times each of `keys` appears in `codes` (all keys must appear).
+    """
+
+    uniques, counts = np.unique(codes, return_counts=True)
+    return counts[np.searchsorted(uniques, keys)]
+
+
+
+def transfer_entropy(X: np.ndarray, Y: np.ndarray, alphabet: int = None) -> np.ndarray:
+    """
+    Simple transfer entropy from X to Y with naive probability estimation, only looking at
+    the current and previous time indices, as `TE(X, Y)` in `Utils/entropy.jl`. The series
+    must be small non-negative integers. `X` and `Y` are broadcast against each other, so
+    that e.g. one target can be compared to a whole matrix of sources at once.
+
+    Instead of counting each state by scanning the series again, (Y[t+1], Y[t], X[t]) is
+    encoded into a single integer (with the index of the row), and the states observed in
+    all rows are counted at once with `np.unique`, so that memory and time only depend on
+    the length of the series, and not on the number of possible states. The other counts
+    are computed in the same way (the Julia version also includes the last time index in the
+    probabilities of (Y[t], X[t]) and Y[t]). Each term is then computed with the same
+    operations as in the Julia version, and terms are summed one after the other, in the
+    order of the states (the Julia version sums them in the order of a Dict). Results are
+    thus bit-exact with a sequential version summing in this order and using `np.log2`, but
+    not necessarily with the Julia version (whose `log2`, as `math.log2`, may differ from
+    `np.log2` by one ulp).
+
+    Parameters
+    ----------
+    X : np.ndarray
+        The source series, of shape (..., N).
+    Y : np.ndarray
+        The target series, of shape (..., N).
+    alphabet : int, optional
+        The number of possible values of the series. Give None to use the maximum value + 1.
+        The default is None.
+
+    Raises
+    ------
+    ValueError
+        If some values are negative or not smaller than `alphabet`, or if there are too many
+        possible states to encode them.
+
+    Returns
+    -------
+    np.ndarray
+        The transfer entropy of each pair of series, of the broadcast shape of `X` and `Y`
+        without the last axis.
+
+    """
+
+    X, Y = np.broadcast_arrays(np.asarray(X), np.asarray(Y))
+    shape = X.shape[:-1]
+    N = X.shape[-1]
+    X = X.reshape(-1, N).astype(np.int64)
+    Y = Y.reshape(-1, N).astype(np.int64)
+    rows = len(X)
+    if N < 2 or rows == 0:
+        return np.zeros(shape)
+    if min(X.min(), Y.min()) < 0:
+        raise ValueError('The values of the series must be non-negative.')
+    if alphabet is None:
+        alphabet = int(max(X.max(), Y.max())) + 1
+    elif max(X.max(), Y.max()) >= alphabet:
+        raise ValueError(f'The values of the series must be smaller than the alphabet ({alphabet}).')
+    K = alphabet
+    if rows*K**3 >= np.iinfo(np.int64).max:
+        raise ValueError('The alphabet is too large to encode the states of all the series.')
+
+    # Observed states (Y[t+1], Y[t], X[t]) for t < N-1, sorted by row then state, and their counts
+    row = np.arange(rows)[:, None]
+    codes = ((row*K + Y[:, 1:])*K + Y[:, :-1])*K + X[:, :-1]
+    states, joint = np.unique(codes, return_counts=True)
+    state_rows, next_current, source = states // K**3, states // K, states % K
+    current = next_current % K
+
+    # Counts of (Y[t+1], Y[t]) for t < N-1, and of (Y[t], X[t]) and Y[t] for all t
+    N_next_current = _counts((row*K + Y[:, 1:])*K + Y[:, :-1], next_current)
+    N_current_source = _counts((row*K + Y)*K + X, (state_rows*K + current)*K + source)
+    N_current = _counts(row*K + Y, state_rows*K + current)
+
+    state_proba = joint / (N - 1)
+    P_Yn_Xn = N_current_source / N
+    P_Yn1_Yn = N_next_current / (N - 1)
+    P_Yn = N_current / N
+    numerator = state_proba / P_Yn_Xn
+    denominator = P_Yn1_Yn / P_Yn
+    terms = state_proba * np.log2(numerator / denominator)
+
+    # Sum the terms of each row in order: the i-th terms of all rows are added at once
+    ranks = np.arange(len(states)) - np.searchsorted(state_rows, state_rows)
+    order = np.argsort(ranks, kind='stable')
+    bounds = np.searchsorted(ranks[order], np.arange(ranks.max() + 2))
+    tot = np.zeros(rows)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        indices = order[start:end]
+        tot[state_rows[indices]] += terms[indices]
+
+    return tot.reshape(shape)
+
+
+
+class SimpleTE(object):
+    """
+    Transfer entropy between the binarized series (1 if positive, 0 otherwise), as
+    `InfluenceGraphGenerator(SimpleTE)` in the Julia `Sensors` module without surrogates.
+    It can be used as measure in `influence.influence_graphs`, where each source is
+    compared to all the targets of a block at once (see `transfer_entropy`).
+    """
+
+    def __repr__(self) -> str:
+        return 'SimpleTE()'
+
+
+    def prepare(self, series: np.ndarray) -> np.ndarray:
+        """
+        Binarize each series (row) of `series`.
+        """
+
+        return (np.asarray(series) > 0).astype(np.int8)
+
+
+    def batch(self, x: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """
+        Return the transfer entropy from the series `x` to each of the prepared `targets`. If
+        `x` is a stack of series of shape (N_sources, N_times), return the transfer entropy
+        from each of them, of shape (N_sources, N_targets).
+        """
+
+        return transfer_entropy(self.prepare(x)[..., None, :], targets, alphabet=2)
+
+
+    def __call__(self, x: np.ndarray, y: np.ndarray) -> float:
+
+        return float(self.batch(x, self.prepare(y)[None])[0])
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 20:14:38 2026
+
+@author: cyrilvallez
+"""
+
+import time
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+from twarc import Twarc2
+
+# Request budget of the full-archive search endpoint: 300 requests per 15 minutes window
+# for the app, and at most 1 request per second
+RATE = 300 / (15*60)
+BURST = 1
+
+# Maximum number of consecutive server errors before giving up on a request
+MAX_ERRORS = 30
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket rate limiter, refilled at `rate` tokens per second up to
+    `capacity` tokens. Each request consumes a token. The rate is adapted to the answers
+    of the server (additive increase, multiplicative decrease): it is halved after each
+    rate limit error (and all requests are paused until the time given by the server),
+    and increased back by a fraction of `max_rate` after each successful request.
+    """
+
+    def __init__(self, rate: float = RATE, capacity: float = BURST, min_rate: float = RATE/16):
+
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        # Time (from time.monotonic) of the last refill. Can be in the future while paused.
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        # Number of consecutive rate limit errors
+        self.failures = 0
+
+
+    def acquire(self) -> None:
+        """
+        Block until a token is available, and consume it.
+        """
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.updated:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated)*self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    wait = self.updated - now
+            time.sleep(wait)
+
+
+    def success(self) -> None:
+        """
+        Record a successful request.
+        """
+
+        with self.lock:
+            self.failures = 0
+            self.rate = min(self.max_rate, self.rate + self.max_rate/10)
+
+
+    def backoff(self, reset: float = None) -> None:
+        """
+        Record a rate limit error, and pause all requests until `reset` (a unix
+        timestamp, as given by the `x-rate-limit-reset` header). If `reset` is None,
+        pause with an exponential delay in the number of consecutive errors.
+        """
+
+        with self.lock:
+            self.failures += 1
+            self.rate = max(self.min_rate, self.rate/2)
+            if reset is not None:
+                delay = min(15*60 + 1, max(1, reset - time.time()))
+            else:
+                delay = min(60, 2**self.failures)
+            self.tokens = 0
+            self.updated = max(self.updated, time.monotonic() + delay)
+
+
+
+class PooledTwarc2(Twarc2):
+    """
+    Client for the twitter API v2 which can be shared by multiple threads. All threads
+    use the same pool of `pool_size` connections, and all requests go through the
+    same `bucket`, which replaces twarc's own rate limiting (this one sleeps the thread
+    that received the error only, independently of the others).
+    """
+
+    def __init__(self, bucket: TokenBucket = None, pool_size: int = 10, **kwargs):
+
+        self.bucket = bucket if bucket is not None else TokenBucket()
+        self.pool_size = pool_size
+        self._connect_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+
+    def connect(self) -> None:
+
+        super().connect()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.client.mount('https://', adapter)
+        self.client.mount('http://', adapter)
+
+
+    def get(self, *args, **kwargs) -> requests.Response:
+
+        with self._connect_lock:
+            if not self.client:
+                self.connect()
+
+        errors = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                resp = self.client.get(*args, timeout=(3.05, 31), **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                resp = None
+
+            if resp is not None and resp.status_code in [200, 201]:
+                self.bucket.success()
+                return resp
+            elif resp is not None and resp.status_code == 429:
+                remaining = resp.headers.get('x-rate-limit-remaining')
+                reset = resp.headers.get('x-rate-limit-reset')
+                # If there are remaining calls in the window, we hit the 1 request/s limit
+                if remaining is not None and int(remaining) == 0 and reset is not None:
+                    self.bucket.backoff(int(reset))
+                else:
+                    self.bucket.backoff()
+            elif resp is None or resp.status_code >= 500:
+                errors += 1
+                if errors > MAX_ERRORS:
+                    if resp is None:
+                        raise requests.exceptions.ConnectionError(f'Too many errors for {args[0]}.')
+                    resp.raise_for_status()
+                time.sleep(min(60, errors**2))
+            else:
+                resp.raise_for_status()
+
+
+
+def run_parallel(func, tasks: list[tuple], workers: int, desc: str = None) -> None:
+    """
+    Call `func(*task)` for all `tasks`, using `workers` threads. If any call raises
+    an exception, the remaining tasks are cancelled, and the exception is raised once
+    the running ones are finished.
+
+    Parameters
+    ----------
+    func : Callable
+        The function.
+    tasks : list[tuple]
+        The arguments of each call.
+    workers : int
+        The number of threads.
+    desc : str, optional
+        Description for the progress bar. The default is None.
+
+    Returns
+    -------
+    None
+
+    """
+
+    with ThreadPoolExecutor(workers) as executor:
+        futures = [executor.submit(func, *task) for task in tasks]
+        try:
+            for future in tqdm(as_completed(futures), total=len(futures), desc=desc):
+                future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 15:42:08 2026
+
+@author: cyrilvallez
+"""
+
+import os
+import json
+import time
+import hashlib
+import functools
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from tqdm import tqdm
+
+import manifest
+from timeseries import TimeSeries, SparseTimeSeries, META_NAME
+
+# Name of the file describing the job of a checkpoint folder
+JOB_NAME = 'job.json'
+
+# Default number of target actors processed by a task
+BLOCK_SIZE = 64
+
+# Minimum time (in seconds) between two writes of the progress of a checkpoint to disk
+FLUSH_INTERVAL = 30.
+
+
+def load_time_series(folder: str):
+    """
+    Load the time series saved in `folder`, either dense (`TimeSeries`) or sparse
+    (`SparseTimeSeries`).
+    """
+
+    if not os.path.exists(os.path.join(folder, META_NAME)):
+        raise ValueError(f'{folder} does not contain saved time series.')
+    if os.path.exists(os.path.join(folder, 'partition_0_indptr.npy')):
+        return SparseTimeSeries.load(folder)
+    return TimeSeries.load(folder)
+
+
+
+def describe(measure) -> str:
+    """
+    Return a description of `measure` which does not depend on the process (contrary
+    to the default repr of functions), used to check that a checkpoint was created
+    with the same measure.
+    """
+
+    if isinstance(measure, functools.partial):
+        arguments = [describe(arg) for arg in measure.args]
+        arguments += [f'{key}={describe(value)}' for key, value in sorted(measure.keywords.items())]
+        return f'{describe(measure.func)}({", ".join(arguments)})'
+    if hasattr(measure, '__qualname__') and hasattr(measure, '__module__'):
+        return f'{measure.__module__}.{measure.__qualname__}'
+    return repr(measure)
+
+
+
+def partition_hash(time_series, m: int) -> str:
+    """
+    Return a hash of the values of partition `m` of `time_series` (the counts of
+    `SparseTimeSeries`), used to check that a checkpoint was created with the same time series.
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(time_series, SparseTimeSeries):
+        arrays = [np.asarray(time_series.indptr[m], dtype=np.int64), np.asarray(time_series.indices[m], dtype=np.int64),
+                  np.asarray(time_series.counts[m], dtype=np.float64)]
+    else:
+        # By chunks of actors, so that memory mapped values are never fully loaded
+        values = time_series.values[m]
+        arrays = (values[i:i+BLOCK_SIZE] for i in range(0, values.shape[0], BLOCK_SIZE))
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array, dtype=np.float64 if array.dtype.kind == 'f' else np.int64).data)
+    return digest.hexdigest()
+
+
+
+class GraphCheckpoint(object):
+    """
+    Folder holding the influence graphs being computed, so that the computation can be
+    resumed after a crash. For partition `m`, the edges are memory mapped from
+    `partition_{m}.npy`, and `partition_{m}_done.npy` records which blocks of actor pairs
+    are complete. Progress is only written after the edges themselves are flushed, so
+    that blocks marked as done are always complete on disk.
+
+    `job` describes the time series (including a hash of their values, see `partition_hash`)
+    and measure, and a checkpoint can only be resumed with the same job.
+    """
+
+    def __init__(self, folder: str, job: dict, shapes: list[tuple], N_blocks: list[int]):
+
+        self.folder = folder
+        key = manifest.fingerprint(job)
+        job_path = os.path.join(folder, JOB_NAME)
+
+        if os.path.exists(job_path):
+            with open(job_path, 'r') as file:
+                previous = json.load(file)
+            if previous['fingerprint'] != key:
+                raise ValueError((f'The checkpoint {folder} corresponds to other time series or another '
+                                  'measure. Remove it or choose another folder.'))
+            mode = 'r+'
+        else:
+            os.makedirs(folder, exist_ok=True)
+            mode = 'w+'
+
+        self.graphs = []
+        self.saved = []
+        for m, (shape, N) in enumerate(zip(shapes, N_blocks)):
+            graphs = np.lib.format.open_memmap(self._path(m), mode=mode, dtype=np.float64, shape=shape)
+            saved = np.lib.format.open_memmap(self._path(m, 'done'), mode=mode, dtype=bool,
+                                              shape=(shape[0], N))
+            if mode == 'w+':
+                graphs[:] = -1.
+                graphs.flush()
+            self.graphs.append(graphs)
+            self.saved.append(saved)
+        self.done = [np.array(saved) for saved in self.saved]
+
+        # The job is written last, so that a folder with a job is always fully initialized
+        if mode == 'w+':
+            tmp = job_path + '.tmp'
+            with open(tmp, 'w') as file:
+                json.dump({'fingerprint': key, 'measure': job['measure']}, file, indent=1)
+            os.replace(tmp, job_path)
+
+        self.last_flush = time.time()
+
+
+    def _path(self, m: int, suffix: str = None) -> str:
+
+        name = f'partition_{m}' if suffix is None else f'partition_{m}_{suffix}'
+        return os.path.join(self.folder, name + '.npy')
+
+
+    def flush(self, force: bool = False) -> None:
+        """
+        Write the edges, then the progress, to disk (at most every FLUSH_INTERVAL seconds,
+        unless `force` is True).
+        """
+
+        if not force and time.time() - self.last_flush < FLUSH_INTERVAL:
+            return
+        for graphs in self.graphs:
+            graphs.flush()
+        for saved, done in zip(self.saved, self.done):
+            saved[:] = done
+            saved.flush()
+        self.last_flush = time.time()
+
+
+
+# Arrays shared with the worker processes (set by `_init_worker`)
+_WORKER = {}
+
+
+def _share(arrays: list[np.ndarray]) -> tuple:
+    """
+    Copy `arrays` into a single new shared memory block. Return the block, and the layout
+    (offset, shape and dtype of each array) needed to read them back with `_attach`.
+    """
+
+    layout, offset = [], 0
+    for array in arrays:
+        layout.append((offset, array.shape, array.dtype.str))
+        # Keep every array aligned on 8 bytes
+        offset += -(-array.nbytes // 8)*8
+    memory = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for array, (start, shape, dtype) in zip(arrays, layout):
+        np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=start)[...] = array
+    return memory, layout
+
+
+
+def _attach(memory: shared_memory.SharedMemory, layout: list[tuple]) -> list[np.ndarray]:
+    """
+    Return the arrays written in `memory` by `_share`, without copies.
+    """
+
+    return [np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=start) for start, shape, dtype in layout]
+
+
+
+def _init_worker(name: str, layout: list[tuple], sparse: bool, shapes: list[tuple], active: list[np.ndarray],
+                 measure, block_size: int) -> None:
+    """
+    Attach the worker process to the shared memory holding the time series.
+    """
+
+    memory = shared_memory.SharedMemory(name=name)
+    arrays = _attach(memory, layout)
+    # Only the shapes of the time series are needed in the workers
+    partitions = list(range(len(shapes)))
+    actions = list(range(shapes[0][2])) if len(shapes) > 0 else []
+    actors = [range(shape[0]) for shape in shapes]
+    times = [range(shape[1]) for shape in shapes]
+    if sparse:
+        time_series = SparseTimeSeries(partitions, actions, actors, times, arrays[0::3], arrays[1::3], arrays[2::3])
+    else:
+        time_series = TimeSeries(partitions, actions, actors, times, arrays)
+    _WORKER['memory'] = memory
+    _WORKER['time_series'] = time_series
+    _WORKER['shapes'] = shapes
+    _WORKER['active'] = active
+    _WORKER['measure'] = measure
+    _WORKER['block_size'] = block_size
+    _prepared_block.cache_clear()
+
+
+
+def _actor_series(m: int, start: int, end: int) -> np.ndarray:
+    """
+    Return the (standardized) time series of the actors `start` to `end` of partition `m`, with
+    shape (N_actors, N_times, N_actions). Sparse time series are only densified here.
+    """
+
+    time_series = _WORKER['time_series']
+    if isinstance(time_series, SparseTimeSeries):
+        return np.stack([time_series.series(m, j) for j in range(start, end)])
+    return time_series.values[m][start:end]
+
+
+
+@functools.lru_cache(maxsize=1)
+def _prepared_block(m: int, b: int) -> tuple:
+    """
+    Return the time series of the actors of block `b` in partition `m`, and the same series
+    prepared by the measure (see `influence_graphs`), with shape (N_block, N_actions, ...).
+    Tasks are ordered by block, so that each block is densified and prepared once per chunk
+    of tasks.
+    """
+
+    measure, block_size = _WORKER['measure'], _WORKER['block_size']
+    series = _actor_series(m, b*block_size, min((b+1)*block_size, _WORKER['shapes'][m][0]))
+    if not hasattr(measure, 'batch'):
+        return series, None
+    prepared = measure.prepare(series.transpose(0, 2, 1).reshape(-1, series.shape[1]))
+    return series, prepared.reshape(series.shape[0], series.shape[2], *prepared.shape[1:])
+
+
+
+def _process_block(task: tuple) -> tuple:
+    """
+    Compute the edges from actor `i` to the actors of block `b` in partition `m`, in the same
+    way as the Julia `observe(time_series, ig::InfluenceGraphGenerator)`: edges between actors
+    whose time series is zero (in a given action) are left to -1, and NaN values are replaced by 0.
+    """
+
+    m, i, b = task
+    active, measure, block_size = _WORKER['active'][m], _WORKER['measure'], _WORKER['block_size']
+    N_actors, _, N_actions = _WORKER['shapes'][m]
+    start, end = b*block_size, min((b+1)*block_size, N_actors)
+
+    edges = np.full((end - start, N_actions, N_actions), -1.)
+    if not active[i].any():
+        return task, edges
+    source = _actor_series(m, i, i+1)[0]
+    series, targets = _prepared_block(m, b)
+
+    if targets is not None:
+        mask = active[start:end].copy()
+        if start <= i < end:
+            mask[i - start] = False
+        js, ls = np.nonzero(mask)
+        if len(js) == 0:
+            return task, edges
+        for k in np.flatnonzero(active[i]):
+            value = measure.batch(source[:, k], targets[js, ls])
+            edges[js, k, ls] = np.where(np.isnan(value), 0., value)
+        return task, edges
+
+    for k in np.flatnonzero(active[i]):
+        x = source[:, k]
+        for j in range(start, end):
+            if j == i:
+                continue
+            for l in np.flatnonzero(active[j]):
+                value = measure(x, series[j - start, :, l])
+                edges[j - start, k, l] = 0. if np.isnan(value) else value
+
+    return task, edges
+
+
+
+def influence_graphs(time_series, measure, workers: int = os.cpu_count(), block_size: int = BLOCK_SIZE,
+                     checkpoint: str = None) -> list[np.ndarray]:
+    """
+    Compute the influence graph of each partition, as the Julia
+    `observe(time_series, ig::InfluenceGraphGenerator)`, using a pool of `workers` processes.
+    The pairs of actors are cut into tasks of one source actor and a block of `block_size`
+    target actors. The time series are copied once into shared memory, which all workers
+    read without copies (for sparse time series, only the non-zero counts are shared, and
+    each worker densifies the series of one block of actors at a time).
+
+    Parameters
+    ----------
+    time_series : TimeSeries | SparseTimeSeries | str
+        The time series, or the folder where they are saved. Sparse time series are
+        standardized (see `SparseTimeSeries.series`) in the workers, and never fully densified.
+    measure : Callable
+        The causality measure, called as `measure(x, y)` with the time series of the source
+        and target for a given action, and returning a float. It must be picklable (e.g. a
+        function defined at module level, or a functools.partial of it). If it also has
+        `prepare` and `batch` methods (see e.g. `jdd.JointDistanceDistribution`), the
+        target time series are first transformed with `prepare(series)` (once per actor
+        block in each worker, for an array of shape (N_series, N_times)), and each source
+        series is then compared to all the targets of a task at once with `batch(x, targets)`.
+    workers : int, optional
+        The number of worker processes. The default is os.cpu_count().
+    block_size : int, optional
+        The number of target actors in each task. The default is BLOCK_SIZE.
+    checkpoint : str, optional
+        If given, a folder where the graphs are written as they are computed (see
+        `GraphCheckpoint`). If it already contains a computation for the same time series
+        and measure, it is resumed. The default is None.
+
+    Returns
+    -------
+    list[np.ndarray]
+        For each partition, an array of shape (N_actors, N_actors, N_actions, N_actions),
+        where `graphs[m][i, j, k, l]` is the measure from actor `i` doing action `k` to
+        actor `j` doing action `l` (-1 if not computed). Arrays are memory mapped from
+        the checkpoint folder if one is given.
+
+    """
+
+    if isinstance(time_series, str):
+        time_series = load_time_series(time_series)
+    sparse = isinstance(time_series, SparseTimeSeries)
+    if sparse:
+        shapes = [time_series.shape(m) for m in range(len(time_series))]
+    else:
+        shapes = [values.shape for values in time_series.values]
+    graph_shapes = [(shape[0], shape[0], shape[2], shape[2]) for shape in shapes]
+    N_blocks = [-(-shape[0] // block_size) for shape in shapes]
+
+    if checkpoint is not None:
+        job = {'measure': describe(measure), 'partitions': time_series.partitions,
+               'actions': time_series.actions, 'actors': time_series.actors, 'shapes': shapes,
+               'values': [partition_hash(time_series, m) for m in range(len(shapes))], 'block_size': block_size}
+        state = GraphCheckpoint(checkpoint, job, graph_shapes, N_blocks)
+        graphs, done = state.graphs, state.done
+    else:
+        state = None
+        graphs = [np.full(shape, -1.) for shape in graph_shapes]
+        done = [np.zeros((shape[0], N), dtype=bool) for shape, N in zip(shapes, N_blocks)]
+
+    # Tasks are ordered by block of targets, and given to the workers in chunks, so that the
+    # prepared targets (see `_prepared_block`) are reused between consecutive tasks
+    tasks = [(m, int(i), int(b)) for m in range(len(shapes)) for b, i in zip(*np.nonzero(~done[m].T))]
+    if len(tasks) == 0:
+        return graphs
+
+    # Actors having a non-zero time series for each action
+    if sparse:
+        active = [time_series.active(m) for m in range(len(time_series))]
+        arrays = [array for m in range(len(time_series)) for array in
+                  (np.asarray(time_series.indptr[m], dtype=np.int64), np.asarray(time_series.indices[m], dtype=np.int64),
+                   np.asarray(time_series.counts[m], dtype=np.float64))]
+    else:
+        active = [np.any(values != 0, axis=1) for values in time_series.values]
+        arrays = [np.asarray(values, dtype=np.float64) for values in time_series.values]
+
+    memory, layout = _share(arrays)
+    del arrays
+    try:
+        initargs = (memory.name, layout, sparse, shapes, active, measure, block_size)
+        with mp.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+            chunksize = max(1, min(block_size, len(tasks) // (4*workers)))
+            results = pool.imap_unordered(_process_block, tasks, chunksize=chunksize)
+            for (m, i, b), edges in tqdm(results, total=len(tasks), desc='Actor blocks'):
+                graphs[m][i, b*block_size:b*block_size + len(edges)] = edges
+                done[m][i, b] = True
+                if state is not None:
+                    state.flush()
+    finally:
+        if state is not None:
+            state.flush(force=True)
+        memory.close()
+        memory.unlink()
+
+    return graphs
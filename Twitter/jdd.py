@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 10:17:36 2026
+
+@author: cyrilvallez
+"""
+
+import math
+import numpy as np
+
+
+def embed(series: np.ndarray, D: int = 5, tau: int = 1) -> np.ndarray:
+    """
+    Delay embedding of each series (row) of `series`, with dimension `D` and delay `tau`:
+    point `t` is (x[t], x[t-tau], ..., x[t-(D-1)*tau]), as `genembed` with lags
+    0, -tau, ..., -(D-1)*tau in Julia.
+
+    Parameters
+    ----------
+    series : np.ndarray
+        The series, of shape (N_series, N_times).
+    D : int, optional
+        The embedding dimension. The default is 5.
+    tau : int, optional
+        The embedding delay. The default is 1.
+
+    Returns
+    -------
+    np.ndarray
+        The embeddings, of shape (N_series, N_times - (D-1)*tau, D).
+
+    """
+
+    series = np.atleast_2d(series)
+    N_points = series.shape[1] - (D-1)*tau
+    if N_points < 2:
+        raise ValueError(f'The series are too short for an embedding with D={D} and tau={tau}.')
+    return np.stack([series[:, (D-1-d)*tau:(D-1-d)*tau + N_points] for d in range(D)], axis=-1)
+
+
+
+def normalized_distances(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Return the normalized distances between all pairs of points of each embedding, as in
+    the `jdd` function of CausalityTools 1.4.1 (with its default `SqEuclidean` metric, which
+    `Sensors` does not change). The squared Euclidean distances are computed as
+    `pairwise(SqEuclidean(), M, dims=1)` does, i.e. from the Gram matrix (|a|^2 + |b|^2 - 2a.b,
+    clipped at 0, with a zero diagonal). They are then min-max normalized with the minimum and
+    maximum positive distances, and, as in CausalityTools, only the first P distances of the
+    flattened matrix are normalized (P being the number of positive distances), the others
+    being set to 0. Since the matrix is symmetric, the flattening order (column-major in Julia)
+    does not matter. Embeddings without any positive distance (for which CausalityTools raises
+    an error) give NaN.
+
+    Parameters
+    ----------
+    embeddings : np.ndarray
+        The embeddings, of shape (N_series, N_points, D).
+
+    Returns
+    -------
+    np.ndarray
+        The flattened distance matrices, of shape (N_series, N_points**2).
+
+    """
+
+    N_series, N_points, _ = embeddings.shape
+    squares = np.sum(embeddings**2, axis=2)
+    gram = embeddings @ embeddings.transpose(0, 2, 1)
+    distances = np.maximum(squares[:, :, None] + squares[:, None, :] - 2*gram, 0.)
+    # Only the upper triangle is computed, and then mirrored
+    distances = np.triu(distances, k=1)
+    distances = (distances + distances.transpose(0, 2, 1)).reshape(N_series, -1)
+
+    positive = distances > 0
+    N_positive = positive.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        smallest = np.where(positive, distances, np.inf).min(axis=1, keepdims=True)
+        largest = np.where(positive, distances, -np.inf).max(axis=1, keepdims=True)
+        normalized = np.where(distances == 0, 0., (distances - smallest) / (largest - smallest))
+    normalized[np.arange(distances.shape[1]) >= N_positive[:, None]] = 0.
+    normalized[N_positive == 0] = np.nan
+    return normalized
+
+
+
+def t_test_pvalue(samples: np.ndarray, mu0: float = 0.) -> np.ndarray:
+    """
+    Right tailed p-value of a one sample t-test that the mean of each row of `samples` is
+    larger than `mu0` (as `pvalue(OneSampleTTest(x, mu0), tail=:right)` in Julia). Rows
+    containing NaN give NaN. The Student distribution is computed with the closed forms for
+    integer degrees of freedom (Abramowitz and Stegun 26.7.3 and 26.7.4), so that scipy is not
+    needed.
+    """
+
+    samples = np.atleast_2d(samples)
+    n = samples.shape[1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = samples.mean(axis=1)
+        std = samples.std(axis=1, ddof=1)
+        t = (mean - mu0) / (std / math.sqrt(n))
+
+    if n < 2:
+        return np.full(len(t), np.nan)
+    pvalues = _student_sf(t, n - 1)
+    # The closed forms are not exact for infinite t (zero variance)
+    pvalues[t == np.inf] = 0.
+    pvalues[t == -np.inf] = 1.
+    return pvalues
+
+
+
+def _student_sf(t: np.ndarray, df: int) -> np.ndarray:
+    """
+    Survival function of the Student distribution with integer `df` degrees of freedom.
+    """
+
+    theta = np.arctan(t / math.sqrt(df))
+    cos2 = np.cos(theta)**2
+    term = np.ones_like(theta)
+    total = np.ones_like(theta) if df % 2 == 0 else np.zeros_like(theta)
+    if df % 2 == 0:
+        # A(t|df) = sin(theta) * (1 + 1/2 cos^2 + 1*3/(2*4) cos^4 + ...)
+        for k in range(1, df // 2):
+            term = term * cos2 * (2*k - 1) / (2*k)
+            total += term
+        A = np.sin(theta) * total
+    else:
+        # A(t|df) = 2/pi * (theta + sin(theta) * (cos + 2/3 cos^3 + 2*4/(3*5) cos^5 + ...))
+        if df > 1:
+            term = np.cos(theta)
+            total = term.copy()
+            for k in range(1, (df - 1) // 2):
+                term = term * cos2 * (2*k) / (2*k + 1)
+                total += term
+        A = 2 / math.pi * (theta + np.sin(theta) * total)
+    return (1 - A) / 2
+
+
+
+class JointDistanceDistribution(object):
+    """
+    Joint distance distribution test of Amigó and Hirata (2018) from a source series to
+    target series, as `pvalue(jdd(OneSampleTTest, x, y, B=B, D=D, τ=tau, μ0=mu0), tail=:right)`
+    in the Julia `Sensors` module (`InfluenceGraphGenerator(JointDistanceDistribution)`), where
+    `jdd` is the one of CausalityTools 1.4.1.
+
+    Both series are delay embedded (see `embed`), and the distances between all pairs of points
+    of each embedding are normalized (see `normalized_distances`). The unit interval is cut into
+    2*`B` subintervals [b_l, b_u). For each of them, we take the smallest target distance of the
+    pairs whose source distance is in the subinterval (2 if there are none). The deviations are
+    the differences between these minima for the subintervals symmetric around 1/2 (the upper
+    one minus the lower one), and the p-value is the one of a right tailed t-test that the mean
+    of the `B` deviations is larger than `mu0`.
+
+    The embeddings and distances only depend on each series, so they are computed once by
+    `prepare`, and a source is compared to many prepared targets at once by `batch` (which is what
+    `influence.influence_graphs` uses). Calling the object on two series gives the same result
+    for a single pair. The distances are computed in floating point from the Gram matrix, and
+    the t-test does not use the same implementation of the Student distribution, so that values
+    can differ from the Julia version in the last digits.
+    """
+
+    def __init__(self, B: int = 10, D: int = 5, tau: int = 1, mu0: float = 0., threshold: float = None):
+
+        self.B = B
+        self.D = D
+        self.tau = tau
+        self.mu0 = mu0
+        self.threshold = threshold
+
+
+    def __repr__(self) -> str:
+        return (f'JointDistanceDistribution(B={self.B}, D={self.D}, tau={self.tau}, mu0={self.mu0}, '
+                f'threshold={self.threshold})')
+
+
+    def prepare(self, series: np.ndarray) -> np.ndarray:
+        """
+        Return the normalized distances of the embedding of each series (row) of `series`.
+        """
+
+        return normalized_distances(embed(series, self.D, self.tau))
+
+
+    def deviations(self, source: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """
+        Return the deviations of the joint distance distribution from the prepared `source` to
+        each of the prepared `targets`, with shape (N_targets, B).
+        """
+
+        targets = np.atleast_2d(targets)
+        # Subinterval of each pair according to its source distance (2*B if in none of them,
+        # e.g. for the largest distance, which is exactly 1)
+        edges = np.arange(2*self.B + 1) / (2*self.B)
+        subintervals = np.searchsorted(edges, source, side='right') - 1
+        order = np.argsort(subintervals, kind='stable')
+        bounds = np.searchsorted(subintervals[order], np.arange(2*self.B + 1))
+
+        minima = np.full((targets.shape[0], 2*self.B), 2.)
+        for b in range(2*self.B):
+            pairs = order[bounds[b]:bounds[b+1]]
+            if len(pairs) > 0:
+                minima[:, b] = targets[:, pairs].min(axis=1)
+
+        return minima[:, self.B:] - minima[:, self.B-1::-1]
+
+
+    def batch(self, x: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """
+        Return the measure from the series `x` to each of the prepared `targets`: the p-values,
+        or if `threshold` is given, 1 if the p-value is smaller than the threshold and 0 otherwise
+        (as in the Julia version without surrogates). If `x` is a stack of series of shape
+        (N_sources, N_times), return the measure from each of them, of shape (N_sources, N_targets).
+        """
+
+        sources = self.prepare(x)
+        pvalues = np.stack([t_test_pvalue(self.deviations(source, targets), self.mu0) for source in sources])
+        if self.threshold is not None:
+            pvalues = (pvalues < self.threshold).astype(np.float64)
+        return pvalues if np.ndim(x) > 1 else pvalues[0]
+
+
+    def __call__(self, x: np.ndarray, y: np.ndarray) -> float:
+
+        return float(self.batch(x, self.prepare(y))[0])
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 09:21:54 2026
+
+@author: cyrilvallez
+"""
+
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+import compression
+
+# Optional faster backends. We fall back to the standard library if they are not installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+
+def _orjson_dumps(obj) -> str:
+    return orjson.dumps(obj).decode('utf-8')
+
+def _stdlib_dumps(obj) -> str:
+    return json.dumps(obj)
+
+
+# Name -> (loads, dumps) for all available backends, in order of preference
+BACKENDS = {}
+if orjson is not None:
+    BACKENDS['orjson'] = (orjson.loads, _orjson_dumps)
+if simdjson is not None:
+    # simdjson only parses, thus we still use the standard library for writing
+    BACKENDS['simdjson'] = (simdjson.loads, _stdlib_dumps)
+BACKENDS['json'] = (json.loads, _stdlib_dumps)
+
+# The backend currently in use
+BACKEND = next(iter(BACKENDS))
+loads, dumps = BACKENDS[BACKEND]
+
+
+def set_backend(name: str) -> None:
+    """
+    Select the json backend used by `loads`, `dumps` and `read_json_lines`.
+
+    Parameters
+    ----------
+    name : str
+        The name of the backend, one of `BACKENDS`.
+
+    Raises
+    ------
+    ValueError
+        If the backend is not available.
+
+    Returns
+    -------
+    None
+
+    """
+
+    global BACKEND, loads, dumps
+
+    if name not in BACKENDS:
+        raise ValueError(f'The backend {name} is not available. Choose one of {list(BACKENDS.keys())}.')
+
+    BACKEND = name
+    loads, dumps = BACKENDS[name]
+
+
+
+def read_json_lines(path: str, skiprows: int = 0) -> pd.DataFrame:
+    """
+    Load a file containing one json object per line into a DataFrame. This is
+    equivalent to `pd.read_json(path, lines=True, dtype=object, convert_dates=False)`,
+    but uses the current backend for parsing. The file may be compressed (see
+    `compression.open_file`).
+
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+    skiprows : int, optional
+        The number of lines to skip at the beginning of the file. The default is 0.
+
+    Returns
+    -------
+    pd.DataFrame
+        The DataFrame, with all columns of dtype object.
+
+    """
+
+    with compression.open_file(path, 'rb') as file:
+        for _ in range(skiprows):
+            next(file, None)
+        records = [loads(line) for line in file if line.strip()]
+
+    return pd.DataFrame.from_records(records).astype(object)
+
+
+
+# =============================================================================
+# Benchmark
+# =============================================================================
+
+def synthetic_tweet(i: int, rng: np.random.Generator) -> dict:
+    """
+    Create a fake tweet with the same structure as the ones returned by
+    `twarc.expansions.flatten`, for benchmarking purposes.
+    """
+
+    username = f'user_{rng.integers(10000)}'
+    tweet = {
+        'id': str(1450000000000000000 + i),
+        'author_id': str(rng.integers(1e9)),
+        'created_at': f'2021-11-0{rng.integers(1, 10)}T{rng.integers(10, 24)}:{rng.integers(10, 60)}:00.000Z',
+        'lang': 'en',
+        'conversation_id': str(1450000000000000000 + i),
+        'possibly_sensitive': False,
+        'reply_settings': 'everyone',
+        'source': 'Twitter for iPhone',
+        'text': 'RT @someone: Climate talks at #COP26 are heating up https://t.co/abcdefghij ' * 2,
+        'public_metrics': {'retweet_count': int(rng.integers(100)), 'reply_count': 0, 'like_count': 0, 'quote_count': 0},
+        'entities': {
+            'urls': [{'start': 50, 'end': 73, 'url': 'https://t.co/abcdefghij',
+                      'expanded_url': 'https://www.theguardian.com/environment/2021/nov/01/cop26',
+                      'display_url': 'theguardian.com/environment/2…'}],
+            'hashtags': [{'start': 30, 'end': 36, 'tag': 'COP26'}],
+            'mentions': [{'start': 3, 'end': 11, 'username': 'someone', 'id': '12345'}],
+            },
+        'author': {
+            'id': str(rng.integers(1e9)), 'username': username, 'name': username.title(),
+            'created_at': '2010-01-01T00:00:00.000Z', 'verified': False, 'protected': False,
+            'description': 'Just a synthetic account used for benchmarking ' * 2,
+            'public_metrics': {'followers_count': int(rng.integers(1e5)), 'following_count': 10,
+                               'tweet_count': int(rng.integers(1e4)), 'listed_count': 0},
+            },
+        'referenced_tweets': [{
+            'type': 'retweeted', 'id': '1449999999999999999',
+            'text': 'Climate talks at #COP26 are heating up https://t.co/abcdefghij',
+            'author': {'username': 'someone', 'public_metrics': {'followers_count': 1000}},
+            }],
+        '__twarc': {'url': 'https://api.twitter.com/2/tweets/search/all', 'version': '2.12.0',
+                    'retrieved_at': '2022-10-26T10:00:00+00:00'},
+        }
+
+    return tweet
+
+
+
+def benchmark(N_lines: int = 20000, repeats: int = 3, seed: int = 1234) -> pd.DataFrame:
+    """
+    Measure the number of lines per second each available backend can parse and
+    write, on a synthetic corpus of `N_lines` twarc-flattened tweets.
+
+    Parameters
+    ----------
+    N_lines : int, optional
+        The number of tweets in the corpus. The default is 20000.
+    repeats : int, optional
+        The number of repetitions (the best time is kept). The default is 3.
+    seed : int, optional
+        Seed for the random number generator. The default is 1234.
+
+    Returns
+    -------
+    pd.DataFrame
+        Lines per second for parsing and writing, for each backend.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    tweets = [synthetic_tweet(i, rng) for i in range(N_lines)]
+    lines = [json.dumps(tweet).encode('utf-8') for tweet in tweets]
+
+    results = []
+    for name, (loads_, dumps_) in BACKENDS.items():
+        parse_time = min(_timeit(lambda: [loads_(line) for line in lines]) for _ in range(repeats))
+        write_time = min(_timeit(lambda: [dumps_(tweet) for tweet in tweets]) for _ in range(repeats))
+        results.append({'backend': name, 'parse (lines/s)': N_lines/parse_time,
+                        'write (lines/s)': N_lines/write_time})
+
+    return pd.DataFrame(results).set_index('backend').round(0)
+
+
+def _timeit(func) -> float:
+    t0 = time.perf_counter()
+    func()
+    return time.perf_counter() - t0
+
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark the json backends')
+    parser.add_argument('--N_lines', type=int, default=20000,
+                        help='The number of synthetic tweets to use. The default is 20000.')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='The number of repetitions. The default is 3.')
+    args = parser.parse_args()
+
+    print(benchmark(args.N_lines, args.repeats))
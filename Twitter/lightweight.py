@@ -7,9 +7,19 @@ Created on Tue Nov  8 11:30:21 2022
 """
      
 import os
+import sys
+import functools
+import time
 from tqdm import tqdm
 import pandas as pd
+import numpy as np
 import argparse
+
+import json_codec
+import storage
+import compression as compression_module
+import manifest
+import users
        
 # Path to the news source data
 PROJECT_FOLDER = os.path.dirname(os.path.dirname(__file__))
@@ -27,16 +37,74 @@ LIGHTWEIGHT_ATTRIBUTES = [
 
 
 
-def isin(domains: list[str], news_outlet: pd.DataFrame) -> bool:
+@functools.lru_cache(maxsize=None)
+def load_news_index(path: str = NEWS_TABLE) -> pd.DataFrame:
+    """
+    Load the news source table, indexed by domain (this is a hash index, so that
+    lookups do not need to scan the table). The table is only read once and then
+    shared by all calls.
+
+    Parameters
+    ----------
+    path : str, optional
+        Path to the news source table. The default is NEWS_TABLE.
+
+    Returns
+    -------
+    pd.DataFrame
+        The `class` and `score` of each news source, indexed by domain.
+
+    """
+    
+    news = pd.read_csv(path)
+    news = news.drop_duplicates('domain').set_index('domain')
+    
+    return news[['class', 'score']]
+
+
+
+def match_domain(domain: str, news_domains) -> str:
+    """
+    Return the news domain matching `domain`, i.e. `domain` itself or the closest
+    parent domain present in `news_domains` (e.g. `edition.cnn.com` matches `cnn.com`).
+
+    Parameters
+    ----------
+    domain : str
+        The domain.
+    news_domains : set[str] | pd.Index
+        The domains of the news sources.
+
+    Returns
+    -------
+    str
+        The matching news domain, or None if there are none.
+
     """
-    Check if any of the domains are present in the `domain` column of `news_outlet`.
+    
+    labels = domain.split('.')
+    # Stop before the last label (top-level domains are never news sources)
+    for i in range(len(labels) - 1):
+        candidate = '.'.join(labels[i:])
+        if candidate in news_domains:
+            return candidate
+        
+    return None
+    
+
+
+def isin(domains: list[str], news_outlet) -> bool:
+    """
+    Check if any of the domains (or one of their parent domains) are present in the
+    `domain` column of `news_outlet`.
 
     Parameters
     ----------
     domains : list[str]
         The domain list.
-    news_outlet : pd.DataFrame
-        The news source DataFrame, containing the `domain` column.
+    news_outlet : pd.DataFrame | set[str]
+        The news source DataFrame, containing the `domain` column, or directly the
+        set of news source domains (much faster when calling this function many times).
 
     Returns
     -------
@@ -45,17 +113,62 @@ def isin(domains: list[str], news_outlet: pd.DataFrame) -> bool:
 
     """
     
-    if domains is None:
+    if domains is None or type(domains) == float:
         return False
     
+    if isinstance(news_outlet, pd.DataFrame):
+        news_outlet = frozenset(news_outlet['domain'])
+    
     for domain in domains:
-        if any(domain == news_outlet['domain']):
+        if match_domain(domain, news_outlet) is not None:
             return True
         
     return False
 
 
 
+def match_news(domains: pd.Series, news_index: pd.DataFrame) -> pd.DataFrame:
+    """
+    Find the first domain of each tweet matching one of the news sources (see `match_domain`),
+    and return the class and score of this news source. This is done as a join between
+    the (exploded) domains and the news index, instead of scanning the table for each domain.
+
+    Parameters
+    ----------
+    domains : pd.Series
+        The domain lists of the tweets. Its index must be unique.
+    news_index : pd.DataFrame
+        The news sources, as returned by `load_news_index`.
+
+    Returns
+    -------
+    pd.DataFrame
+        The `news_class` and `news_score` for all tweets matching a news source, with
+        the same index as `domains`.
+
+    """
+    
+    # One row per (tweet, domain), keeping the tweet index (as object dtype, since the domains of
+    # a chunk where no tweet has URLs are all NaN, which pandas stores as float)
+    exploded = domains.explode().dropna().astype(object)
+    keys = exploded.where(exploded.isin(news_index.index))
+    
+    # Subdomains of news sources are matched by their parent domain
+    unmatched = keys.isna() & exploded.str.count(r'\.').gt(1)
+    if unmatched.any():
+        keys[unmatched] = exploded[unmatched].map(lambda x: match_domain(x, news_index.index))
+    
+    # Keep the first matching domain of each tweet
+    keys = keys.dropna()
+    keys = keys[~keys.index.duplicated(keep='first')]
+    
+    matches = news_index.reindex(keys.values)
+    matches.index = keys.index
+    
+    return matches.rename(columns={'class': 'news_class', 'score': 'news_score'})
+
+
+
 def effective_category(tweet: dict) -> str:
     """
     Check if a given tweet should be classified as a retweet or usual tweet.
@@ -99,16 +212,105 @@ def effective_category(tweet: dict) -> str:
 
 
 
-def reduce(path: str, attributes: list[str] = LIGHTWEIGHT_ATTRIBUTES) -> pd.DataFrame:
+# Username following `RT @` at the beginning of a retweet: it stops at the first space
+# or colon, or at the next `RT @` occurrence (same as the splits in `effective_category`)
+RETWEET_PATTERN = r'^RT @((?:(?!RT @)[^ :])*)'
+
+
+def effective_categories(df: pd.DataFrame) -> pd.Series:
     """
-    Reduce the size of a DataFrame by keeping only rows matching at least one
-    of the news source, and truncating the columns to the minimum needed.
-    Also add columns corresponding to categories and original author.
+    Vectorized version of `effective_category`, computing the original author
+    of all tweets at once. If `df` does not contain a `category` column, quote tweets
+    are not considered (only the `RT @` prefix is checked).
 
     Parameters
     ----------
-    path : str
-        Path to the file we will reduce.
+    df : pd.DataFrame
+        The tweets, containing at least the `text` column (and the `category` and
+        `original_author` columns to detect quote tweets).
+
+    Returns
+    -------
+    pd.Series
+        Username of original author of each tweet (NaN for tweets, and -1 for quote
+        tweets with missing author).
+
+    """
+    
+    retweet_from = pd.Series(float('nan'), index=df.index, dtype=object)
+    
+    # We consider quote tweets as retweets
+    if 'category' in df.columns:
+        quoted = df['category'].explode().eq('quoted').groupby(level=0).any()
+        quoted = quoted.reindex(df.index, fill_value=False)
+        authors = df['original_author']
+        has_author = authors.map(type) == list
+        # Not the .str accessor, which fails when no tweet has an author (all NaN, stored as float)
+        retweet_from[quoted & has_author] = authors[quoted & has_author].map(lambda x: x[0])
+        retweet_from[quoted & ~has_author] = -1
+    
+    # The RT @username check has priority over the categories given by Twitter
+    is_retweet = df['text'].str.startswith('RT @').fillna(False).astype(bool)
+    names = df.loc[is_retweet, 'text'].str.extract(RETWEET_PATTERN, expand=False)
+    retweet_from[is_retweet] = names
+    
+    return retweet_from
+
+
+
+def benchmark_effective_category(df: pd.DataFrame, repeats: int = 3) -> pd.Series:
+    """
+    Check that `effective_categories` gives exactly the same output as the row-wise
+    `df.apply(effective_category, axis=1)`, and compare their running times.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The processed tweets.
+    repeats : int, optional
+        The number of repetitions (the best time is kept). The default is 3.
+
+    Raises
+    ------
+    AssertionError
+        If the outputs are different.
+
+    Returns
+    -------
+    pd.Series
+        The best running time (in seconds) of both implementations.
+
+    """
+    
+    times = {'apply': float('inf'), 'vectorized': float('inf')}
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        reference = df.apply(effective_category, axis=1)
+        t1 = time.perf_counter()
+        vectorized = effective_categories(df)
+        t2 = time.perf_counter()
+        times['apply'] = min(times['apply'], t1 - t0)
+        times['vectorized'] = min(times['vectorized'], t2 - t1)
+        
+    # NaNs are compared as equal
+    same = (reference.isna() & vectorized.isna()) | (reference == vectorized)
+    assert same.all(), f'The outputs differ for {(~same).sum()} tweets.'
+    
+    return pd.Series(times)
+
+
+
+def reduce_df(df: pd.DataFrame, attributes: list[str] = LIGHTWEIGHT_ATTRIBUTES) -> pd.DataFrame:
+    """
+    Reduce the size of a DataFrame of processed tweets by keeping only rows matching
+    at least one of the news source, and truncating the columns to the minimum needed.
+    Also add columns corresponding to categories and original author, and the
+    class and score of the matched news source.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The processed tweets.
     attributes : list[str], optional
         The DataFrame columns we want to keep. The default is LIGHTWEIGHT_ATTRIBUTES.
 
@@ -119,27 +321,91 @@ def reduce(path: str, attributes: list[str] = LIGHTWEIGHT_ATTRIBUTES) -> pd.Data
 
     """
     
-    df = pd.read_json(path, lines=True, dtype=object, convert_dates=False)
-    df['retweet_from'] = df.apply(effective_category, axis=1)
+    # Copy, so that the default list is not extended by the calls
+    attributes = list(attributes)
+    df['retweet_from'] = effective_categories(df)
     # Remove missing values for quoted tweets
     df = df[df.retweet_from != -1]
-    df['effective_category'] = df['retweet_from'].apply(lambda x: 'tweet' if pd.isnull(x) else 'retweet')
-    news = pd.read_csv(NEWS_TABLE)
-    mask = [isin(domains, news) for domains in df['domain']]
+    df['effective_category'] = np.where(df['retweet_from'].isna(), 'tweet', 'retweet')
+    # Add the class and score of the first news source matching the domains
+    df = df.join(match_news(df['domain'], load_news_index()))
+    mask = df['news_class'].notna()
     if 'retweet_from' not in attributes:
         attributes.append('retweet_from')
     if 'effective_category' not in attributes:
         attributes.append('effective_category')
+    if 'news_class' not in attributes:
+        attributes.append('news_class')
+    if 'news_score' not in attributes:
+        attributes.append('news_score')
     
     return df.loc[mask, attributes]
+
+
+
+def reduce(path: str, attributes: list[str] = LIGHTWEIGHT_ATTRIBUTES) -> pd.DataFrame:
+    """
+    Reduce the size of the processed tweets in `path` by keeping only rows matching
+    at least one of the news source, and truncating the columns to the minimum needed
+    (see `reduce_df`).
+
+    Parameters
+    ----------
+    path : str
+        Path to the file we will reduce.
+    attributes : list[str], optional
+        The DataFrame columns we want to keep. The default is LIGHTWEIGHT_ATTRIBUTES.
+
+    Returns
+    -------
+    df : pd.DataFrame
+        The truncated DataFrame.
+
+    """
     
+    df = json_codec.read_json_lines(path)
+    
+    return reduce_df(df, attributes)
+    
+
+
 
+def _incremental_manifest(folder: str, attributes: list[str], output_format: str,
+                          compression: str, user_table: bool) -> tuple:
+    """
+    Return the manifest of the outputs in `folder`, and the fingerprint of the
+    current parameters and code.
+    """
+
+    params = {'attributes': list(attributes), 'output_format': output_format, 'compression': compression,
+              'user_table': user_table, 'news_table': manifest.file_hash(NEWS_TABLE),
+              'code': manifest.code_version(sys.modules[__name__], json_codec, storage, users)}
+    return manifest.Manifest.in_folder(folder), manifest.fingerprint(params)
+
+
+
+def _open_user_table(output: str, output_format: str, compression: str, incremental: bool) -> tuple:
+    """
+    Return the user table of the lightweight file or folder `output` (see `users.UserTable`),
+    and its path. An existing table is extended if `incremental` is True.
+    """
 
+    path = users.table_path(output, output_format, compression)
+    if os.path.exists(path):
+        if not incremental:
+            raise ValueError(f'The user table {path} already exists. This would overwrite it.')
+        return users.UserTable.load(path), path
+    return users.UserTable(), path
 
-def reduce_and_save(path: str, attributes: list[str] = LIGHTWEIGHT_ATTRIBUTES) -> None:
+
+
+def reduce_and_save(path: str, attributes: list[str] = LIGHTWEIGHT_ATTRIBUTES,
+                    output_format: str = 'json', compression: str = None,
+                    incremental: bool = False, user_table: bool = False) -> None:
     """
     Load the tweets from the file or folder given in `path`, reduce them to
-    conserve only the minimum of attributes, and save those reduced tweets as json.
+    conserve only the minimum of attributes, and save those reduced tweets as json
+    (or parquet). Input files may be compressed (see `compression.compression_of`).
 
     Parameters
     ----------
@@ -147,7 +413,22 @@ def reduce_and_save(path: str, attributes: list[str] = LIGHTWEIGHT_ATTRIBUTES) -
         The path to the file or folder.
     attributes : list[str], optional
         The DataFrame columns we want to keep. The default is LIGHTWEIGHT_ATTRIBUTES.
-
+    output_format : str, optional
+        Either 'json' (one file per input file, with one tweet per line) or 'parquet'
+        (typed columns, with files partitioned by day inside the output folder, see
+        `storage.ParquetSink`). The default is 'json'.
+    compression : str, optional
+        Only used if `output_format` is 'json'. Either 'gzip', 'zstd' or 'bz2' to
+        compress the output files, or None. The default is None.
+    incremental : bool, optional
+        If True, existing outputs are not an error: only the files which are new or were
+        modified since they were last reduced are (re)processed, or all of them if the
+        parameters or the code changed (see `manifest.Manifest`). The default is False.
+    user_table : bool, optional
+        If True, the users are written to a separate table next to the output (see
+        `users.UserTable`), and the tweets only contain their `user_id` and
+        `retweet_from_id` instead of `username`, `follower_count` and `retweet_from`.
+        The default is False.
 
     Returns
     -------
@@ -155,35 +436,86 @@ def reduce_and_save(path: str, attributes: list[str] = LIGHTWEIGHT_ATTRIBUTES) -
 
     """
     
+    output_compression = compression if output_format == 'json' else None
+    
     if os.path.isdir(path):
         if path[-1] == '/':
             path = path[0:-1]
         new_folder = path + '_lightweight'
         os.makedirs(new_folder, exist_ok=True)
-        files = [file for file in os.listdir(path) if not file.startswith('.')]
+        # Sorted, so that users are numbered in order of appearance
+        files = sorted(file for file in os.listdir(path) if not file.startswith('.'))
         filenames = [os.path.join(path, file) for file in files]
-        new_filenames = [os.path.join(new_folder, file) for file in files]
+        new_filenames = [os.path.join(new_folder, compression_module.with_extension(file, output_compression))
+                         for file in files]
         # Loop over new filename to avoid overwriting some
         for file in new_filenames:
-            if os.path.exists(file):
+            if not incremental and storage.sink_exists(file, output_format):
                 raise ValueError(('It seems like at least one file in this folder was '
                                   'already reduced. This would overwrite it.'))
-        for file, new_file in tqdm(zip(filenames, new_filenames), total=len(filenames)):
-            # process the tweets and create a dataframe to easily save them back
-            df = reduce(file, attributes)
-            df.to_json(new_file, orient="records", lines=True)
+        
+        if user_table:
+            table, table_path = _open_user_table(new_folder, output_format, output_compression, incremental)
+        if incremental:
+            record, key = _incremental_manifest(new_folder, attributes, output_format, output_compression,
+                                                user_table)
+            indices = record.outdated(filenames, [[file] for file in new_filenames], key)
+            print(f'{len(filenames) - len(indices)}/{len(filenames)} files are already up to date.')
+            filenames = [filenames[i] for i in indices]
+            new_filenames = [new_filenames[i] for i in indices]
+            
+        reduced = []
+        try:
+            for file, new_file in tqdm(zip(filenames, new_filenames), total=len(filenames)):
+                # process the tweets and create a dataframe to easily save them back
+                df = reduce(file, attributes)
+                if user_table:
+                    df = table.encode(df)
+                with storage.open_sink(new_file, output_format) as sink:
+                    sink.write(df)
+                reduced.append((file, new_file))
+        finally:
+            # The table is saved once (even if a file fails), and before the files are recorded,
+            # so that recorded outputs never reference unknown users
+            if user_table:
+                table.save(table_path)
+            if incremental:
+                for file, new_file in reduced:
+                    record.record(file, key, [new_file])
         
         
     else:
-        # Removes current extension and add `_lightweight.json` instead
-        new_filename = path.rsplit('.', 1)[0] + '_lightweight.json'
-        if os.path.exists(new_filename):
+        base = compression_module.strip_extension(path).rsplit('.', 1)[0]
+        if output_format == 'parquet':
+            # Partitioned files are written inside a `_lightweight` folder
+            new_filename = os.path.join(base + '_lightweight', os.path.basename(path))
+        else:
+            # Removes current extension and add `_lightweight.json` instead
+            new_filename = compression_module.with_extension(base + '_lightweight.json', output_compression)
+        if not incremental and storage.sink_exists(new_filename, output_format):
             raise ValueError(('It seems like this file was already reduced. This '
                               'would overwrite it.'))
+        
+        if user_table:
+            output = os.path.dirname(new_filename) if output_format == 'parquet' else new_filename
+            table, table_path = _open_user_table(output, output_format, output_compression, incremental)
+        if incremental:
+            record, key = _incremental_manifest(os.path.dirname(new_filename), attributes, output_format,
+                                                output_compression, user_table)
+            if len(record.outdated([path], [[new_filename]], key)) == 0:
+                print('The file is already up to date.')
+                return
 
         # process the tweets and create a dataframe to easily save them back
         df = reduce(path, attributes)
-        df.to_json(new_filename, orient="records", lines=True)
+        if user_table:
+            df = table.encode(df)
+        with storage.open_sink(new_filename, output_format) as sink:
+            sink.write(df)
+        if user_table:
+            table.save(table_path)
+        if incremental:
+            record.record(path, key, [new_filename])
         
         
     
@@ -195,9 +527,22 @@ if __name__ == '__main__':
                         help='Path to the processed tweet file or folder.')
     parser.add_argument('--attributes', nargs='+', default=LIGHTWEIGHT_ATTRIBUTES,
                         help='All the columns we want to keep.')
+    parser.add_argument('--format', type=str, choices=storage.OUTPUT_FORMATS, default='json',
+                        help='The output format. The default is json.')
+    parser.add_argument('--compression', type=str, choices=list(compression_module.EXTENSIONS.keys()),
+                        default=None, help='Compress the json outputs. The default is no compression.')
+    parser.add_argument('--incremental', type=str, choices=['True', 'False'], default='False',
+                        help=('Whether to only reduce the files which are new or were modified since '
+                              'the last run, instead of refusing to overwrite outputs. The default is False.'))
+    parser.add_argument('--user_table', type=str, choices=['True', 'False'], default='False',
+                        help=('Whether to write the users to a separate table, and only reference them by '
+                              'id in the tweets. The default is False.'))
     args = parser.parse_args()
     
+    incremental = True if args.incremental == 'True' else False
+    user_table = True if args.user_table == 'True' else False
     
-    reduce_and_save(args.path, attributes=args.attributes)
+    reduce_and_save(args.path, attributes=args.attributes, output_format=args.format,
+                    compression=args.compression, incremental=incremental, user_table=user_table)
     
     
\ No newline at end of file
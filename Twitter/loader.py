@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:26:44 2026
+
+@author: cyrilvallez
+"""
+
+import os
+import re
+import json
+import glob
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+import json_codec
+import storage
+import compression
+
+PROJECT_FOLDER = os.path.dirname(os.path.dirname(__file__))
+DATA_FOLDER = PROJECT_FOLDER + '/Data/'
+
+# Location of the lightweight datasets (the same as in the Julia `load_dataset`), relative
+# to DATA_FOLDER
+DATASETS = {
+    'COP26': 'Twitter/COP26_processed_lightweight',
+    'COP27': 'Twitter/COP27_processed_lightweight',
+    'RandomDays': 'Twitter/Random_days_processed_lightweight',
+    'Skripal': 'BrandWatch/Skripal/skripal_clean_lightweight.json',
+    }
+
+# Name of the file caching the time range of the json files of a folder. It does not
+# have a json extension so that it is not mistaken for data.
+STATS_NAME = '.stats'
+
+# Time interval encoded in the names of the files created by `utils.format_filename`
+INTERVAL_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2}T\d{2}-\d{2})_to_(\d{4}-\d{2}-\d{2}T\d{2}-\d{2})$')
+
+
+def to_timestamp(date) -> pd.Timestamp:
+    """
+    Convert a date (str, datetime, etc.) to a pandas Timestamp in UTC. Naive dates
+    are assumed to be in UTC.
+    """
+
+    if date is None:
+        return None
+    date = pd.Timestamp(date)
+    return date.tz_localize('UTC') if date.tzinfo is None else date.tz_convert('UTC')
+
+
+
+def dataset_path(dataset: str) -> str:
+    """
+    Return the path of `dataset`, which can be one of DATASETS, or directly the path to
+    a lightweight file or folder.
+    """
+
+    if dataset in DATASETS:
+        return DATA_FOLDER + DATASETS[dataset]
+    if not os.path.exists(dataset):
+        raise ValueError(f'The dataset must be one of {list(DATASETS.keys())} or an existing path.')
+    return dataset
+
+
+
+def filename_interval(filename: str) -> tuple[pd.Timestamp, pd.Timestamp]:
+    """
+    Return the time interval [start, end) of the tweets in `filename`, as encoded by
+    `utils.format_filename`, or None if the name does not contain it.
+    """
+
+    name = os.path.basename(compression.strip_extension(filename)).rsplit('.', 1)[0]
+    match = INTERVAL_PATTERN.match(name)
+    if match is None:
+        return None
+    start, end = (pd.to_datetime(date, format='%Y-%m-%dT%H-%M', utc=True) for date in match.groups())
+    return start, end
+
+
+
+def _overlaps(first: pd.Timestamp, last: pd.Timestamp, start: pd.Timestamp, end: pd.Timestamp,
+              closed: bool = True) -> bool:
+    """
+    Check if [`first`, `last`] (or [`first`, `last`) if `closed` is False) intersects
+    [`start`, `end`). None means unbounded.
+    """
+
+    if start is not None and (last < start or (not closed and last == start)):
+        return False
+    if end is not None and first >= end:
+        return False
+    return True
+
+
+
+class FileStats(object):
+    """
+    Cache of the time range of the tweets (min and max of `created_at`) of each json
+    file in a folder, stored in a hidden file of the folder. Entries are invalidated
+    when the size or modification time of the file changes. The stats are recorded
+    when files are read by `load_dataset`, so that they never require an additional pass.
+    """
+
+    def __init__(self, folder: str):
+
+        self.path = os.path.join(folder, STATS_NAME)
+        self.entries = {}
+        self.modified = False
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as file:
+                self.entries = json.load(file)
+
+
+    def get(self, filename: str) -> tuple[pd.Timestamp, pd.Timestamp]:
+        """
+        Return the min and max `created_at` of the tweets in `filename`, or None if
+        unknown (or if the file is empty).
+        """
+
+        entry = self.entries.get(os.path.basename(filename))
+        stat = os.stat(filename)
+        if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime_ns:
+            return None
+        if entry['min'] is None:
+            return None
+        return to_timestamp(entry['min']), to_timestamp(entry['max'])
+
+
+    def record(self, filename: str, times: pd.Series) -> None:
+        """
+        Record the time range of the tweets in `filename`, given all their `created_at`.
+        """
+
+        stat = os.stat(filename)
+        empty = len(times) == 0 or times.isna().all()
+        self.entries[os.path.basename(filename)] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'min': None if empty else times.min().isoformat(),
+            'max': None if empty else times.max().isoformat(),
+            }
+        self.modified = True
+
+
+    def save(self) -> None:
+        """
+        Atomically write the stats to disk (if they changed).
+        """
+
+        if not self.modified:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as file:
+            json.dump(self.entries, file, indent=1)
+        os.replace(tmp, self.path)
+        self.modified = False
+
+
+
+def _select_columns(columns: list[str]) -> list[str]:
+
+    return None if columns is None else list(dict.fromkeys(list(columns) + ['created_at']))
+
+
+
+def _load_json(files: list[str], start: pd.Timestamp, end: pd.Timestamp, columns: list[str],
+               stats: FileStats) -> pd.DataFrame:
+    """
+    Load the tweets of the json `files` in [`start`, `end`), skipping the files whose
+    name or cached stats show that they are outside the range.
+    """
+
+    frames = []
+    for file in files:
+        interval = filename_interval(file)
+        if interval is not None and not _overlaps(*interval, start, end, closed=False):
+            continue
+        known = stats.get(file)
+        if known is not None and not _overlaps(*known, start, end):
+            continue
+
+        df = json_codec.read_json_lines(file)
+        if len(df) == 0:
+            stats.record(file, pd.Series([], dtype='datetime64[ns, UTC]'))
+            continue
+        times = pd.to_datetime(df['created_at'], utc=True)
+        stats.record(file, times)
+
+        mask = pd.Series(True, index=df.index)
+        if start is not None:
+            mask &= times >= start
+        if end is not None:
+            mask &= times < end
+        df = df[mask].copy()
+        df['created_at'] = times[mask]
+        if columns is not None:
+            df = df[[column for column in columns if column in df.columns]]
+        frames.append(df)
+
+    stats.save()
+    if len(frames) == 0:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+
+def _load_parquet(folder: str, start: pd.Timestamp, end: pd.Timestamp, columns: list[str]) -> pa.Table:
+    """
+    Load the tweets in [`start`, `end`) from a folder partitioned by day (see
+    `storage.ParquetSink`). Only the partitions of the days in the range are opened,
+    and row groups are skipped based on their statistics.
+    """
+
+    files = []
+    for partition in sorted(glob.glob(os.path.join(folder, 'day=*'))):
+        day = to_timestamp(os.path.basename(partition).split('=', 1)[1])
+        if _overlaps(day, day + pd.Timedelta(days=1), start, end, closed=False):
+            files.extend(sorted(glob.glob(os.path.join(partition, '*.parquet'))))
+
+    if len(files) == 0:
+        return None
+
+    dataset = ds.dataset(files, format='parquet')
+    timestamp = storage.COLUMN_TYPES['created_at']
+    condition = None
+    if start is not None:
+        condition = ds.field('created_at') >= pa.scalar(start, type=timestamp)
+    if end is not None:
+        before = ds.field('created_at') < pa.scalar(end, type=timestamp)
+        condition = before if condition is None else condition & before
+
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+
+def load_dataset(dataset: str, start=None, end=None, columns: list[str] = None,
+                 to_arrow: bool = False):
+    """
+    Load the lightweight tweets of `dataset` (json or parquet) created in the interval
+    [`start`, `end`), reading as little data as possible: json files whose name (see
+    `utils.format_filename`) or cached time range (see `FileStats`) do not intersect the
+    interval are skipped, and for parquet, only the day partitions and row groups in the
+    interval are read, and only the given `columns`. Contrary to the Julia `load_dataset`,
+    the days of RandomDays are not shifted and follower counts are not modified.
+
+    Parameters
+    ----------
+    dataset : str
+        One of DATASETS, or the path to a lightweight file or folder.
+    start : str | datetime, optional
+        The first date (inclusive). Naive dates are in UTC. Give None to load from
+        the beginning. The default is None.
+    end : str | datetime, optional
+        The last date (exclusive). Give None to load until the end. The default is None.
+    columns : list[str], optional
+        The columns to load. `created_at` is always loaded. Give None to load all
+        columns. The default is None.
+    to_arrow : bool, optional
+        Whether to return an arrow Table instead of a DataFrame. The default is False.
+
+    Returns
+    -------
+    pd.DataFrame | pa.Table
+        The tweets, with `created_at` as UTC datetimes.
+
+    """
+
+    path = dataset_path(dataset)
+    start, end = to_timestamp(start), to_timestamp(end)
+    columns = _select_columns(columns)
+
+    is_parquet = os.path.isdir(path) and len(glob.glob(os.path.join(path, 'day=*'))) > 0
+    if is_parquet:
+        table = _load_parquet(path, start, end, columns)
+        if table is None:
+            df = pd.DataFrame(columns=columns)
+            return storage.to_arrow(df) if to_arrow else df
+        return table if to_arrow else table.to_pandas()
+
+    if os.path.isdir(path):
+        files = sorted(os.path.join(path, file) for file in os.listdir(path) if not file.startswith('.'))
+        stats = FileStats(path)
+    else:
+        files = [path]
+        stats = FileStats(os.path.dirname(path))
+
+    df = _load_json(files, start, end, columns, stats)
+    return storage.to_arrow(df) if to_arrow else df
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:48:21 2026
+
+@author: cyrilvallez
+"""
+
+import os
+import json
+import hashlib
+
+import storage
+
+# Name of the manifest file, written in the output folder. It does not have a json extension
+# so that it is not mistaken for data.
+MANIFEST_NAME = '.manifest'
+
+# Size of the blocks read when hashing a file
+BLOCK_SIZE = 1024**2
+
+
+def file_hash(path: str) -> str:
+    """
+    Return a hash of the content of a file.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+
+    Returns
+    -------
+    str
+        The hexadecimal digest.
+
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+
+def code_version(*modules) -> str:
+    """
+    Return a hash of the source code of `modules`, which changes whenever one of
+    them is modified.
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    for module in modules:
+        with open(module.__file__, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+
+def fingerprint(params: dict) -> str:
+    """
+    Return a hash of the parameters (and code version) used to create an output.
+    The values must be json serializable (or convertible to str).
+    """
+
+    dump = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.blake2b(dump.encode('utf-8'), digest_size=16).hexdigest()
+
+
+
+class Manifest(object):
+    """
+    Record of the input files already processed into an output folder: for each input,
+    its size, modification time and content hash, the fingerprint of the parameters
+    and code used (see `fingerprint`), and the outputs created. This allows to only
+    process new or modified inputs, and to rebuild everything when the parameters or
+    the code change.
+
+    Inputs are identified by their path relative to the folder of the manifest.
+    """
+
+    def __init__(self, path: str):
+
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                self.entries = json.load(file)
+
+
+    @classmethod
+    def in_folder(cls, folder: str):
+        """
+        Return the manifest of `folder`.
+        """
+
+        return cls(os.path.join(folder, MANIFEST_NAME))
+
+
+    def _key(self, filename: str) -> str:
+
+        return os.path.relpath(os.path.abspath(filename), os.path.dirname(os.path.abspath(self.path)))
+
+
+    def is_current(self, filename: str, key: str) -> bool:
+        """
+        Check if `filename` was already processed with the parameters and code giving
+        the fingerprint `key`, and was not modified since. The content is only hashed if
+        the size is the same but the modification time changed.
+
+        Parameters
+        ----------
+        filename : str
+            The input file.
+        key : str
+            The current fingerprint.
+
+        Returns
+        -------
+        bool
+            Whether the outputs of the file are up to date.
+
+        """
+
+        entry = self.entries.get(self._key(filename))
+        if entry is None or entry['fingerprint'] != key:
+            return False
+
+        stat = os.stat(filename)
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime_ns == entry['mtime']:
+            return True
+
+        # The file was touched, check if the content actually changed
+        if file_hash(filename) != entry['hash']:
+            return False
+        entry['mtime'] = stat.st_mtime_ns
+        self.save()
+        return True
+
+
+    def outputs(self, filename: str) -> list[str]:
+        """
+        Return the outputs recorded for `filename`.
+        """
+
+        entry = self.entries.get(self._key(filename))
+        folder = os.path.dirname(os.path.abspath(self.path))
+        return [os.path.join(folder, output) for output in entry['outputs']] if entry is not None else []
+
+
+    def outdated(self, filenames: list[str], outputs: list[list[str]], key: str) -> list[int]:
+        """
+        Return the indices of the `filenames` which are new or were modified, or were
+        processed with another fingerprint than `key`. Their previous outputs (as
+        recorded, and as given in `outputs`) are removed, so that they can be written again.
+
+        Parameters
+        ----------
+        filenames : list[str]
+            The input files.
+        outputs : list[list[str]]
+            The outputs of each input file (see `storage.open_sink`).
+        key : str
+            The current fingerprint.
+
+        Returns
+        -------
+        list[int]
+            The indices of the files to process.
+
+        """
+
+        indices = []
+        for i, (filename, files) in enumerate(zip(filenames, outputs)):
+            if self.is_current(filename, key):
+                continue
+            for file in set(self.outputs(filename) + files):
+                storage.remove_sink(file)
+            indices.append(i)
+        return indices
+
+
+    def record(self, filename: str, key: str, outputs: list[str]) -> None:
+        """
+        Record that `filename` was processed into `outputs`, with the fingerprint `key`,
+        and write the manifest to disk.
+        """
+
+        stat = os.stat(filename)
+        folder = os.path.dirname(os.path.abspath(self.path))
+        self.entries[self._key(filename)] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'hash': file_hash(filename),
+            'fingerprint': key,
+            'outputs': [os.path.relpath(os.path.abspath(output), folder) for output in outputs],
+            }
+        self.save()
+
+
+    def save(self) -> None:
+        """
+        Atomically write the manifest to disk.
+        """
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as file:
+            json.dump(self.entries, file, indent=1)
+        os.replace(tmp, self.path)
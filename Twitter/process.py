@@ -7,17 +7,23 @@ Created on Wed Oct 26 09:32:25 2022
 """
 
 import pandas as pd
-import nltk
-import json
-import urlexpander
-import tldextract
 import os
+import sys
 import argparse
+import multiprocessing as mp
+from collections import deque
 from tqdm import tqdm
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
 
-nltk.download('vader_lexicon', quiet=True)
-ANALYZER = SentimentIntensityAnalyzer()
+import url_cache
+import domains
+import async_expand
+import json_codec
+import lightweight
+import storage
+import compression as compression_module
+import sentiment as sentiment_scoring
+import manifest
+import dedup
 
 # =============================================================================
 # Parsing and processing of twitter attributes
@@ -209,7 +215,8 @@ def get_original_author(tweet: dict) -> str:
 def get_sentiment(original_text: str) -> str:
     """
     Returns the sentiment of the text of a tweet. This is a baseline using
-    the naive VADER sentiment analysis tool.
+    the naive VADER sentiment analysis tool. Scores are cached (see
+    `sentiment.SentimentScorer`).
 
     Parameters
     ----------
@@ -223,15 +230,11 @@ def get_sentiment(original_text: str) -> str:
 
     """
     
-    compound = ANALYZER.polarity_scores(original_text)['compound']
-    if compound > 0.05:
-        return 'positive'
-    elif compound < -0.05:
-        return 'negative'
-    else:
-        return 'neutral'
+    return sentiment_scoring.get_scorer().score(original_text)
     
     
+
+
 def get_urls(tweet: dict, category: list[str], try_expand: bool = True) -> list[str]:
     """
     Extract all URLs appearing in a tweet.
@@ -279,13 +282,8 @@ def get_urls(tweet: dict, category: list[str], try_expand: bool = True) -> list[
                         urls.append(dic['expanded_url'])
                 
     if try_expand:
-        for i, url in enumerate(urls):
-            if urlexpander.is_short(url) or 'act.gp' in url:
-                try:
-                    urls[i] = urlexpander.expand(url)
-                except:
-                    # In this case we do nothing
-                    pass
+        # Expansions are cached on disk, so that each short URL is only expanded once
+        urls = url_cache.get_cache().expand_all(urls)
                 
     if len(urls) == 0:
         urls = float('nan')
@@ -350,11 +348,7 @@ def get_domain_and_suffix(urls: list[str]) -> list[str]:
     if type(urls) == float:
         return float('nan')
     
-    parsing = [tldextract.extract(url) for url in urls]
-    # Join the domain and suffix into a single string
-    domain = ['.'.join(part for part in url[1:] if part) for url in parsing]
-    
-    return domain
+    return domains.get_domain_and_suffix(urls)
 
 
 
@@ -371,6 +365,212 @@ ATTRIBUTES_TO_PRESERVE = [
     'text'
     ]
 
+# Approximate size (in bytes) of the line ranges dispatched to each worker process
+SHARD_SIZE = 32*1024**2
+
+# Maximum number of processed tweets held in memory at once when streaming a file
+CHUNK_SIZE = 10000
+
+
+def process_tweet(tweet: dict, try_expand: bool = True, sentiment: bool = True) -> dict:
+    """
+    Process a single tweet to conserve only the interesting attributes.
+
+    Parameters
+    ----------
+    tweet : dict
+        A tweet as returned by the twitter API.
+    try_expand : bool, optional
+        Whether to try to manually expand URLs that Twitter did not expand.
+        The default is True.
+    sentiment : bool, optional
+        Whether to compute the sentiment of the tweet. If False, the sentiment
+        is set to None (this allows to compute it later, only for the tweets we
+        keep). The default is True.
+
+    Returns
+    -------
+    dic : dict
+        The processed tweet.
+
+    """
+    
+    dic = {}
+    for attribute in ATTRIBUTES_TO_PRESERVE:
+        dic[attribute] = tweet[attribute]
+    dic['username'] = get_username(tweet)
+    dic['follower_count'] = get_followers_count(tweet)
+    dic['tweet_count'] = get_tweet_count(tweet)
+    dic['country'] = get_country(tweet)
+    dic['country_code'] = get_country_code(tweet)
+    dic['category'] = get_tweet_category(tweet)
+    dic['original_text'] = get_original_text(tweet, dic['category'])
+    dic['original_author'] = get_original_author(tweet)
+    dic['sentiment'] = get_sentiment(dic['original_text']) if sentiment else None
+    dic['urls'] = get_urls(tweet, dic['category'], try_expand)
+    dic['hashtags'] = get_hashtags(tweet, dic['category'])
+    dic['domain'] = get_domain_and_suffix(dic['urls'])
+    
+    return dic
+
+
+def expand_records(dics: list[dict]) -> None:
+    """
+    Expand all the short URLs of already processed tweets at once (inplace), and
+    update their domains accordingly. All short URLs not already in the cache are
+    first collected, then resolved concurrently (see `async_expand.expand_urls`).
+
+    Parameters
+    ----------
+    dics : list[dict]
+        The processed tweets, as returned by `process_tweet(tweet, try_expand=False)`.
+
+    Returns
+    -------
+    None
+
+    """
+    
+    urls = [url for dic in dics if type(dic['urls']) == list for url in dic['urls']]
+    mapping = url_cache.get_cache().prefetch(urls, async_expand.expand_urls)
+    
+    if len(mapping) == 0:
+        return
+    
+    for dic in dics:
+        if type(dic['urls']) == list and any(url in mapping for url in dic['urls']):
+            # If the expansion failed, we keep the original url
+            dic['urls'] = [mapping.get(url) or url for url in dic['urls']]
+            dic['domain'] = get_domain_and_suffix(dic['urls'])
+            
+            
+            
+def score_records(dics: list[dict]) -> None:
+    """
+    Compute the sentiment of already processed tweets at once (inplace). Each distinct
+    original text is only scored once (see `sentiment.SentimentScorer`).
+
+    Parameters
+    ----------
+    dics : list[dict]
+        The processed tweets, as returned by `process_tweet(tweet, sentiment=False)`.
+
+    Returns
+    -------
+    None
+
+    """
+    
+    sentiments = sentiment_scoring.get_scorer().score_many([dic['original_text'] for dic in dics])
+    for dic, sentiment in zip(dics, sentiments):
+        dic['sentiment'] = sentiment
+            
+            
+
+def _iter_lines(filename: str, skiprows: int = 2, start: int = 0, end: int = None,
+                bar: tqdm = None):
+    """
+    Iterate over the (raw) lines in the byte range [`start`, `end`) of a file, skipping
+    the `skiprows` first lines of the file if the range begins the file, and updating
+    `bar` with the number of bytes read. Compressed files (see `compression.compression_of`)
+    are always read entirely, and the bytes counted are compressed bytes, so that
+    the size of the file can be used as total of the bar.
+    """
+    
+    if end is None:
+        end = os.path.getsize(filename)
+    to_skip = skiprows if start == 0 else 0
+    compressed = compression_module.compression_of(filename)
+    
+    with open(filename, 'rb') as raw:
+        if compressed is None:
+            raw.seek(start)
+            file = raw
+        else:
+            start, end = 0, float('inf')
+            file = compression_module.reader(raw, compressed)
+        position = start
+        
+        while position < end:
+            line = file.readline()
+            new_position = position + len(line) if compressed is None else raw.tell()
+            if bar is not None:
+                bar.update(new_position - position)
+            position = new_position
+            if not line:
+                break
+            
+            if to_skip > 0:
+                to_skip -= 1
+                continue
+            
+            yield line
+            
+            
+
+def iter_tweets(filename: str, try_expand: bool = True, skiprows: int = 2,
+                chunk_size: int = CHUNK_SIZE, start: int = 0, end: int = None,
+                bar: tqdm = None, index: dedup.TweetIndex = None):
+    """
+    Lazily load and process the tweets from file, yielding them in chunks of at
+    most `chunk_size` processed tweets. Only one chunk is held in memory at a time.
+    It is possible to only process the lines in the byte range [`start`, `end`) of
+    the file (see `split_file`). In this case, the `skiprows` first lines are only
+    skipped if the range begins the file.
+
+    Parameters
+    ----------
+    filename : str
+        The path to the file.
+    try_expand : bool, optional
+        Whether to try to manually expand URLs that Twitter did not expand.
+        URLs are expanded all at once for each chunk. The default is True.
+    skiprows : int, optional
+        The number of lines to skip at the beginning of the file. The default is 2.
+    chunk_size : int, optional
+        The maximum number of tweets in each chunk. The default is CHUNK_SIZE.
+    start : int, optional
+        Byte offset of the first line to process. The default is 0.
+    end : int, optional
+        Byte offset after the last line to process. Give `None` to process until
+        the end of the file. The default is None.
+    bar : tqdm, optional
+        A progress bar to update with the number of bytes read. The default is None.
+    index : dedup.TweetIndex, optional
+        If given, tweets already in the index are skipped, and the others are claimed
+        (see `dedup.TweetIndex.claim`). The default is None.
+
+    Yields
+    ------
+    dics : list[dict]
+        The processed tweets.
+
+    """
+    
+    dics = []
+    
+    for line in _iter_lines(filename, skiprows, start, end, bar):
+            
+        tweet = json_codec.loads(line)
+        if index is not None and not index.claim(int(tweet['id']), filename):
+            continue
+        # URLs and sentiments are computed all at once for each chunk
+        dics.append(process_tweet(tweet, try_expand=False, sentiment=False))
+        
+        if len(dics) == chunk_size:
+            score_records(dics)
+            if try_expand:
+                expand_records(dics)
+            yield dics
+            dics = []
+                
+    if len(dics) > 0:
+        score_records(dics)
+        if try_expand:
+            expand_records(dics)
+        yield dics
+            
+            
 
 def process_tweets(filename: str, to_df: bool = True, try_expand: bool = True,
                 skiprows: int = 2, keep_bar: bool = True):
@@ -402,53 +602,500 @@ def process_tweets(filename: str, to_df: bool = True, try_expand: bool = True,
     
     """
     
-    dics = []
+    # The bar counts bytes, so that we do not need to read the file twice to count the lines
+    with tqdm(total=os.path.getsize(filename), unit='B', unit_scale=True, leave=keep_bar) as bar:
+        dics = [dic for chunk in iter_tweets(filename, try_expand, skiprows, bar=bar) for dic in chunk]
+            
+    if to_df:
+        return pd.DataFrame.from_records(dics)
+    else:
+        return dics
+    
     
-    # small overhead (negligible compared to total time) but allows to get the
-    # number of lines to pass to tqdm
-    with open(filename, 'r') as file: 
-        N_lines = sum(1 for _ in file) 
+    
+def is_candidate(tweet: dict, news_domains, try_expand: bool = True) -> bool:
+    """
+    Cheaply check if a raw tweet may be kept in the lightweight dataset, i.e. if
+    one of its domains matches a news source, or if it contains short URLs which
+    may be expanded into one. This only parses the URLs of the tweet.
+
+    Parameters
+    ----------
+    tweet : dict
+        A tweet as returned by the twitter API.
+    news_domains : set[str]
+        The domains of the news sources.
+    try_expand : bool, optional
+        Whether short URLs will be expanded. The default is True.
 
-    with open(filename, 'r') as file:
+    Returns
+    -------
+    bool
+        Whether the tweet may be kept.
+
+    """
     
-        for i, line in tqdm(enumerate(file), total=N_lines, leave=keep_bar):
+    urls = get_urls(tweet, get_tweet_category(tweet), try_expand=False)
+    if type(urls) == float:
+        return False
+    if try_expand and any(url_cache.needs_expansion(url) for url in urls):
+        return True
+    
+    return lightweight.isin(get_domain_and_suffix(urls), news_domains)
 
-            if i < skiprows:
-                continue
+
+
+def _reduce_chunk(dics: list[dict], news_domains, try_expand: bool, attributes: list[str],
+                  keep_processed: bool) -> tuple[list[dict], pd.DataFrame]:
+    """
+    Expand the URLs of a chunk of processed tweets, then reduce them to the lightweight
+    format (indexed by tweet id). If `keep_processed` is False, the sentiment is only computed
+    for the tweets matching a news source.
+    """
+    
+    if try_expand:
+        expand_records(dics)
+        
+    if keep_processed:
+        kept = dics
+    else:
+        kept = [dic for dic in dics if lightweight.isin(dic['domain'], news_domains)]
+    score_records(kept)
             
-            tweet = json.loads(line)
-            dic = {}
-            for attribute in ATTRIBUTES_TO_PRESERVE:
-                dic[attribute] = tweet[attribute]
-            dic['username'] = get_username(tweet)
-            dic['follower_count'] = get_followers_count(tweet)
-            dic['tweet_count'] = get_tweet_count(tweet)
-            dic['country'] = get_country(tweet)
-            dic['country_code'] = get_country_code(tweet)
-            dic['category'] = get_tweet_category(tweet)
-            dic['original_text'] = get_original_text(tweet, dic['category'])
-            dic['original_author'] = get_original_author(tweet)
-            dic['sentiment'] = get_sentiment(dic['original_text'])
-            dic['urls'] = get_urls(tweet, dic['category'], try_expand)
-            dic['hashtags'] = get_hashtags(tweet, dic['category'])
-            dic['domain'] = get_domain_and_suffix(dic['urls'])
+    if len(kept) > 0:
+        reduced = lightweight.reduce_df(pd.DataFrame.from_records(kept), attributes)
+        # Index by tweet id (the index is not written), so that rows can be matched to tweets
+        reduced.index = pd.Index([int(kept[i]['id']) for i in reduced.index], name='id')
+    else:
+        reduced = None
+    
+    return (dics if keep_processed else None), reduced
+
+
+
+def iter_lightweight(filename: str, try_expand: bool = True, skiprows: int = 2,
+                     attributes: list[str] = lightweight.LIGHTWEIGHT_ATTRIBUTES,
+                     keep_processed: bool = False, chunk_size: int = CHUNK_SIZE,
+                     start: int = 0, end: int = None, bar: tqdm = None,
+                     index: dedup.TweetIndex = None):
+    """
+    Lazily load raw tweets from file, and directly reduce them to the lightweight format
+    (see `lightweight.reduce_df`), in a single pass. If `keep_processed` is False, tweets
+    which cannot match a news source are discarded before any processing, so that sentiment
+    analysis and URL expansion are only performed for the tweets we keep.
+
+    Parameters
+    ----------
+    filename : str
+        The path to the file.
+    try_expand : bool, optional
+        Whether to try to manually expand URLs that Twitter did not expand.
+        The default is True.
+    skiprows : int, optional
+        The number of lines to skip at the beginning of the file. The default is 2.
+    attributes : list[str], optional
+        The columns to keep in the lightweight tweets. The default is lightweight.LIGHTWEIGHT_ATTRIBUTES.
+    keep_processed : bool, optional
+        Whether to also return the fully processed tweets (in this case, all tweets
+        are processed). The default is False.
+    chunk_size : int, optional
+        The maximum number of tweets in each chunk. The default is CHUNK_SIZE.
+    start : int, optional
+        Byte offset of the first line to process. The default is 0.
+    end : int, optional
+        Byte offset after the last line to process. Give `None` to process until
+        the end of the file. The default is None.
+    bar : tqdm, optional
+        A progress bar to update with the number of bytes read. The default is None.
+    index : dedup.TweetIndex, optional
+        If given, tweets already in the index are skipped, and the others are claimed
+        (see `dedup.TweetIndex.claim`). The default is None.
+
+    Yields
+    ------
+    processed : list[dict]
+        The processed tweets (None if `keep_processed` is False).
+    reduced : pd.DataFrame
+        The lightweight tweets, indexed by tweet id (None if no tweets were kept).
+
+    """
+    
+    news_domains = frozenset(lightweight.load_news_index().index)
+    dics = []
+    
+    for line in _iter_lines(filename, skiprows, start, end, bar):
+            
+        tweet = json_codec.loads(line)
+        # All tweets are claimed, even if they are then discarded
+        if index is not None and not index.claim(int(tweet['id']), filename):
+            continue
+        if not keep_processed and not is_candidate(tweet, news_domains, try_expand):
+            continue
+        dics.append(process_tweet(tweet, try_expand=False, sentiment=False))
+        
+        if len(dics) == chunk_size:
+            yield _reduce_chunk(dics, news_domains, try_expand, attributes, keep_processed)
+            dics = []
+                
+    if len(dics) > 0:
+        yield _reduce_chunk(dics, news_domains, try_expand, attributes, keep_processed)
+    
+    
+    
+def write_records(chunks, filename: str, output_format: str = 'json') -> None:
+    """
+    Write chunks of processed tweets (as returned by `iter_tweets`) to `filename`
+    as they arrive, so that only one chunk is held in memory at a time. For json,
+    the output is the same as calling `to_json(filename, orient="records", lines=True)`
+    on the DataFrame of all tweets. For parquet, see `storage.ParquetSink`.
+
+    Parameters
+    ----------
+    chunks : Iterable[list[dict]]
+        The chunks of processed tweets.
+    filename : str
+        Where to save the tweets.
+    output_format : str, optional
+        The output format, either 'json' or 'parquet'. The default is 'json'.
+
+    Returns
+    -------
+    None
+
+    """
+    
+    with storage.open_sink(filename, output_format) as sink:
+        for chunk in chunks:
+            sink.write(chunk)
             
-            dics.append(dic)
             
             
-    if to_df:
-        return pd.DataFrame.from_records(dics)
+def write_lightweight(chunks, filename: str, processed_filename: str = None,
+                      output_format: str = 'json') -> None:
+    """
+    Write the chunks returned by `iter_lightweight` as they arrive: the lightweight tweets
+    to `filename`, and the processed tweets to `processed_filename` (if given).
+
+    Parameters
+    ----------
+    chunks : Iterable[tuple[list[dict], pd.DataFrame]]
+        The chunks of processed and lightweight tweets.
+    filename : str
+        Where to save the lightweight tweets.
+    processed_filename : str, optional
+        Where to save the processed tweets. The default is None.
+    output_format : str, optional
+        The output format, either 'json' or 'parquet'. The default is 'json'.
+
+    Returns
+    -------
+    None
+
+    """
+    
+    processed_sink = storage.open_sink(processed_filename, output_format) if processed_filename is not None else None
+    
+    try:
+        with storage.open_sink(filename, output_format) as sink:
+            for processed, reduced in chunks:
+                sink.write(reduced)
+                if processed_sink is not None:
+                    processed_sink.write(processed)
+    finally:
+        if processed_sink is not None:
+            processed_sink.close()
+    
+    
+    
+def split_file(filename: str, shard_size: int = SHARD_SIZE) -> list[tuple[int, int]]:
+    """
+    Split a file into contiguous byte ranges of approximately `shard_size` bytes,
+    each starting at the beginning of a line and ending right after a newline
+    (or at the end of the file). Compressed files cannot be split, and are
+    returned as a single range.
+
+    Parameters
+    ----------
+    filename : str
+        The path to the file.
+    shard_size : int, optional
+        The approximate size of each range in bytes. The default is SHARD_SIZE.
+
+    Returns
+    -------
+    list[tuple[int, int]]
+        The (start, end) byte offsets of each range, in file order.
+
+    """
+    
+    size = os.path.getsize(filename)
+    if compression_module.compression_of(filename) is not None:
+        return [(0, size)]
+    
+    boundaries = [0]
+    
+    with open(filename, 'rb') as file:
+        while boundaries[-1] + shard_size < size:
+            file.seek(boundaries[-1] + shard_size)
+            # Move to the beginning of the next line
+            file.readline()
+            position = file.tell()
+            if position >= size:
+                break
+            boundaries.append(position)
+            
+    boundaries.append(size)
+    
+    return [(boundaries[i], boundaries[i+1]) for i in range(len(boundaries)-1)]
+    
+    
+    
+def process_shard(filename: str, start: int, end: int, try_expand: bool = True,
+                  skiprows: int = 2, index: dedup.TweetIndex = None) -> list[dict]:
+    """
+    Process the tweets contained in the byte range [`start`, `end`) of a file, as
+    returned by `split_file`. The `skiprows` first lines are only skipped for the
+    range beginning the file.
+
+    Parameters
+    ----------
+    filename : str
+        The path to the file.
+    start : int
+        Byte offset of the first line to process.
+    end : int
+        Byte offset after the last line to process.
+    try_expand : bool, optional
+        Whether to try to manually expand URLs that Twitter did not expand.
+        The default is True.
+    skiprows : int, optional
+        The number of lines to skip at the beginning of the file. The default is 2.
+    index : dedup.TweetIndex, optional
+        If given, skip the tweets already in the index (see `iter_tweets`). The default is None.
+
+    Returns
+    -------
+    list[dict]
+        The processed tweets.
+
+    """
+    
+    chunks = iter_tweets(filename, try_expand, skiprows, start=start, end=end, index=index)
+    return [dic for chunk in chunks for dic in chunk]
+
+
+
+def process_shard_lightweight(filename: str, start: int, end: int, try_expand: bool = True,
+                              skiprows: int = 2, attributes: list[str] = lightweight.LIGHTWEIGHT_ATTRIBUTES,
+                              keep_processed: bool = False,
+                              index: dedup.TweetIndex = None) -> tuple[list[dict], pd.DataFrame]:
+    """
+    Same as `process_shard`, but directly reduce the tweets to the lightweight format
+    (see `iter_lightweight`).
+
+    Returns
+    -------
+    processed : list[dict]
+        The processed tweets (None if `keep_processed` is False).
+    reduced : pd.DataFrame
+        The lightweight tweets (None if no tweets were kept).
+
+    """
+    
+    chunks = list(iter_lightweight(filename, try_expand, skiprows, attributes, keep_processed,
+                                   start=start, end=end, index=index))
+    processed = [dic for chunk, _ in chunks for dic in chunk] if keep_processed else None
+    reduced = [df for _, df in chunks if df is not None]
+    reduced = pd.concat(reduced) if len(reduced) > 0 else None
+    
+    return processed, reduced
+
+
+
+def _process_shard_star(args: tuple) -> tuple:
+    """
+    Unpack the arguments for `process_shard` (or `process_shard_lightweight` if
+    lightweight options are given), to be used with `_bounded_imap`. Also return the
+    size of the shard (in bytes) to update the progress bar, the URL cache and
+    sentiment statistics of the shard, and the ids of the tweets kept if a dedup
+    index is given (as the path to the index, see `dedup.load_index`).
+    """
+    
+    filename, start, end, try_expand, skiprows, lightweight_options, index_path = args
+    caches = (url_cache.get_cache(), sentiment_scoring.get_scorer())
+    before = [cache.counters.copy() for cache in caches]
+    index = dedup.load_index(index_path) if index_path is not None else None
+    if index is not None:
+        # Only the tweets of this shard are claimed, duplicates across shards are
+        # resolved by the main process
+        index.pending = {}
+    if lightweight_options is None:
+        result = process_shard(filename, start, end, try_expand, skiprows, index)
     else:
-        return dics
+        result = process_shard_lightweight(filename, start, end, try_expand, skiprows, *lightweight_options,
+                                           index=index)
+    ids = list(index.pending.keys()) if index is not None else None
+    return end - start, result, [cache.counters - counters for cache, counters in zip(caches, before)], ids
+
+
+
+def _bounded_imap(pool, func, tasks: list, window: int):
+    """
+    As `pool.imap(func, tasks)`, but with at most `window` tasks submitted and not yet
+    consumed, so that results of shards waiting to be written do not pile up in memory
+    when the workers are faster than the writes.
+    """
+    
+    pending = deque()
+    tasks = iter(tasks)
+    for task in tasks:
+        pending.append(pool.apply_async(func, (task,)))
+        if len(pending) >= window:
+            break
+    while len(pending) > 0:
+        result = pending.popleft().get()
+        # Submit the next task before handing over the result, to keep the workers busy
+        for task in tasks:
+            pending.append(pool.apply_async(func, (task,)))
+            break
+        yield result
+
+
+
+def _drop_tweets(shard, ids: set, lightweight_shard: bool):
+    """
+    Remove the tweets whose id is in `ids` from the result of `_process_shard_star`.
+    """
+    
+    def keep(dics):
+        return [dic for dic in dics if int(dic['id']) not in ids]
+    
+    if not lightweight_shard:
+        return keep(shard)
+    processed, reduced = shard
+    if processed is not None:
+        processed = keep(processed)
+    if reduced is not None:
+        reduced = reduced[~reduced.index.isin(ids)]
+    return processed, reduced
+
+
+
+def process_and_save_parallel(filenames: list[str], new_filenames: list[str], try_expand: bool = True,
+                              skiprows: int = 2, workers: int = os.cpu_count(),
+                              shard_size: int = SHARD_SIZE, lightweight_filenames: list[str] = None,
+                              attributes: list[str] = lightweight.LIGHTWEIGHT_ATTRIBUTES,
+                              output_format: str = 'json', callback=None,
+                              index: dedup.TweetIndex = None) -> None:
+    """
+    Process the tweets of all `filenames` and save them to `new_filenames` using
+    a pool of `workers` processes. Each file is cut into ranges of lines of approximately
+    `shard_size` bytes, so that large files are also shared between workers.
+    The order of the tweets in each output file is the same as in the input.
+
+    Parameters
+    ----------
+    filenames : list[str]
+        The paths to the raw tweet files.
+    new_filenames : list[str]
+        The paths where to save the processed tweets (one per file in `filenames`).
+        Can be None if `lightweight_filenames` is given, in which case the processed
+        tweets are not saved.
+    try_expand : bool, optional
+        Whether to try to manually expand URLs that Twitter did not expand.
+        The default is True.
+    skiprows : int, optional
+        The number of lines to skip at the beginning of each file. The default is 2.
+    workers : int, optional
+        The number of worker processes. The default is os.cpu_count().
+    shard_size : int, optional
+        The approximate size (in bytes) of the line ranges given to the workers.
+        The default is SHARD_SIZE.
+    lightweight_filenames : list[str], optional
+        If given, also reduce the tweets in the same pass (see `iter_lightweight`) and save
+        them to those paths. The default is None.
+    attributes : list[str], optional
+        The columns to keep in the lightweight tweets. The default is lightweight.LIGHTWEIGHT_ATTRIBUTES.
+    output_format : str, optional
+        The output format, either 'json' or 'parquet'. The default is 'json'.
+    callback : Callable, optional
+        If given, called with the index of each file once its outputs are fully written.
+        The default is None.
+    index : dedup.TweetIndex, optional
+        If given, skip the tweets already in the index, or seen earlier in the files.
+        The workers read the index from disk, so it must be saved beforehand. The default
+        is None.
+
+    Returns
+    -------
+    None
 
+    """
+    
+    if lightweight_filenames is None:
+        lightweight_options = None
+    else:
+        lightweight_options = (attributes, new_filenames is not None)
+    
+    tasks = []
+    # Number of shards remaining before each file is complete
+    remaining = []
+    for file in filenames:
+        shards = split_file(file, shard_size)
+        index_path = index.path if index is not None else None
+        tasks.extend((file, start, end, try_expand, skiprows, lightweight_options, index_path)
+                     for start, end in shards)
+        remaining.append(len(shards))
     
+    total_size = sum(task[2] - task[1] for task in tasks)
+    
+    with mp.Pool(workers) as pool, tqdm(total=total_size, unit='B', unit_scale=True,
+                                        desc='Processed data') as bar:
+        
+        # Results are returned in the same order as the tasks, so that shards of the
+        # same file arrive consecutively and in order. Only 2 shards per worker are in
+        # flight, so that shards processed ahead of the writes stay bounded
+        results = _bounded_imap(pool, _process_shard_star, tasks, 2*workers)
+        
+        for i, N_shards in enumerate(remaining):
+            
+            def shards():
+                for _ in range(N_shards):
+                    size, shard, (url_counters, sentiment_counters), ids = next(results)
+                    bar.update(size)
+                    url_cache.get_cache().counters.update(url_counters)
+                    sentiment_scoring.get_scorer().counters.update(sentiment_counters)
+                    if index is not None:
+                        new = index.claim_new(ids, filenames[i])
+                        if not new.all():
+                            # Tweets already kept from a previous shard of this run are dropped
+                            duplicates = {tweet_id for tweet_id, is_new in zip(ids, new) if not is_new}
+                            shard = _drop_tweets(shard, duplicates, lightweight_options is not None)
+                    yield shard
+            
+            # Shards are written as soon as they arrive
+            if lightweight_filenames is None:
+                write_records(shards(), new_filenames[i], output_format)
+            else:
+                processed_filename = new_filenames[i] if new_filenames is not None else None
+                write_lightweight(shards(), lightweight_filenames[i], processed_filename, output_format)
+                
+            if callback is not None:
+                callback(i)
+
+
 
 def process_and_save_tweets(path: str, try_expand: bool = True,
-                         skiprows: int = 2) -> None:
+                         skiprows: int = 2, workers: int = 1, fused: bool = False,
+                         keep_processed: bool = False, output_format: str = 'json',
+                         compression: str = None, incremental: bool = False,
+                         dedup_index: str = None) -> None:
     
     """
     Load the tweets from the file or folder given in `path`, process them to
     conserve only the interesting attributes, and save those processed tweets as json.
+    Tweets are processed and written in chunks, so that memory usage does not depend
+    on the size of the files. Input files may be compressed (see `compression.compression_of`).
 
     Parameters
     ----------
@@ -462,6 +1109,32 @@ def process_and_save_tweets(path: str, try_expand: bool = True,
         The number of lines to skip at the beginning of the file. This allows to discard
         lines containing the info on how the data was queried from Twitter. 
         The default is 2.
+    workers : int, optional
+        The number of processes to use. If larger than 1, files and ranges of lines
+        inside each file are processed in parallel. The default is 1.
+    fused : bool, optional
+        Whether to directly produce the lightweight tweets (as `lightweight.py` would do
+        from the processed tweets) in the same pass. The default is False.
+    keep_processed : bool, optional
+        Only used if `fused` is True. Whether to also save the processed tweets.
+        If False, tweets not matching any news source are discarded before being
+        processed. The default is False.
+    output_format : str, optional
+        Either 'json' (one file per input file, with one tweet per line) or 'parquet'
+        (typed columns, with files partitioned by day inside the output folder, see
+        `storage.ParquetSink`). The default is 'json'.
+    compression : str, optional
+        Only used if `output_format` is 'json'. Either 'gzip', 'zstd' or 'bz2' to
+        compress the output files, or None. The default is None.
+    incremental : bool, optional
+        If True, existing outputs are not an error: only the files which are new or were
+        modified since they were last processed are (re)processed, or all of them if the
+        parameters or the code changed (see `manifest.Manifest`). The default is False.
+    dedup_index : str, optional
+        Path to an index of the tweet ids already processed (see `dedup.TweetIndex`),
+        created if it does not exist. If given, tweets which were already kept from another
+        file (in this run or a previous one) are skipped, and the ids of the new tweets
+        are added to the index. The default is None.
 
     Returns
     -------
@@ -469,37 +1142,115 @@ def process_and_save_tweets(path: str, try_expand: bool = True,
 
     """
     
+    write_processed = not fused or keep_processed
+    output_compression = compression if output_format == 'json' else None
+    
     if os.path.isdir(path):
         if path[-1] == '/':
             path = path[0:-1]
         new_folder = path + '_processed'
-        os.makedirs(new_folder, exist_ok=True)
+        lightweight_folder = new_folder + '_lightweight'
         files = [file for file in os.listdir(path) if not file.startswith('.')]
         filenames = [os.path.join(path, file) for file in files]
-        new_filenames = [os.path.join(new_folder, file) for file in files]
+        # Outputs are compressed according to `compression`, not to the compression of the inputs
+        files = [compression_module.with_extension(file, output_compression) for file in files]
+        new_filenames = [os.path.join(new_folder, file) for file in files] if write_processed else None
+        lightweight_filenames = [os.path.join(lightweight_folder, file) for file in files] if fused else None
         # Loop over new filename to avoid overwriting some
-        for file in new_filenames:
-            if os.path.exists(file):
+        for file in (new_filenames or []) + (lightweight_filenames or []):
+            if not incremental and storage.sink_exists(file, output_format):
                 raise ValueError(('It seems like at least one file in this folder was '
                                   'already processed. This would overwrite it.'))
-        for file, new_file in tqdm(zip(filenames, new_filenames), total=len(filenames), desc='Processed files'):
-            # process the tweets and create a dataframe to easily save them back
-            df = process_tweets(file, to_df=True, try_expand=try_expand,
-                                skiprows=skiprows, keep_bar=False)
-            df.to_json(new_file, orient="records", lines=True)
+        if write_processed:
+            os.makedirs(new_folder, exist_ok=True)
+        if fused:
+            os.makedirs(lightweight_folder, exist_ok=True)
+        manifest_folder = new_folder if write_processed else lightweight_folder
+                
+    else:
+        base = compression_module.strip_extension(path).rsplit('.', 1)[0]
+        if output_format == 'parquet':
+            # Partitioned files are written inside `_processed` folders
+            new_filename = os.path.join(base + '_processed', os.path.basename(path))
+            lightweight_filename = os.path.join(base + '_processed_lightweight', os.path.basename(path))
+        else:
+            # Removes current extension and add `_processed.json` instead
+            new_filename = compression_module.with_extension(base + '_processed.json', output_compression)
+            lightweight_filename = compression_module.with_extension(base + '_processed_lightweight.json',
+                                                                     output_compression)
+        filenames = [path]
+        new_filenames = [new_filename] if write_processed else None
+        lightweight_filenames = [lightweight_filename] if fused else None
+        for file in (new_filenames or []) + (lightweight_filenames or []):
+            if not incremental and storage.sink_exists(file, output_format):
+                raise ValueError(('It seems like this file was already processed. This '
+                                  'would overwrite it.'))
+        manifest_folder = os.path.dirname(new_filename if write_processed else lightweight_filename)
+    
+    if incremental:
+        outputs = [[names[i] for names in (new_filenames, lightweight_filenames) if names is not None]
+                   for i in range(len(filenames))]
+        record = manifest.Manifest.in_folder(manifest_folder)
+        params = {'try_expand': try_expand, 'skiprows': skiprows, 'fused': fused,
+                  'keep_processed': keep_processed, 'output_format': output_format,
+                  'compression': output_compression, 'dedup_index': dedup_index,
+                  'code': manifest.code_version(sys.modules[__name__], domains, sentiment_scoring,
+                                                storage, lightweight)}
+        if fused:
+            params['news_table'] = manifest.file_hash(lightweight.NEWS_TABLE)
+        key = manifest.fingerprint(params)
         
+        indices = record.outdated(filenames, outputs, key)
+        print(f'{len(filenames) - len(indices)}/{len(filenames)} files are already up to date.')
+        filenames = [filenames[i] for i in indices]
+        outputs = [outputs[i] for i in indices]
+        new_filenames = [new_filenames[i] for i in indices] if write_processed else None
+        lightweight_filenames = [lightweight_filenames[i] for i in indices] if fused else None
         
+    if dedup_index is not None:
+        index = dedup.TweetIndex(dedup_index)
+        # Tweets previously kept from the files we process again are not duplicates
+        index.forget(filenames)
+        index.save()
     else:
-        # Removes current extension and add `_processed.json` instead
-        new_filename = path.rsplit('.', 1)[0] + '_processed.json'
-        if os.path.exists(new_filename):
-            raise ValueError(('It seems like this file was already processed. This '
-                              'would overwrite it.'))
-
-        # process the tweets and create a dataframe to easily save them back
-        df = process_tweets(path, to_df=True, try_expand=try_expand,
-                            skiprows=skiprows)
-        df.to_json(new_filename, orient="records", lines=True)
+        index = None
+        
+    def callback(i):
+        # Called once the outputs of filenames[i] are complete
+        if index is not None:
+            index.merge()
+        if incremental:
+            record.record(filenames[i], key, outputs[i])
+            
+    try:
+        if workers > 1:
+            process_and_save_parallel(filenames, new_filenames, try_expand=try_expand,
+                                      skiprows=skiprows, workers=workers,
+                                      lightweight_filenames=lightweight_filenames,
+                                      output_format=output_format, callback=callback, index=index)
+            return
+            
+        for i, file in enumerate(tqdm(filenames, desc='Processed files', disable=len(filenames) == 1)):
+            
+            with tqdm(total=os.path.getsize(file), unit='B', unit_scale=True, leave=len(filenames) == 1) as bar:
+                # process the tweets and save them back chunk by chunk
+                if fused:
+                    chunks = iter_lightweight(file, try_expand=try_expand, skiprows=skiprows,
+                                              keep_processed=keep_processed, bar=bar, index=index)
+                    processed_filename = new_filenames[i] if write_processed else None
+                    write_lightweight(chunks, lightweight_filenames[i], processed_filename, output_format)
+                else:
+                    chunks = iter_tweets(file, try_expand=try_expand, skiprows=skiprows, bar=bar, index=index)
+                    write_records(chunks, new_filenames[i], output_format)
+            
+            callback(i)
+            
+    finally:
+        if index is not None:
+            # Tweets claimed from a file which was not completely written are discarded
+            index.pending = {}
+            index.save()
+            print(f'{len(index)} distinct tweets in the dedup index.')
 
 
 
@@ -514,12 +1265,44 @@ if __name__ == '__main__':
                         help='Whether to try to manually expand URLs that Twitter did not expand. The default is True.')
     parser.add_argument('--skiprows', type=int, default=2,
                         help='The number of lines to skip at the beginning of the file. The default is 2.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='The number of processes to use. The default is 1.')
+    parser.add_argument('--fused', type=str, choices=['True', 'False'], default='False',
+                        help=('Whether to directly write the lightweight tweets in the same pass (as '
+                              'lightweight.py would). The default is False.'))
+    parser.add_argument('--keep_processed', type=str, choices=['True', 'False'], default='False',
+                        help='With --fused True, whether to also write the processed tweets. The default is False.')
+    parser.add_argument('--format', type=str, choices=storage.OUTPUT_FORMATS, default='json',
+                        help='The output format. The default is json.')
+    parser.add_argument('--compression', type=str, choices=list(compression_module.EXTENSIONS.keys()),
+                        default=None, help='Compress the json outputs. The default is no compression.')
+    parser.add_argument('--sentiment_workers', type=int, default=1,
+                        help=('The number of processes used to compute the sentiment of the tweets '
+                              '(only used with --workers 1). The default is 1.'))
+    parser.add_argument('--incremental', type=str, choices=['True', 'False'], default='False',
+                        help=('Whether to only process the files which are new or were modified since '
+                              'the last run, instead of refusing to overwrite outputs. The default is False.'))
+    parser.add_argument('--dedup_index', type=str, default=None,
+                        help=('Path to an index of the tweet ids already processed (created if needed). '
+                              'If given, tweets already processed from another file are skipped. '
+                              'The default is no deduplication.'))
     args = parser.parse_args()
     
     filename = args.filename
     try_expand = True if args.try_expand == 'True' else False
     skiprows = args.skiprows
+    workers = args.workers
+    fused = True if args.fused == 'True' else False
+    keep_processed = True if args.keep_processed == 'True' else False
+    output_format = args.format
+    compression = args.compression
+    incremental = True if args.incremental == 'True' else False
+    dedup_index = args.dedup_index
+    sentiment_scoring.get_scorer().workers = args.sentiment_workers
     
-    process_and_save_tweets(filename, try_expand, skiprows)
+    process_and_save_tweets(filename, try_expand, skiprows, workers, fused, keep_processed,
+                            output_format, compression, incremental, dedup_index)
     
-    
\ No newline at end of file
+    print(sentiment_scoring.get_scorer().summary())
+    if try_expand:
+        print(url_cache.get_cache().summary())
@@ -7,11 +7,13 @@ Created on Thu Oct 13 10:46:34 2022
 """
 
 import pandas as pd
-import urlexpander
-import tldextract
+import numpy as np
 import os
 from datetime import datetime
 
+import url_cache
+import domains
+
 project_folder = os.path.dirname(os.path.dirname(__file__))
 
 filename = project_folder + '/Data/BrandWatch/Skripal/skripal_experiment_with_followers.csv'
@@ -49,33 +51,17 @@ df = df.astype({"follower_count": int})
 
 def try_expand(urls: list[str]) -> list[str]:
 
-    copy = urls.copy()
-    for i, url in enumerate(copy):
-        if urlexpander.is_short(url) or 'act.gp' in url:
-            try:
-                copy[i] = urlexpander.expand(url)
-            except:
-                # In this case we do nothing
-                pass
-    
-    return copy
-
-
-def get_domain_and_suffix(urls: list[str]) -> list[str]:
-    
-    parsing = [tldextract.extract(url) for url in urls]
-    # Join the domain and suffix into a single string
-    domain = ['.'.join(part for part in url[1:] if part) for url in parsing]
-    
-    return domain
-
+    # Use the same on-disk cache as process.py
+    return url_cache.get_cache().expand_all(urls)
 
 
 # try expand everything
 df.urls = df["urls"].apply(try_expand)
 
+print(url_cache.get_cache().summary())
+
 # extract domains
-df["domain"] = df["urls"].apply(get_domain_and_suffix)
+df["domain"] = df["urls"].apply(domains.get_domain_and_suffix)
 
 #%%
 
@@ -87,46 +73,15 @@ df.to_json(project_folder + '/Data/BrandWatch/Skripal/skripal_clean.json', orien
 
 import lightweight
 
-def effective_category(tweet: dict) -> str:
-    """
-    Check if a given tweet should be classified as a retweet or usual tweet.
-    Quote tweets are considered retweets, and replies are considered tweets.
-    Return the original tweet author if this is a retweet, or NaN for tweets.
-
-    Parameters
-    ----------
-    tweet : dict
-        The tweet object.
-
-    Returns
-    -------
-    str
-        Username of original author.
-
-    """
-    
-    if tweet['text'].startswith('RT @'):
-        content = tweet['text'].split('RT @')[1]
-        name = content.split(' ')[0]
-        if ':' in name:
-            return name.split(':')[0]
-        else:
-            return name
-        
-    else:
-        return float('nan')
-    
-
-# Extract retweet info
-df['retweet_from'] = df.apply(effective_category, axis=1)
-df['effective_category'] = df['retweet_from'].apply(lambda x: 'tweet' if pd.isnull(x) else 'retweet')
-
-# Check if the urls are in the news table
-news = pd.read_csv(lightweight.NEWS_TABLE)
-mask = [lightweight.isin(domains, news) for domains in df['domain']]
+# Extract retweet info (only from the `RT @` prefix, there are no tweet categories here)
+df['retweet_from'] = lightweight.effective_categories(df[['text']])
+df['effective_category'] = np.where(df['retweet_from'].isna(), 'tweet', 'retweet')
+
+# Check if the urls are in the news table (and add class/score of the news source)
+df = df.join(lightweight.match_news(df['domain'], lightweight.load_news_index()))
 
 # Keep only rows with urls in the news table
-df = df[mask]
+df = df[df['news_class'].notna()]
 
 # Drop non-lightweight columns
 df = df.drop(labels=["text", "urls"], axis="columns")
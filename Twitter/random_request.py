@@ -12,12 +12,15 @@ import json
 import argparse
 
 import request
+import fetcher
 import utils
+from compression import LineSink, EXTENSIONS
 
 
 def random_queries(folder_name:str, query_file:str, N_days:int, left_lim: date, right_lim: date,
                    max_per_page: int, max_pages: int, verbose: bool = True,
-                   folder_prefix: str = utils.PROJECT_FOLDER + '/Data/Twitter/') -> None:
+                   folder_prefix: str = utils.PROJECT_FOLDER + '/Data/Twitter/', workers: int = 1,
+                   compression: str = None) -> None:
     """
     Will randomly query twitter API for `N_days` days between `left_lim` and
     `right_lim`, using the query in the text file `query_file`. Results will
@@ -45,6 +48,11 @@ def random_queries(folder_name:str, query_file:str, N_days:int, left_lim: date,
     folder_prefix : str, optional
         Path for storing the results (prefix path to `folder_name`). The default is 
         utils.PROJECT_FOLDER + '/Data/Twitter/'.
+    workers : int, optional
+        The number of days to query concurrently (over the same client, see
+        `request.get_client`). The default is 1.
+    compression : str, optional
+        One of 'gzip', 'zstd' or 'bz2' to compress the files, or None. The default is None.
 
     Raises
     ------
@@ -73,6 +81,7 @@ def random_queries(folder_name:str, query_file:str, N_days:int, left_lim: date,
     max_pages = max_pages if max_pages != -1 else float('inf')
     
     random_datetimes = utils.get_random_date(left_lim, right_lim, N_days)
+    extension = '.json' + EXTENSIONS[compression] if compression is not None else '.json'
     filenames = []
     
     # Create filenames
@@ -80,7 +89,7 @@ def random_queries(folder_name:str, query_file:str, N_days:int, left_lim: date,
         start = datetime.replace(day, tzinfo=None)
         end = datetime.replace(day + timedelta(days=1), tzinfo=None)
         file = folder_prefix + folder_name + start.isoformat(timespec='minutes').replace(':', '-') + \
-            '_to_' + end.isoformat(timespec='minutes').replace(':', '-') + '.json'
+            '_to_' + end.isoformat(timespec='minutes').replace(':', '-') + extension
         if os.path.exists(file):
             raise ValueError(('A filename corresponding to the same folder and date already exists.'
                               ' Choose another folder name.'))
@@ -90,6 +99,9 @@ def random_queries(folder_name:str, query_file:str, N_days:int, left_lim: date,
         print(f'The query you used is : \n{query}')
         print(f'Making {N_days} queries for random days.')
     
+    client = request.get_client(workers)
+    tasks = []
+    
     for start, filename in zip(random_datetimes, filenames):
         
         # We query for a single day
@@ -100,10 +112,16 @@ def random_queries(folder_name:str, query_file:str, N_days:int, left_lim: date,
            'end_date': end.isoformat(sep=' '), 'max_per_page': max_per_page, \
            'max_pages': max_pages}
         
-        with open(filename, 'w') as filehandle:
-            filehandle.write(f'{json.dumps(log)}\n\n')
+        with LineSink(filename, mode='w') as sink:
+            sink.write_lines([json.dumps(log), ''])
     
-        request.query_API(filename, query, start, end, max_per_page, max_pages)
+        tasks.append((filename, query, start, end, max_per_page, max_pages, None, client))
+        
+    if workers > 1:
+        fetcher.run_parallel(request.query_API, tasks, workers, desc='Queried days')
+    else:
+        for task in tasks:
+            request.query_API(*task)
         
         
         
@@ -133,6 +151,10 @@ if __name__ == '__main__':
                         help='Whether to write some summary to standard output. The default is True')
     parser.add_argument('--folder_prefix', type=str, default=utils.PROJECT_FOLDER + '/Data/Twitter/',
                         help='Prefix to the path to the output files (the full path will be folder_prefix + folder.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='The number of days to query concurrently. The default is 1.')
+    parser.add_argument('--compression', type=str, choices=list(EXTENSIONS.keys()), default=None,
+                        help='Compress the files with gzip, zstd or bz2. The default is no compression.')
     args = parser.parse_args()
     
     folder_name = args.folder
@@ -144,6 +166,8 @@ if __name__ == '__main__':
     max_pages = args.max_pages
     verbose = True if args.verbose == 'True' else False
     folder_prefix = args.folder_prefix
+    workers = args.workers
+    compression = args.compression
     
     random_queries(folder_name, query_file, N_days, left, right, max_per_page, max_pages,
-                   verbose, folder_prefix)
\ No newline at end of file
+                   verbose, folder_prefix, workers, compression)
\ No newline at end of file
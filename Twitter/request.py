@@ -6,18 +6,112 @@ Created on Wed Oct 12 15:51:35 2022
 @author: cyrilvallez
 """
 
-from twarc import Twarc2, expansions
+from twarc import Twarc2, expansions, version
 from datetime import datetime, timezone
+import os
+import time
 import json
 import argparse
 import utils
+import json_codec
+from checkpoint import Checkpoint, manifest_path
+import fetcher
+from compression import LineSink, EXTENSIONS
+
+
+# Full-archive search endpoint. This can be changed to point to a local server for testing.
+SEARCH_URL = 'https://api.twitter.com/2/tweets/search/all'
+
+
+def get_client(workers: int = 1) -> Twarc2:
+    """
+    Create a client for the twitter API v2, using our credentials (see `utils.get_credentials`).
+    If `workers` is larger than 1, the client can be shared by `workers` threads, and
+    requests are rate limited by a common token bucket (see `fetcher.PooledTwarc2`).
+    """
+    
+    bearer_token = utils.get_credentials()['Bearer token']
+    if workers > 1:
+        return fetcher.PooledTwarc2(pool_size=workers, bearer_token=bearer_token)
+    return Twarc2(bearer_token=bearer_token)
+
+
+
+def _timestamp(date: datetime) -> str:
+    """
+    Format `date` for the twitter API (UTC, without microseconds), as twarc does.
+    """
+    
+    date = date.astimezone(timezone.utc) if date.tzinfo is not None else date.replace(tzinfo=timezone.utc)
+    return date.isoformat(timespec='seconds')
+
+
+
+def search_pages(client: Twarc2, query: str, start_time: datetime, end_time: datetime,
+                 max_per_page: int, next_token: str = None):
+    """
+    Iterate over the pages of results of a "search all" query to `SEARCH_URL`, starting
+    from the page corresponding to `next_token` (or the first one if None). The pages are
+    the same as the ones of `client.search_all` (with all expansions and fields), but
+    are requested with `client.get`, which allows to change the endpoint. If the client
+    is a `fetcher.PooledTwarc2`, its token bucket is the only rate limitation.
+
+    Parameters
+    ----------
+    client : Twarc2
+        The client.
+    query : str
+        The query for the twitter API.
+    start_time : datetime.datetime
+        The start date for looking up tweets.
+    end_time : datetime.datetime
+        The end date for looking up tweets.
+    max_per_page : int
+        The maximum number of tweets to get per page of results.
+    next_token : str, optional
+        The pagination token of the first page to get. The default is None.
+
+    Yields
+    ------
+    dict
+        The pages returned by the API (pages without tweets are skipped).
+
+    """
+    
+    params = {'query': query, 'start_time': _timestamp(start_time), 'end_time': _timestamp(end_time),
+              'max_results': max_per_page, 'expansions': ','.join(expansions.EXPANSIONS),
+              'tweet.fields': ','.join(expansions.TWEET_FIELDS), 'user.fields': ','.join(expansions.USER_FIELDS),
+              'media.fields': ','.join(expansions.MEDIA_FIELDS), 'poll.fields': ','.join(expansions.POLL_FIELDS),
+              'place.fields': ','.join(expansions.PLACE_FIELDS)}
+    # Without the token bucket, wait between pages to respect the 1 request/s limit
+    sleep_between = 0 if isinstance(client, fetcher.PooledTwarc2) else 1.05
+    
+    while True:
+        if next_token is not None:
+            params['next_token'] = next_token
+        response = client.get(SEARCH_URL, params=params)
+        page = response.json()
+        if client.metadata:
+            page['__twarc'] = {'url': response.url, 'version': version,
+                               'retrieved_at': datetime.now(timezone.utc).isoformat(timespec='seconds')}
+        if 'data' in page:
+            yield page
+        next_token = page.get('meta', {}).get('next_token')
+        if next_token is None:
+            return
+        time.sleep(sleep_between)
+
 
 
 def query_API(filename: str, query: str, start_time: datetime,
-               end_time: datetime, max_per_page: int, max_pages: int) -> None:
+               end_time: datetime, max_per_page: int, max_pages: int,
+               checkpoint: Checkpoint = None, client: Twarc2 = None) -> None:
     """
     Make a SINGLE "search all" query to the twitter API v2 and saves the results to
-    the given `filename`.
+    the given `filename`. If a `checkpoint` is given, the progress is recorded after
+    each page, and the query is resumed from the last recorded page (the content of
+    the file written after it is discarded). If `filename` ends with '.gz' or '.zst',
+    the file is compressed (see `LineSink`).
 
     Parameters
     ----------
@@ -34,6 +128,10 @@ def query_API(filename: str, query: str, start_time: datetime,
     max_pages : int
         The maximum number of pages to query (the total number of tweets retrieved
         is max_per_page*max_pages).
+    checkpoint : Checkpoint, optional
+        Where to record the progress. The default is None.
+    client : Twarc2, optional
+        The client to use. If None, a new one is created. The default is None.
 
     Returns
     -------
@@ -41,40 +139,69 @@ def query_API(filename: str, query: str, start_time: datetime,
 
     """
     
-    # Replace your bearer token below
-    client = Twarc2(bearer_token=utils.get_credentials()['Bearer token'])
+    if client is None:
+        client = get_client()
+        
+    if checkpoint is not None:
+        state = checkpoint.state(filename)
+        if state['done']:
+            return
+        # Discard everything written after the last recorded page
+        if os.path.exists(filename):
+            with open(filename, 'r+b') as filehandle:
+                filehandle.truncate(state['size'])
+        pages = state['pages']
+        next_token = state['next_token']
+    else:
+        pages = 0
+        next_token = None
 
     # The search_all method call the full-archive search endpoint to get Tweets
     # based on the query, start and end times
-    search_results = client.search_all(query=query, start_time=start_time,
-                                       end_time=end_time, max_results=max_per_page)
-
-    # Twarc returns all Tweets for the criteria set above, so we page through
-    # the results
-    for i, page in enumerate(search_results):
+    search_results = search_pages(client, query, start_time, end_time, max_per_page, next_token)
 
-        if i > (max_pages - 1):
-            break
+    # We keep a single handle on the file, and append one JSON object per line
+    with LineSink(filename) as sink:
         
-        # The Twitter API v2 returns the Tweet information and the user, media etc.  separately
-        # so we use expansions.flatten to get all the information in a single JSON
-        result = expansions.flatten(page)
-        # We will open the file and append one JSON object per new line
-        
-        with open(filename, 'a+') as filehandle:
-            for tweet in result:
-                # write the json file with new line after each new dump
-                filehandle.write(f'{json.dumps(tweet)}\n')
+        # Twarc returns all Tweets for the criteria set above, so we page through
+        # the results
+        for page in search_results:
+    
+            if pages > (max_pages - 1):
+                break
+            
+            # The Twitter API v2 returns the Tweet information and the user, media etc.  separately
+            # so we use expansions.flatten to get all the information in a single JSON
+            result = expansions.flatten(page)
+            sink.write_lines(json_codec.dumps(tweet) for tweet in result)
+                    
+            pages += 1
+            if checkpoint is not None:
+                # The page must be on disk before being recorded in the checkpoint
+                size = sink.checkpoint()
+                next_token = page.get('meta', {}).get('next_token')
+                checkpoint.update(filename, next_token=next_token, pages=pages,
+                                  tweets=checkpoint.state(filename)['tweets'] + len(result),
+                                  size=size, done=next_token is None)
+            
+    if checkpoint is not None:
+        checkpoint.update(filename, done=True)
                 
                 
                 
 def make_query(filename:str, query_file:str, start_time: datetime, end_time:datetime,
-               max_per_page:int, max_pages:int, verbose:bool = True) -> None:
+               max_per_page:int, max_pages:int, verbose:bool = True,
+               folder: str = utils.PROJECT_FOLDER + '/Data/Twitter/', workers: int = 1,
+               compression: str = None) -> None:
     """
     Format and transform arguments, before making a query (or multiple queries) to
     the Twitter API "search_all" endpoint. This function conveniently cut the time interval
     into multiple queries to avoid very large files that could result from calling the API on a
-    period too large. 
+    period too large. The progress is recorded in a checkpoint manifest (see `checkpoint.Checkpoint`)
+    after each page of results, so that calling this function again with the same
+    arguments after a crash resumes the query where it stopped. With `workers` larger
+    than 1, multiple intervals are queried concurrently over the same client, so that
+    the total time is bounded by the rate limit of the API instead of its latency.
 
     Parameters
     ----------
@@ -96,6 +223,12 @@ def make_query(filename:str, query_file:str, start_time: datetime, end_time:date
         is max_per_page*max_pages). Set to `-1` for no limits.
     verbose : bool, optional
         Whether to write some summary to the standard output. The default is True.
+    folder : str, optional
+        Where to store the tweets. The default is utils.PROJECT_FOLDER + '/Data/Twitter/'.
+    workers : int, optional
+        The number of intervals to query concurrently. The default is 1.
+    compression : str, optional
+        One of 'gzip', 'zstd' or 'bz2' to compress the files, or None. The default is None.
 
     Returns
     -------
@@ -116,25 +249,57 @@ def make_query(filename:str, query_file:str, start_time: datetime, end_time:date
     # We split the time into periods of 4 days and save the API answer to a new file
     # for each period to avoid huge files
     time_intervals = utils.split_time_interval(start_time, end_time)
-    filenames = utils.format_filename(filename, time_intervals)
+    
+    job = {'query': query, 'start_time': start_time.isoformat(sep=' '), 'end_date': end_time.isoformat(sep=' '),
+           'max_per_page': max_per_page, 'max_pages': max_pages}
+    checkpoint = Checkpoint(manifest_path(filename, folder), job)
+    # If we resume a query, the files already exist
+    extension = '.json' + EXTENSIONS[compression] if compression is not None else '.json'
+    filenames = utils.format_filename(filename, time_intervals, folder=folder, extension=extension,
+                                      exist_ok=checkpoint.resumed)
     
     if verbose:
         print(f'The query you used is : \n{query}')
         if len(filenames) > 1:
             print(f'Your query will be divided into {len(filenames)} response files.')
+        if checkpoint.resumed:
+            print(f'Resuming the query. {checkpoint.summary()}')
+            
+    # Record all intervals before starting
+    for file in filenames:
+        checkpoint.state(file)
+    checkpoint.save()
+    
+    client = get_client(workers)
+    tasks = []
     
     for i in range(len(time_intervals)-1):
         
-        # We log the arguments at the beginning of the file
-        log = {'query_file': query_file, 'query': query, 'start_time': time_intervals[i].isoformat(sep=' '), \
-           'end_date': time_intervals[i+1].isoformat(sep=' '), 'max_per_page': max_per_page, \
-           'max_pages': max_pages}
+        state = checkpoint.state(filenames[i])
+        if state['done']:
+            continue
         
-        with open(filenames[i], 'w') as filehandle:
-            filehandle.write(f'{json.dumps(log)}\n\n')
+        if state['size'] == 0:
+            # We log the arguments at the beginning of the file
+            log = {'query_file': query_file, 'query': query, 'start_time': time_intervals[i].isoformat(sep=' '), \
+               'end_date': time_intervals[i+1].isoformat(sep=' '), 'max_per_page': max_per_page, \
+               'max_pages': max_pages}
+            
+            with LineSink(filenames[i], mode='w') as sink:
+                sink.write_lines([json.dumps(log), ''])
+                checkpoint.update(filenames[i], size=sink.checkpoint())
     
-        query_API(filenames[i], query, time_intervals[i], time_intervals[i+1],
-              max_per_page, max_pages)
+        tasks.append((filenames[i], query, time_intervals[i], time_intervals[i+1],
+                      max_per_page, max_pages, checkpoint, client))
+        
+    if workers > 1:
+        fetcher.run_parallel(query_API, tasks, workers, desc='Queried intervals')
+    else:
+        for task in tasks:
+            query_API(*task)
+        
+    if verbose:
+        print(checkpoint.summary())
         
         
              
@@ -154,6 +319,10 @@ if __name__ == "__main__":
                         help='Max number of results per API call. The default is 50.')
     parser.add_argument('--max_pages', type=int, default=-1,
                         help='Max number of API calls. Give `-1` for no limit. The default is -1.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='The number of time intervals to query concurrently. The default is 1.')
+    parser.add_argument('--compression', type=str, choices=list(EXTENSIONS.keys()), default=None,
+                        help='Compress the files with gzip, zstd or bz2. The default is no compression.')
     args = parser.parse_args()
     
     filename = args.filename
@@ -162,8 +331,11 @@ if __name__ == "__main__":
     end_time = args.end_time
     max_per_page = args.max_per_page
     max_pages = args.max_pages
+    workers = args.workers
+    compression = args.compression
     
-    make_query(filename, query_file, start_time, end_time, max_per_page, max_pages)
+    make_query(filename, query_file, start_time, end_time, max_per_page, max_pages, workers=workers,
+               compression=compression)
     
     
     
\ No newline at end of file
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 17:05:32 2026
+
+@author: cyrilvallez
+"""
+
+import hashlib
+import multiprocessing as mp
+from collections import Counter, OrderedDict
+import nltk
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+nltk.download('vader_lexicon', quiet=True)
+ANALYZER = SentimentIntensityAnalyzer()
+
+# Default maximum number of scores kept in memory
+MAX_ENTRIES = 1_000_000
+
+# Minimum number of texts to score in a batch before it is worth using a pool of processes
+MIN_PARALLEL_BATCH = 2000
+
+
+def label(compound: float) -> str:
+    """
+    Convert a VADER compound score to a sentiment label.
+
+    Parameters
+    ----------
+    compound : float
+        The compound score.
+
+    Returns
+    -------
+    str
+        The sentiment, either 'positive', 'negative' or 'neutral'.
+
+    """
+
+    if compound > 0.05:
+        return 'positive'
+    elif compound < -0.05:
+        return 'negative'
+    else:
+        return 'neutral'
+
+
+def score_text(text: str) -> str:
+    """
+    Returns the sentiment of a text, using the naive VADER sentiment analysis tool
+    (without any caching).
+    """
+
+    return label(ANALYZER.polarity_scores(text)['compound'])
+
+
+def text_key(text: str) -> bytes:
+    """
+    Return the (fixed size) key used to store the sentiment of `text` in the cache.
+    """
+
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+
+class SentimentScorer(object):
+    """
+    Compute the VADER sentiment of batches of texts, scoring each distinct text only once.
+    Texts are deduplicated inside each batch (retweets share the same original text), and
+    sentiments are memoised in a LRU cache of at most `max_entries` entries, keyed by
+    a hash of the text. If `workers` is larger than 1, the texts of large batches which
+    are not in the cache are scored by a pool of processes.
+
+    Statistics are kept in `counters` ('texts', 'duplicates', 'hits', 'scored', 'evictions').
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, workers: int = 1):
+
+        self.max_entries = max_entries
+        self.workers = workers
+        self.counters = Counter()
+        self._cache = OrderedDict()
+
+
+    def __len__(self) -> int:
+
+        return len(self._cache)
+
+
+    def _lookup(self, key: bytes) -> str:
+
+        sentiment = self._cache.get(key)
+        if sentiment is not None:
+            self._cache.move_to_end(key)
+        return sentiment
+
+
+    def _store(self, key: bytes, sentiment: str) -> None:
+
+        self._cache[key] = sentiment
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+            self.counters['evictions'] += 1
+
+
+    def score(self, text: str) -> str:
+        """
+        Return the sentiment of a single text.
+
+        Parameters
+        ----------
+        text : str
+            The text.
+
+        Returns
+        -------
+        str
+            The sentiment of the text.
+
+        """
+
+        return self.score_many([text])[0]
+
+
+    def score_many(self, texts: list[str]) -> list[str]:
+        """
+        Return the sentiment of all `texts`, in the same order.
+
+        Parameters
+        ----------
+        texts : list[str]
+            The texts.
+
+        Returns
+        -------
+        list[str]
+            The sentiment of each text.
+
+        """
+
+        keys = [text_key(text) for text in texts]
+        self.counters['texts'] += len(texts)
+
+        # key -> sentiment for all distinct texts of the batch
+        sentiments = {}
+        missing_keys = []
+        missing_texts = []
+        for key, text in zip(keys, texts):
+            if key in sentiments:
+                self.counters['duplicates'] += 1
+                continue
+            sentiment = self._lookup(key)
+            if sentiment is not None:
+                self.counters['hits'] += 1
+            else:
+                missing_keys.append(key)
+                missing_texts.append(text)
+            # Placeholder to detect duplicates of missing texts as well
+            sentiments[key] = sentiment
+
+        for key, sentiment in zip(missing_keys, self._score_texts(missing_texts)):
+            sentiments[key] = sentiment
+            self._store(key, sentiment)
+        self.counters['scored'] += len(missing_texts)
+
+        return [sentiments[key] for key in keys]
+
+
+    def _score_texts(self, texts: list[str]) -> list[str]:
+        """
+        Score texts without using the cache, in parallel if possible.
+        """
+
+        # Daemonic processes (e.g. workers of another pool) are not allowed to have children
+        if self.workers > 1 and len(texts) >= MIN_PARALLEL_BATCH and not mp.current_process().daemon:
+            chunksize = max(1, len(texts) // (4*self.workers))
+            with mp.Pool(self.workers) as pool:
+                return pool.map(score_text, texts, chunksize=chunksize)
+
+        return [score_text(text) for text in texts]
+
+
+    def summary(self) -> str:
+        """
+        Return a short human-readable summary of the statistics.
+        """
+
+        total = self.counters['texts']
+        avoided = self.counters['duplicates'] + self.counters['hits']
+        rate = avoided / total if total > 0 else 0.
+        return (f'Sentiment: {self.counters["scored"]}/{total} texts scored, {avoided} avoided '
+                f'({rate:.1%}): {self.counters["duplicates"]} duplicates in batches, '
+                f'{self.counters["hits"]} cache hits.')
+
+
+
+# Process-wide default scorer
+_SCORER = None
+
+def get_scorer() -> SentimentScorer:
+    """
+    Return the default scorer, used by `process.py`.
+    """
+
+    global _SCORER
+    if _SCORER is None:
+        _SCORER = SentimentScorer()
+    return _SCORER
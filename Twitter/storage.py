@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 15:40:08 2026
+
+@author: cyrilvallez
+"""
+
+import os
+import glob
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.compute as pc
+
+import compression
+
+# Supported output formats
+OUTPUT_FORMATS = ['json', 'parquet']
+
+# Maximum number of rows per row group in parquet files
+ROW_GROUP_SIZE = 100000
+
+# Arrow types of the columns of the processed and lightweight tweets. Columns not
+# in this list are stored as strings.
+COLUMN_TYPES = {
+    'id': pa.string(),
+    'author_id': pa.string(),
+    'created_at': pa.timestamp('ms', tz='UTC'),
+    'lang': pa.dictionary(pa.int32(), pa.string()),
+    'text': pa.string(),
+    'username': pa.string(),
+    'follower_count': pa.int64(),
+    'tweet_count': pa.int64(),
+    'country': pa.dictionary(pa.int32(), pa.string()),
+    'country_code': pa.dictionary(pa.int32(), pa.string()),
+    'category': pa.list_(pa.string()),
+    'original_text': pa.string(),
+    'original_author': pa.list_(pa.string()),
+    'sentiment': pa.dictionary(pa.int32(), pa.string()),
+    'urls': pa.list_(pa.string()),
+    'hashtags': pa.list_(pa.string()),
+    'domain': pa.list_(pa.string()),
+    'retweet_from': pa.string(),
+    'effective_category': pa.dictionary(pa.int32(), pa.string()),
+    'news_class': pa.dictionary(pa.int32(), pa.string()),
+    'news_score': pa.float64(),
+    'user_id': pa.int32(),
+    'retweet_from_id': pa.int32(),
+    }
+
+
+def _is_missing(x) -> bool:
+    return x is None or x is pd.NA or (type(x) == float and np.isnan(x))
+
+
+def to_arrow(df: pd.DataFrame) -> pa.Table:
+    """
+    Convert a DataFrame of (processed or lightweight) tweets to an arrow Table with
+    the types given in COLUMN_TYPES. NaNs are converted to nulls.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The tweets.
+
+    Returns
+    -------
+    pa.Table
+        The arrow table.
+
+    """
+
+    arrays = []
+    fields = []
+    for column in df.columns:
+        dtype = COLUMN_TYPES.get(column, pa.string())
+        values = df[column]
+
+        if pa.types.is_timestamp(dtype):
+            array = pa.array(pd.to_datetime(values, utc=True)).cast(dtype)
+        elif pa.types.is_dictionary(dtype):
+            values = [None if _is_missing(x) else str(x) for x in values]
+            array = pa.array(values, type=dtype.value_type).dictionary_encode()
+        elif pa.types.is_list(dtype):
+            values = [None if _is_missing(x) else (x if type(x) == list else [x]) for x in values]
+            array = pa.array(values, type=dtype)
+        elif pa.types.is_string(dtype):
+            values = [None if _is_missing(x) else str(x) for x in values]
+            array = pa.array(values, type=dtype)
+        else:
+            array = pa.array([None if _is_missing(x) else x for x in values], type=dtype)
+
+        arrays.append(array)
+        fields.append(pa.field(column, array.type))
+
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+
+class JsonLinesSink(object):
+    """
+    Write chunks of tweets (list of dicts or DataFrames) to a file, one json object per line.
+    The output is the same as calling `to_json(path, orient="records", lines=True)` on
+    the DataFrame of all tweets. The file is compressed if `path` ends with the extension
+    of a compression (see `compression.open_file`).
+    """
+
+    def __init__(self, path: str, mode: str = 'w'):
+        self.path = path
+        self.file = compression.open_file(path, mode[0] + 't')
+
+    def write(self, chunk) -> None:
+        if chunk is None or len(chunk) == 0:
+            return
+        if not isinstance(chunk, pd.DataFrame):
+            chunk = pd.DataFrame.from_records(chunk)
+        lines = chunk.to_json(orient="records", lines=True)
+        self.file.write(lines if lines.endswith('\n') else lines + '\n')
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+class ParquetSink(object):
+    """
+    Write chunks of tweets (list of dicts or DataFrames) to parquet files partitioned
+    by day of `created_at`: the tweets of day YYYY-MM-DD are written to
+    `folder/day=YYYY-MM-DD/name.parquet`. Inside each file, rows are sorted by
+    `created_at` in each row group, and min/max statistics are written so that
+    readers can skip row groups by date.
+    """
+
+    def __init__(self, folder: str, name: str, row_group_size: int = ROW_GROUP_SIZE):
+        self.folder = folder
+        self.name = name
+        self.row_group_size = row_group_size
+        # One writer per day partition
+        self.writers = {}
+
+    def path(self, day: str) -> str:
+        return os.path.join(self.folder, f'day={day}', self.name + '.parquet')
+
+    def write(self, chunk) -> None:
+        if chunk is None or len(chunk) == 0:
+            return
+        if not isinstance(chunk, pd.DataFrame):
+            chunk = pd.DataFrame.from_records(chunk)
+
+        table = to_arrow(chunk)
+        table = table.take(pc.sort_indices(table, sort_keys=[('created_at', 'ascending')]))
+        days = pd.Series(table.column('created_at').to_pandas()).dt.strftime('%Y-%m-%d').to_numpy()
+        # Since the table is sorted, each day is a contiguous slice
+        unique, starts = np.unique(days, return_index=True)
+        ends = list(starts[1:]) + [len(days)]
+
+        for day, start, end in zip(unique, starts, ends):
+            part = table.slice(start, end - start)
+            if day not in self.writers:
+                os.makedirs(os.path.dirname(self.path(day)), exist_ok=True)
+                self.writers[day] = pq.ParquetWriter(self.path(day), part.schema, write_statistics=True)
+            writer = self.writers[day]
+            # Dictionary columns may have a different dictionary in each chunk
+            self.writers[day].write_table(part.cast(writer.schema), row_group_size=self.row_group_size)
+
+    def close(self) -> None:
+        for writer in self.writers.values():
+            writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+def _split_path(path: str) -> tuple[str, str]:
+    """
+    Return the folder and name (without extensions) of `path`.
+    """
+    return os.path.dirname(path), os.path.basename(compression.strip_extension(path)).rsplit('.', 1)[0]
+
+
+
+def open_sink(path: str, output_format: str = 'json'):
+    """
+    Open a sink to write tweets to `path`. For json, this is the path to the file (which
+    may be compressed). For parquet, the tweets are written in the folder containing `path`,
+    partitioned by day, in files named after `path` (see `ParquetSink`).
+
+    Parameters
+    ----------
+    path : str
+        The output path.
+    output_format : str, optional
+        The output format, one of OUTPUT_FORMATS. The default is 'json'.
+
+    Returns
+    -------
+    JsonLinesSink | ParquetSink
+        The sink.
+
+    """
+
+    if output_format == 'json':
+        return JsonLinesSink(path)
+    elif output_format == 'parquet':
+        return ParquetSink(*_split_path(path))
+    else:
+        raise ValueError(f'The output format must be one of {OUTPUT_FORMATS}.')
+
+
+
+def sink_exists(path: str, output_format: str = 'json') -> bool:
+    """
+    Check if something was already written to `path` with the given format (see `open_sink`).
+
+    Parameters
+    ----------
+    path : str
+        The output path.
+    output_format : str, optional
+        The output format, one of OUTPUT_FORMATS. The default is 'json'.
+
+    Returns
+    -------
+    bool
+        Whether the output already exists.
+
+    """
+
+    if output_format == 'parquet':
+        folder, name = _split_path(path)
+        return len(glob.glob(os.path.join(folder, 'day=*', name + '.parquet'))) > 0
+    else:
+        return os.path.exists(path)
+
+
+
+def remove_sink(path: str) -> None:
+    """
+    Remove everything written to `path` (see `open_sink`), in any format.
+
+    Parameters
+    ----------
+    path : str
+        The output path.
+
+    Returns
+    -------
+    None
+
+    """
+
+    if os.path.exists(path):
+        os.remove(path)
+    folder, name = _split_path(path)
+    for file in glob.glob(os.path.join(folder, 'day=*', name + '.parquet')):
+        os.remove(file)
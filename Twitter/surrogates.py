@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 11:24:50 2026
+
+@author: cyrilvallez
+"""
+
+import functools
+import numpy as np
+
+import influence
+from jdd import JointDistanceDistribution
+from entropy import SimpleTE
+
+# Comparators allowed for the surrogate test (as in the Julia `_surrogate_wrapper`)
+COMPARATORS = ('>', '<')
+
+# Limits of the surrogate values for which the test can stop early
+LIMITS = ('max', 'min')
+
+
+@functools.lru_cache(maxsize=16)
+def permutation_bank(length: int, size: int = 100, seed: int = 0) -> np.ndarray:
+    """
+    Return `size` random permutations of `length` indices, as an array of shape (size, length).
+    The bank is generated once per process for given arguments, and is the same in all processes,
+    so that surrogates (see `SurrogateTest`) are reproducible.
+    """
+
+    rng = np.random.default_rng(seed)
+    bank = rng.permuted(np.tile(np.arange(length), (size, 1)), axis=1)
+    bank.flags.writeable = False
+    return bank
+
+
+
+class SurrogateTest(object):
+    """
+    Significance test of a measure against surrogates of the source series, as the Julia
+    `_surrogate_wrapper` with `RandomShuffle` surrogates. If the measure from the source to the
+    target passes the `threshold` (according to `comparator`), it is computed again for `Nsurro`
+    random shuffles of the source, and the edge is accepted (1) if the measure is still larger
+    (or smaller if `comparator` is '<') than `scale` times the maximum (or minimum) of the
+    surrogate values. Otherwise, the edge is rejected (0).
+
+    Shuffles are taken from a seeded `permutation_bank`, applied to the source with a single
+    gather, and the measure is evaluated over many surrogates (and targets) in one vectorized
+    call (see `influence.influence_graphs` for the `prepare` and `batch` methods the measure
+    must have). Surrogates are evaluated `step` at a time, and a target is rejected as soon as
+    one surrogate reaches its value, so that only accepted edges need all `Nsurro` surrogates.
+    The result is the same as evaluating all of them. `limit` can also be any function of the
+    array of surrogate values (e.g. `functools.partial(np.quantile, q=0.95)`, which must be
+    picklable to be used with multiple workers), in which case all surrogates are evaluated.
+    """
+
+    def __init__(self, measure, threshold: float, comparator: str = '>', limit='max', scale: float = 1.,
+                 Nsurro: int = 100, seed: int = 0, step: int = 10):
+
+        if comparator not in COMPARATORS:
+            raise ValueError(f'The comparator must be one of {COMPARATORS}.')
+        if not callable(limit) and limit not in LIMITS:
+            raise ValueError(f'The limit must be a function or one of {LIMITS}.')
+        if Nsurro < 1:
+            raise ValueError('The number of surrogates `Nsurro` must be at least 1.')
+        self.measure = measure
+        self.threshold = threshold
+        self.comparator = comparator
+        self.limit = limit
+        self.scale = scale
+        self.Nsurro = Nsurro
+        self.seed = seed
+        self.step = step
+
+
+    def __repr__(self) -> str:
+        limit = self.limit if isinstance(self.limit, str) else influence.describe(self.limit)
+        return (f'SurrogateTest({self.measure!r}, threshold={self.threshold}, comparator={self.comparator!r}, '
+                f'limit={limit!r}, scale={self.scale}, Nsurro={self.Nsurro}, seed={self.seed})')
+
+
+    def _passes(self, values: np.ndarray, reference) -> np.ndarray:
+        """
+        Check if `values` pass the `reference` according to the comparator (NaN never passes).
+        """
+
+        return values > reference if self.comparator == '>' else values < reference
+
+
+    def prepare(self, series: np.ndarray) -> np.ndarray:
+        """
+        Prepare the target series, as the underlying measure.
+        """
+
+        return self.measure.prepare(series)
+
+
+    def batch(self, x: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """
+        Return 1 for each of the prepared `targets` for which the measure from the series `x`
+        is significant, and 0 otherwise.
+        """
+
+        values = self.measure.batch(x, targets)
+        result = np.zeros(len(values))
+        candidates = np.flatnonzero(self._passes(values, self.threshold))
+        if len(candidates) == 0:
+            return result
+
+        surrogates = np.asarray(x)[permutation_bank(len(x), self.Nsurro, self.seed)]
+
+        if callable(self.limit):
+            surrogate_values = self.measure.batch(surrogates, targets[candidates])
+            limits = np.array([self.limit(surrogate_values[:, c]) for c in range(len(candidates))])
+            accepted = candidates[self._passes(values[candidates], self.scale*limits)]
+            result[accepted] = 1.
+            return result
+
+        # With a maximum (or minimum) as limit, the value must pass every surrogate, so that
+        # a target can be rejected as soon as one surrogate does not pass
+        for start in range(0, self.Nsurro, self.step):
+            surrogate_values = self.measure.batch(surrogates[start:start + self.step], targets[candidates])
+            passed = self._passes(values[candidates], self.scale*surrogate_values).all(axis=0)
+            candidates = candidates[passed]
+            if len(candidates) == 0:
+                return result
+
+        result[candidates] = 1.
+        return result
+
+
+    def __call__(self, x: np.ndarray, y: np.ndarray) -> float:
+
+        return float(self.batch(x, self.prepare(np.atleast_2d(y)))[0])
+
+
+
+def simple_te(threshold: float = 0.04, Nsurro: int = 100, seed: int = 0) -> SurrogateTest:
+    """
+    Surrogate test of the simple transfer entropy, with the same defaults as
+    `InfluenceGraphGenerator(SimpleTE)` in the Julia `Sensors` module (limit `x -> maximum(x)`).
+    """
+
+    return SurrogateTest(SimpleTE(), threshold, '>', 'max', 1., Nsurro, seed)
+
+
+
+def joint_distance_distribution(threshold: float = 0.001, Nsurro: int = 100, B: int = 10, D: int = 5,
+                                tau: int = 1, seed: int = 0) -> SurrogateTest:
+    """
+    Surrogate test of the joint distance distribution p-value, with the same defaults as
+    `InfluenceGraphGenerator(JointDistanceDistribution)` in the Julia `Sensors` module
+    (limit `x -> minimum(x)/4`). The p-values come from `jdd.JointDistanceDistribution`,
+    which ports the `jdd` of CausalityTools used by the Julia version.
+    """
+
+    return SurrogateTest(JointDistanceDistribution(B, D, tau), threshold, '<', 'min', 1/4, Nsurro, seed)
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 09:31:15 2026
+
+@author: cyrilvallez
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Name of the file describing a saved TimeSeries (the arrays are saved next to it)
+META_NAME = 'meta.json'
+
+
+def time_bins(times: np.ndarray, time_interval) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Bin `times` into intervals of length `time_interval`, as `round_time` in the Julia
+    `Sensors` module: bins start at the minimum time rounded down to the minute, and
+    end at the maximum time rounded up to the minute, the last bin being shorter if
+    needed (and closed on the right). The bin of each time is computed arithmetically.
+
+    Parameters
+    ----------
+    times : np.ndarray
+        The times (datetime64).
+    time_interval : str | pd.Timedelta
+        The length of the bins (e.g. '2h').
+
+    Raises
+    ------
+    ValueError
+        If `time_interval` is too large for even 1 full bin.
+
+    Returns
+    -------
+    bins : np.ndarray
+        The index of the bin of each time.
+    edges : np.ndarray
+        The left edge of each bin (datetime64[ns]).
+
+    """
+
+    times = np.asarray(times, dtype='datetime64[ns]')
+    interval = pd.Timedelta(time_interval).value
+    start = pd.Timestamp(times.min()).floor('min').value
+    end = pd.Timestamp(times.max()).ceil('min').value
+    if end - start <= interval:
+        raise ValueError('The `time_interval` is too large for even 1 interval between the first and last times.')
+
+    N_bins = -(-(end - start) // interval)
+    bins = np.minimum((times.view(np.int64) - start) // interval, N_bins - 1)
+    edges = (start + interval*np.arange(N_bins)).astype('datetime64[ns]')
+
+    return bins, edges
+
+
+
+def _codes(values) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the sorted unique `values`, and the index of each value in it.
+    """
+
+    uniques, codes = np.unique(np.asarray(values), return_inverse=True)
+    return uniques, codes.ravel()
+
+
+
+def standardize_series(x: np.ndarray, axis: int = -2) -> np.ndarray:
+    """
+    Standardize `x` along `axis` (with the sample standard deviation), leaving constant
+    series centered but not scaled, as `standardize` in the Julia `Sensors` module.
+    """
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = x.std(axis=axis, ddof=1, keepdims=True)
+    std = np.where(std > 0, std, 1.)
+    return (x - x.mean(axis=axis, keepdims=True)) / std
+
+
+
+class TimeSeries(object):
+    """
+    Time series of the number of actions of each actor, inside each partition, as
+    returned by `observe`. For partition `i`, `values[i]` is an array of shape
+    (N_actors, N_times, N_actions), where actors are `actors[i]`, times are the bins
+    `times[i]` (only the bins containing at least one tweet of the partition), and
+    actions are `actions`. All are in sorted order, as in the Julia `observe`.
+
+    Time series can be saved to a folder (one .npy file per partition) and loaded back
+    as memory maps, so that they do not need to fit in memory.
+    """
+
+    def __init__(self, partitions: list, actions: list, actors: list[list], times: list[np.ndarray],
+                 values: list[np.ndarray]):
+
+        self.partitions = partitions
+        self.actions = actions
+        self.actors = actors
+        self.times = times
+        self.values = values
+
+
+    def __len__(self) -> int:
+        return len(self.partitions)
+
+
+    def save(self, folder: str) -> None:
+        """
+        Save the time series to `folder`.
+        """
+
+        os.makedirs(folder, exist_ok=True)
+        for i, values in enumerate(self.values):
+            array = np.lib.format.open_memmap(os.path.join(folder, f'partition_{i}.npy'), mode='w+',
+                                              dtype=values.dtype, shape=values.shape)
+            array[:] = values
+            array.flush()
+            del array
+
+        _save_meta(self, folder)
+
+
+    @classmethod
+    def load(cls, folder: str, mmap_mode: str = 'r'):
+        """
+        Load time series saved with `save`. The arrays are memory mapped (use
+        `mmap_mode=None` to load them in memory).
+        """
+
+        partitions, actions, actors, times = _load_meta(folder)
+        values = [np.load(os.path.join(folder, f'partition_{i}.npy'), mmap_mode=mmap_mode)
+                  for i in range(len(partitions))]
+        return cls(partitions, actions, actors, times, values)
+
+
+
+class SparseTimeSeries(object):
+    """
+    Same time series as `TimeSeries` (before standardization), but only the non-zero counts
+    are stored. For partition `i`, the counts are a CSR matrix of shape
+    (N_actors, N_times*N_actions): the counts of actor `j` are `counts[i][k]` for `k` in
+    `indptr[i][j]:indptr[i][j+1]`, at the flat (time, action) positions `indices[i][k]`.
+    The dense (and standardized) time series of an actor are only created when requested.
+    """
+
+    def __init__(self, partitions: list, actions: list, actors: list[list], times: list[np.ndarray],
+                 indptr: list[np.ndarray], indices: list[np.ndarray], counts: list[np.ndarray]):
+
+        self.partitions = partitions
+        self.actions = actions
+        self.actors = actors
+        self.times = times
+        self.indptr = indptr
+        self.indices = indices
+        self.counts = counts
+
+
+    def __len__(self) -> int:
+        return len(self.partitions)
+
+
+    def shape(self, i: int) -> tuple[int, int, int]:
+        """
+        Return the dense shape (N_actors, N_times, N_actions) of partition `i`.
+        """
+
+        return len(self.actors[i]), len(self.times[i]), len(self.actions)
+
+
+    def dense(self, i: int, j: int) -> np.ndarray:
+        """
+        Return the counts of actor `j` in partition `i`, as an array of shape (N_times, N_actions).
+        """
+
+        _, N_times, N_actions = self.shape(i)
+        start, end = self.indptr[i][j], self.indptr[i][j+1]
+        series = np.zeros(N_times*N_actions)
+        series[self.indices[i][start:end]] = self.counts[i][start:end]
+        return series.reshape(N_times, N_actions)
+
+
+    def series(self, i: int, j: int, standardize: bool = True) -> np.ndarray:
+        """
+        Return the time series of actor `j` in partition `i`, as `TimeSeries.values[i][j]`.
+        """
+
+        series = self.dense(i, j)
+        return standardize_series(series) if standardize else series
+
+
+    def active(self, i: int, standardize: bool = True) -> np.ndarray:
+        """
+        Return which time series of partition `i` are not zero everywhere (once standardized,
+        if `standardize`), as an array of shape (N_actors, N_actions), without creating them.
+        """
+
+        N_actors, N_times, N_actions = self.shape(i)
+        rows = np.repeat(np.arange(N_actors), np.diff(self.indptr[i]))
+        keys = rows*N_actions + self.indices[i] % N_actions
+        nonzero = np.bincount(keys, minlength=N_actors*N_actions)
+        if not standardize:
+            return (nonzero > 0).reshape(N_actors, N_actions)
+
+        # Standardized series are zero when the counts are constant, i.e. they are the same
+        # non-zero count at all times
+        largest = np.zeros(N_actors*N_actions)
+        smallest = np.full(N_actors*N_actions, np.inf)
+        np.maximum.at(largest, keys, self.counts[i])
+        np.minimum.at(smallest, keys, self.counts[i])
+        constant = (nonzero == N_times) & (largest == smallest)
+        return ((nonzero > 0) & ~constant).reshape(N_actors, N_actions)
+
+
+    def to_dense(self, standardize: bool = True) -> TimeSeries:
+        """
+        Return the dense time series of all actors.
+        """
+
+        values = []
+        for i in range(len(self)):
+            array = np.zeros(np.prod(self.shape(i)))
+            rows = np.repeat(np.arange(len(self.actors[i])), np.diff(self.indptr[i]))
+            array[rows*len(self.times[i])*len(self.actions) + self.indices[i]] = self.counts[i]
+            array = array.reshape(self.shape(i))
+            values.append(standardize_series(array) if standardize else array)
+        return TimeSeries(self.partitions, self.actions, self.actors, self.times, values)
+
+
+    def nbytes(self) -> int:
+        """
+        Return the memory used by the counts.
+        """
+
+        return sum(array.nbytes for arrays in (self.indptr, self.indices, self.counts) for array in arrays)
+
+
+    def save(self, folder: str) -> None:
+        """
+        Save the time series to `folder`.
+        """
+
+        os.makedirs(folder, exist_ok=True)
+        for i in range(len(self)):
+            for name in ('indptr', 'indices', 'counts'):
+                np.save(os.path.join(folder, f'partition_{i}_{name}.npy'), getattr(self, name)[i])
+        _save_meta(self, folder)
+
+
+    @classmethod
+    def load(cls, folder: str, mmap_mode: str = 'r'):
+        """
+        Load time series saved with `save`. The arrays are memory mapped (use
+        `mmap_mode=None` to load them in memory).
+        """
+
+        partitions, actions, actors, times = _load_meta(folder)
+        arrays = [[np.load(os.path.join(folder, f'partition_{i}_{name}.npy'), mmap_mode=mmap_mode)
+                   for i in range(len(partitions))] for name in ('indptr', 'indices', 'counts')]
+        return cls(partitions, actions, actors, times, *arrays)
+
+
+
+def _save_meta(time_series, folder: str) -> None:
+
+    meta = {'partitions': time_series.partitions, 'actions': time_series.actions,
+            'actors': time_series.actors, 'times': [[str(time) for time in times] for times in time_series.times]}
+    with open(os.path.join(folder, META_NAME), 'w') as file:
+        json.dump(meta, file, default=str)
+
+
+
+def _load_meta(folder: str) -> tuple:
+
+    with open(os.path.join(folder, META_NAME), 'r') as file:
+        meta = json.load(file)
+    times = [np.array(times, dtype='datetime64[ns]') for times in meta['times']]
+    return meta['partitions'], meta['actions'], meta['actors'], times
+
+
+
+def _encode(df: pd.DataFrame, time_interval, time_column: str, actor_column: str, action_column: str,
+            partition_column: str) -> tuple:
+    """
+    Integer code the tweets for `observe` and `observe_sparse`. Return the sorted partitions
+    and actions, the sorted actors and time bins of each partition, the number of actors
+    and times in each partition, the offset of each partition in the concatenation of all
+    flattened (actors, times, actions) arrays, and the flat index of each tweet in it.
+    """
+
+    times = pd.to_datetime(df[time_column])
+    if times.dt.tz is not None:
+        times = times.dt.tz_convert('UTC').dt.tz_localize(None)
+    bins, edges = time_bins(times.to_numpy(), time_interval)
+
+    partitions, partition_codes = _codes(df[partition_column])
+    actions, action_codes = _codes(df[action_column])
+    all_actors, actor_codes = _codes(df[actor_column])
+    N_partitions, N_actions = len(partitions), len(actions)
+
+    # Actors and time bins present in each partition, sorted by partition then value
+    actor_pairs, local_actors = np.unique(partition_codes*len(all_actors) + actor_codes, return_inverse=True)
+    actor_partition = actor_pairs // len(all_actors)
+    actor_starts = np.searchsorted(actor_partition, np.arange(N_partitions + 1))
+    local_actors = local_actors.ravel() - actor_starts[partition_codes]
+
+    time_pairs, local_times = np.unique(partition_codes*len(edges) + bins, return_inverse=True)
+    time_partition = time_pairs // len(edges)
+    time_starts = np.searchsorted(time_partition, np.arange(N_partitions + 1))
+    local_times = local_times.ravel() - time_starts[partition_codes]
+
+    N_actors = np.diff(actor_starts)
+    N_times = np.diff(time_starts)
+    sizes = N_actors * N_times * N_actions
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+
+    # Flat index of each row in the concatenation of all (actors, times, actions) arrays
+    index = offsets[partition_codes] + (local_actors*N_times[partition_codes] + local_times)*N_actions + action_codes
+
+    actors, times_ = [], []
+    for i in range(N_partitions):
+        actors.append(all_actors[actor_pairs[actor_starts[i]:actor_starts[i+1]] % len(all_actors)].tolist())
+        times_.append(edges[time_pairs[time_starts[i]:time_starts[i+1]] % len(edges)])
+
+    return partitions.tolist(), actions.tolist(), actors, times_, N_actors, N_times, offsets, index
+
+
+
+def observe(df: pd.DataFrame, time_interval, time_column: str = 'created_at', actor_column: str = 'actor',
+            action_column: str = 'action', partition_column: str = 'partition',
+            standardize: bool = True) -> TimeSeries:
+    """
+    Compute the time series of the number of actions of each actor inside each partition,
+    as `observe(data, TimeSeriesGenerator(time_interval))` in the Julia `Sensors` module
+    (the values are the same). Instead of filtering the data for each partition, actor and
+    action, rows are integer coded, and all counts are computed with a single `np.bincount`.
+    Contrary to the Julia version, `df` is not modified.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The tweets, with time, actor, action and partition columns.
+    time_interval : str | pd.Timedelta
+        The length of the time bins (e.g. '2h').
+    time_column : str, optional
+        The time column. The default is 'created_at'.
+    actor_column : str, optional
+        The actor column. The default is 'actor'.
+    action_column : str, optional
+        The action column. The default is 'action'.
+    partition_column : str, optional
+        The partition column. The default is 'partition'.
+    standardize : bool, optional
+        Whether to standardize each time series (see `standardize_series`). The default is True.
+
+    Returns
+    -------
+    TimeSeries
+        The time series.
+
+    """
+
+    partitions, actions, actors, times, N_actors, N_times, offsets, index = _encode(
+        df, time_interval, time_column, actor_column, action_column, partition_column)
+    counts = np.bincount(index, minlength=offsets[-1]).astype(np.float64)
+
+    values = []
+    for i in range(len(partitions)):
+        array = counts[offsets[i]:offsets[i+1]].reshape(N_actors[i], N_times[i], len(actions))
+        values.append(standardize_series(array) if standardize else array)
+
+    return TimeSeries(partitions, actions, actors, times, values)
+
+
+
+def observe_sparse(df: pd.DataFrame, time_interval, time_column: str = 'created_at', actor_column: str = 'actor',
+                   action_column: str = 'action', partition_column: str = 'partition') -> SparseTimeSeries:
+    """
+    Same as `observe`, but only store the non-zero counts (see `SparseTimeSeries`), so
+    that memory scales with the number of tweets instead of actors x times x actions.
+    The arguments are the same as for `observe` (standardization is done on demand).
+    """
+
+    partitions, actions, actors, times, N_actors, N_times, offsets, index = _encode(
+        df, time_interval, time_column, actor_column, action_column, partition_column)
+    # Sorted flat indices, i.e. sorted by partition, then actor, time and action
+    index, counts = np.unique(index, return_counts=True)
+    bounds = np.searchsorted(index, offsets)
+
+    indptrs, indices, counts_ = [], [], []
+    for i in range(len(partitions)):
+        local = index[bounds[i]:bounds[i+1]] - offsets[i]
+        row_size = N_times[i] * len(actions)
+        indptrs.append(np.searchsorted(local // row_size, np.arange(N_actors[i] + 1)))
+        indices.append(local % row_size)
+        counts_.append(counts[bounds[i]:bounds[i+1]])
+
+    return SparseTimeSeries(partitions, actions, actors, times, indptrs, indices, counts_)
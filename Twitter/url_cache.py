@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 16 10:12:41 2026
+
+@author: cyrilvallez
+"""
+
+import os
+import time
+import sqlite3
+import urlexpander
+from collections import Counter
+
+import utils
+
+# Default location of the cache shared by all the processing scripts
+CACHE_FILE = utils.PROJECT_FOLDER + '/Data/url_cache.sqlite'
+
+# Default time to live (in seconds) of successful and failed expansions
+TTL = 180*24*3600
+NEGATIVE_TTL = 7*24*3600
+
+# Default maximum number of entries in the cache
+MAX_ENTRIES = 5_000_000
+
+
+def needs_expansion(url: str) -> bool:
+    """
+    Check if a URL is a short link that we should try to expand.
+
+    Parameters
+    ----------
+    url : str
+        The URL.
+
+    Returns
+    -------
+    bool
+        Whether we should try to expand the URL.
+
+    """
+
+    return urlexpander.is_short(url) or 'act.gp' in url
+
+
+
+class URLCache(object):
+    """
+    Persistent short URL -> long URL cache, backed by a SQLite file so that it
+    can be shared between scripts, runs and processes. Failed expansions are also
+    stored (as negative entries) so that they are not retried before `negative_ttl`
+    seconds. When the cache grows larger than `max_entries`, the least recently
+    used entries are evicted.
+
+    Lookup statistics are kept in `counters` ('hits', 'negative_hits', 'misses',
+    'failures', 'evictions').
+    """
+
+    def __init__(self, path: str = CACHE_FILE, ttl: float = TTL, negative_ttl: float = NEGATIVE_TTL,
+                 max_entries: int = MAX_ENTRIES):
+
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.counters = Counter()
+        # The connection is created lazily for each process (sqlite connections cannot
+        # be shared between forked processes)
+        self._connection = None
+        self._pid = None
+        self._size = None
+
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(('CREATE TABLE IF NOT EXISTS urls (short TEXT PRIMARY KEY, '
+                                      'long TEXT, created REAL, accessed REAL)'))
+            self._connection.execute('CREATE INDEX IF NOT EXISTS accessed_index ON urls (accessed)')
+            self._pid = os.getpid()
+            self._size = None
+
+        return self._connection
+
+
+    def __len__(self) -> int:
+
+        return self.connection.execute('SELECT COUNT(*) FROM urls').fetchone()[0]
+
+
+    def get(self, url: str) -> tuple[bool, str]:
+        """
+        Look up `url` in the cache.
+
+        Parameters
+        ----------
+        url : str
+            The short URL.
+
+        Returns
+        -------
+        tuple[bool, str]
+            Whether a valid entry was found, and the long URL (None if the entry
+            corresponds to a failed expansion, or if nothing was found).
+
+        """
+
+        row = self.connection.execute('SELECT long, created FROM urls WHERE short = ?',
+                                      (url,)).fetchone()
+        now = time.time()
+
+        if row is not None:
+            long, created = row
+            ttl = self.ttl if long is not None else self.negative_ttl
+            if now - created <= ttl:
+                self.connection.execute('UPDATE urls SET accessed = ? WHERE short = ?', (now, url))
+                self.counters['hits' if long is not None else 'negative_hits'] += 1
+                return True, long
+
+        self.counters['misses'] += 1
+        return False, None
+
+
+    def set(self, url: str, long: str = None) -> None:
+        """
+        Add an entry to the cache. Give `long=None` to record a failed expansion.
+
+        Parameters
+        ----------
+        url : str
+            The short URL.
+        long : str, optional
+            The expanded URL, or None if the expansion failed. The default is None.
+
+        Returns
+        -------
+        None
+
+        """
+
+        self.set_many({url: long})
+
+
+    def set_many(self, mapping: dict) -> None:
+        """
+        Add all entries of `mapping` (short URL -> long URL or None) to the cache,
+        in a single transaction.
+
+        Parameters
+        ----------
+        mapping : dict
+            The entries to add.
+
+        Returns
+        -------
+        None
+
+        """
+
+        now = time.time()
+        connection = self.connection
+        connection.execute('BEGIN')
+        connection.executemany('INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?)',
+                               ((url, long, now, now) for url, long in mapping.items()))
+        connection.execute('COMMIT')
+
+        if self._size is None:
+            self._size = len(self)
+        else:
+            self._size += len(mapping)
+        if self._size > self.max_entries:
+            self.evict()
+
+
+    def evict(self) -> None:
+        """
+        Remove all expired entries, then the least recently used ones until the cache
+        is back to 90% of `max_entries`.
+
+        Returns
+        -------
+        None
+
+        """
+
+        now = time.time()
+        connection = self.connection
+        connection.execute(('DELETE FROM urls WHERE (long IS NOT NULL AND created < ?) OR '
+                            '(long IS NULL AND created < ?)'), (now - self.ttl, now - self.negative_ttl))
+        size = len(self)
+        target = int(0.9*self.max_entries)
+        if size > target:
+            connection.execute(('DELETE FROM urls WHERE short IN (SELECT short FROM urls '
+                                'ORDER BY accessed LIMIT ?)'), (size - target,))
+            self.counters['evictions'] += size - target
+        self._size = len(self)
+
+
+    def expand(self, url: str, expander = urlexpander.expand) -> str:
+        """
+        Return the expanded version of `url`, using the cache if possible and
+        `expander` otherwise. If the expansion fails, `url` is returned unchanged.
+
+        Parameters
+        ----------
+        url : str
+            The short URL.
+        expander : Callable, optional
+            The function used to expand URLs not in the cache. The default is urlexpander.expand.
+
+        Returns
+        -------
+        str
+            The expanded URL.
+
+        """
+
+        found, long = self.get(url)
+        if found:
+            return long if long is not None else url
+
+        try:
+            long = expander(url)
+        except:
+            # In this case we do nothing
+            long = None
+            self.counters['failures'] += 1
+
+        self.set(url, long)
+
+        return long if long is not None else url
+
+
+    def expand_all(self, urls: list[str], expander = urlexpander.expand) -> list[str]:
+        """
+        Return a copy of `urls` where all short URLs are expanded (see `expand`).
+
+        Parameters
+        ----------
+        urls : list[str]
+            The URLs.
+        expander : Callable, optional
+            The function used to expand URLs not in the cache. The default is urlexpander.expand.
+
+        Returns
+        -------
+        list[str]
+            The expanded URLs.
+
+        """
+
+        return [self.expand(url, expander) if needs_expansion(url) else url for url in urls]
+
+
+    def prefetch(self, urls: list[str], batch_expander) -> dict:
+        """
+        Expand all short URLs in `urls` at once. URLs not already in the cache are given
+        together to `batch_expander`, and the results are added to the cache.
+
+        Parameters
+        ----------
+        urls : list[str]
+            The URLs (may contain duplicates and URLs which do not need expansion).
+        batch_expander : Callable
+            Function taking a list of URLs and returning a dict mapping each of them to
+            its expanded version (or None if the expansion failed), e.g.
+            `async_expand.expand_urls`. URLs it leaves out (e.g. because of a timeout)
+            are considered failed, but are not cached, so that they are tried again later.
+
+        Returns
+        -------
+        dict
+            Mapping from each short URL in `urls` to its expanded version (or None if
+            the expansion failed).
+
+        """
+
+        mapping = {}
+        missing = []
+        for url in dict.fromkeys(urls):
+            if needs_expansion(url):
+                found, long = self.get(url)
+                if found:
+                    mapping[url] = long
+                else:
+                    missing.append(url)
+
+        if len(missing) > 0:
+            results = batch_expander(missing)
+            self.counters['failures'] += sum(1 for long in results.values() if long is None)
+            self.counters['failures'] += sum(1 for url in missing if url not in results)
+            self.set_many(results)
+            mapping.update(results)
+            mapping.update({url: None for url in missing if url not in results})
+
+        return mapping
+
+
+    def summary(self) -> str:
+        """
+        Return a short human-readable summary of the lookup statistics.
+        """
+
+        hits = self.counters['hits'] + self.counters['negative_hits']
+        total = hits + self.counters['misses']
+        rate = hits / total if total > 0 else 0.
+        return (f'URL cache: {hits}/{total} hits ({rate:.1%}), {self.counters["failures"]} '
+                f'failed expansions, {self.counters["evictions"]} evictions.')
+
+
+
+# Process-wide default cache
+_CACHE = None
+
+def get_cache() -> URLCache:
+    """
+    Return the default cache, shared by `process.py` and `process_brandwatch.py`.
+    """
+
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = URLCache()
+    return _CACHE
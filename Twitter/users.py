@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:12:09 2026
+
+@author: cyrilvallez
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import json_codec
+import storage
+import compression as compression_module
+
+# Columns of the lightweight tweets which are replaced by references to the user table
+USER_COLUMNS = ['username', 'follower_count', 'retweet_from']
+
+
+def table_path(output: str, output_format: str = 'json', compression: str = None) -> str:
+    """
+    Return the path of the user table of the lightweight file or folder `output`. It is
+    written next to it (not inside the folder, so that it is not mistaken for tweets).
+    """
+
+    if output[-1] == '/':
+        output = output[0:-1]
+    base = compression_module.strip_extension(output)
+    if not os.path.isdir(output) and base.endswith('.json'):
+        base = base.rsplit('.', 1)[0]
+    if output_format == 'parquet':
+        return base + '_users.parquet'
+    return compression_module.with_extension(base + '_users.json', compression)
+
+
+
+class UserTable(object):
+    """
+    Dimension table of the users appearing in lightweight tweets, so that each tweet
+    only references its author (and the author it retweets) by an int32 id. Each user
+    has a canonical follower count: the one of its first appearance as author (the
+    follower count of a user may vary slightly while a query runs). Users only
+    appearing as `retweet_from` have no follower count.
+
+    Ids are assigned in order of appearance, and are never changed once assigned, so
+    that a table can be loaded and extended with new tweets.
+    """
+
+    def __init__(self):
+
+        self.ids = {}
+        self.usernames = []
+        self.followers = []
+
+
+    def __len__(self) -> int:
+        return len(self.usernames)
+
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Load a table written by `save`.
+        """
+
+        if path.endswith('.parquet'):
+            df = pq.read_table(path).to_pandas()
+        else:
+            df = json_codec.read_json_lines(path)
+        table = cls()
+        table.usernames = df['username'].tolist()
+        table.followers = [None if storage._is_missing(x) else int(x) for x in df['follower_count']]
+        table.ids = {username: i for i, username in enumerate(table.usernames)}
+        return table
+
+
+    def _get_id(self, username: str) -> int:
+
+        user_id = self.ids.get(username)
+        if user_id is None:
+            user_id = len(self.usernames)
+            self.ids[username] = user_id
+            self.usernames.append(username)
+            self.followers.append(None)
+        return user_id
+
+
+    def encode(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Replace the `username`, `follower_count` and `retweet_from` columns of lightweight
+        tweets by the `user_id` and `retweet_from_id` columns, adding the new users to the table.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The lightweight tweets.
+
+        Returns
+        -------
+        pd.DataFrame
+            The encoded tweets.
+
+        """
+
+        df = df.copy()
+        if 'username' in df.columns:
+            user_ids = [self._get_id(username) for username in df['username']]
+            if 'follower_count' in df.columns:
+                for user_id, count in zip(user_ids, df['follower_count']):
+                    if self.followers[user_id] is None and not storage._is_missing(count):
+                        self.followers[user_id] = int(count)
+            df.insert(df.columns.get_loc('username'), 'user_id', np.array(user_ids, dtype=np.int32))
+        if 'retweet_from' in df.columns:
+            retweet_ids = [None if storage._is_missing(x) else self._get_id(x) for x in df['retweet_from']]
+            df.insert(df.columns.get_loc('retweet_from'), 'retweet_from_id', pd.array(retweet_ids, dtype='Int32'))
+
+        return df.drop(columns=[column for column in USER_COLUMNS if column in df.columns])
+
+
+    def decode(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Inverse of `encode`, with the canonical follower counts.
+        """
+
+        df = df.copy()
+        usernames = np.array(self.usernames, dtype=object)
+        followers = np.array(self.followers, dtype=object)
+        if 'user_id' in df.columns:
+            user_ids = df['user_id'].to_numpy(dtype=np.int64)
+            position = df.columns.get_loc('user_id')
+            df.insert(position, 'username', usernames[user_ids])
+            df.insert(position + 1, 'follower_count', followers[user_ids])
+        if 'retweet_from_id' in df.columns:
+            df.insert(df.columns.get_loc('retweet_from_id'), 'retweet_from',
+                      [None if pd.isna(x) else usernames[int(x)] for x in df['retweet_from_id']])
+
+        return df.drop(columns=[column for column in ['user_id', 'retweet_from_id'] if column in df.columns])
+
+
+    def to_df(self) -> pd.DataFrame:
+        """
+        Return the table as a DataFrame.
+        """
+
+        return pd.DataFrame({'user_id': np.arange(len(self), dtype=np.int32), 'username': self.usernames,
+                             'follower_count': pd.array(self.followers, dtype='Int64')})
+
+
+    def save(self, path: str) -> None:
+        """
+        Write the table to `path` (parquet if it ends with `.parquet`, otherwise json, possibly
+        compressed).
+        """
+
+        df = self.to_df()
+        if path.endswith('.parquet'):
+            schema = pa.schema([('user_id', pa.int32()), ('username', pa.string()),
+                                ('follower_count', pa.int64())])
+            pq.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False), path)
+        else:
+            with storage.JsonLinesSink(path) as sink:
+                sink.write(df)
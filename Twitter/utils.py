@@ -101,7 +101,8 @@ def split_time_interval(start_time: datetime, end_time: datetime,
 
 
 def format_filename(filename: str, time_intervals: list[datetime], 
-                    folder: str = PROJECT_FOLDER + '/Data/Twitter/', extension: str = '.json') -> list[str]:
+                    folder: str = PROJECT_FOLDER + '/Data/Twitter/', extension: str = '.json',
+                    exist_ok: bool = False) -> list[str]:
     """
     Return a list of complete paths to the files we will create.
 
@@ -116,11 +117,13 @@ def format_filename(filename: str, time_intervals: list[datetime],
         Where to store the tweets. The default is PROJECT_FOLDER + '/Data/Twitter/'.
     extension : str, optional
         The extension for saving the tweets. The default is '.json'.
+    exist_ok : bool, optional
+        Whether files may already exist (e.g. to resume a query). The default is False.
 
     Raises
     ------
     ValueError
-        If the filename is not valid or already taken.
+        If the filename is not valid or already taken (and `exist_ok` is False).
 
     Returns
     -------
@@ -144,13 +147,13 @@ def format_filename(filename: str, time_intervals: list[datetime],
             end = datetime.replace(time_intervals[i+1], tzinfo=None)
             file = folder + filename + '/' + start.isoformat(timespec='minutes').replace(':', '-') + \
                 '_to_' + end.isoformat(timespec='minutes').replace(':', '-') + extension
-            if os.path.exists(file):
+            if os.path.exists(file) and not exist_ok:
                 raise ValueError('A filename already exists with this name. Choose another one.')
             filenames.append(file)
             
     else:
         filenames.append(folder + filename + extension)
-        if os.path.exists(filenames[0]):
+        if os.path.exists(filenames[0]) and not exist_ok:
             raise ValueError('A filename already exists with this name. Choose another one.')
     
     return filenames
@@ -0,0 +1,142 @@
+import time
+import asyncio
+import threading
+from collections import Counter
+
+import pytest
+from aiohttp import web
+
+import async_expand
+import url_cache
+
+# Time taken by each shortener to answer, and timeout of the expansion (the same ratio as 6s
+# redirects with the default timeout of 10s)
+DELAY = 0.6
+TIMEOUT = 1.
+
+
+@pytest.fixture(scope='module')
+def servers():
+    """
+    Start `N_hosts` redirect servers (one host per port), all redirecting to the same final
+    host, plus a path which never answers in time, and a path redirecting many times. The
+    requests to the redirect servers are recorded in `stats`.
+    """
+
+    N_hosts = 30
+    loop = asyncio.new_event_loop()
+    runners = []
+    stats = {'active': 0, 'peak': 0, 'host_active': Counter(), 'host_peak': Counter(), 'arrivals': []}
+
+    async def final(request):
+        return web.Response(text='ok')
+
+    async def start():
+        app = web.Application()
+        app.router.add_get('/{name}', final)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        runners.append(runner)
+        final_port = site._server.sockets[0].getsockname()[1]
+
+        async def redirect(request):
+            port = request.transport.get_extra_info('sockname')[1]
+            stats['arrivals'].append((time.monotonic(), port))
+            stats['active'] += 1
+            stats['host_active'][port] += 1
+            stats['peak'] = max(stats['peak'], stats['active'])
+            stats['host_peak'][port] = max(stats['host_peak'][port], stats['host_active'][port])
+            try:
+                await asyncio.sleep(DELAY)
+            finally:
+                stats['active'] -= 1
+                stats['host_active'][port] -= 1
+            raise web.HTTPFound(f'http://127.0.0.1:{final_port}/{request.match_info["name"]}')
+
+        async def drip(request):
+            # Each answer comes before the read timeout, but the redirections take much longer
+            await asyncio.sleep(DELAY)
+            count = int(request.match_info['count'])
+            if count == 0:
+                return web.Response(text='finally')
+            raise web.HTTPFound(f'/drip/{count - 1}')
+
+        async def slow(request):
+            await asyncio.sleep(3*TIMEOUT)
+            return web.Response(text='too late')
+
+        ports = []
+        for _ in range(N_hosts):
+            app = web.Application()
+            app.router.add_route('*', '/slow', slow)
+            app.router.add_route('*', '/drip/{count}', drip)
+            app.router.add_route('*', '/{name}', redirect)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            runners.append(runner)
+            ports.append(site._server.sockets[0].getsockname()[1])
+        return final_port, ports
+
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    final_port, ports = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    yield final_port, ports, stats
+
+    async def stop():
+        for runner in runners:
+            await runner.cleanup()
+
+    asyncio.run_coroutine_threadsafe(stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def test_queued_requests_do_not_time_out(servers):
+    final_port, ports, _ = servers
+    urls = [f'http://127.0.0.1:{port}/u{i}' for port in ports for i in range(8)]
+    results = async_expand.expand_urls(urls, timeout=TIMEOUT)
+    assert results == {url: f'http://127.0.0.1:{final_port}/{url.rsplit("/", 1)[1]}' for url in urls}
+
+
+def test_timeouts_are_not_cached(servers, tmp_path, monkeypatch):
+    final_port, ports, _ = servers
+    monkeypatch.setattr(url_cache, 'needs_expansion', lambda url: True)
+    cache = url_cache.URLCache(str(tmp_path / 'cache.db'))
+    slow, fast = f'http://127.0.0.1:{ports[0]}/slow', f'http://127.0.0.1:{ports[1]}/a'
+
+    expander = lambda urls: async_expand.expand_urls(urls, timeout=TIMEOUT)
+    mapping = cache.prefetch([slow, fast], expander)
+    assert mapping == {slow: None, fast: f'http://127.0.0.1:{final_port}/a'}
+    assert cache.get(slow) == (False, None)
+    assert cache.get(fast) == (True, f'http://127.0.0.1:{final_port}/a')
+
+
+def test_busy_host_does_not_starve_others(servers):
+    final_port, ports, stats = servers
+    stats['peak'] = 0
+    stats['host_peak'].clear()
+    stats['arrivals'].clear()
+    # Most URLs are on the first host, and come first
+    busy = [f'http://127.0.0.1:{ports[0]}/b{i}' for i in range(24)]
+    others = [f'http://127.0.0.1:{port}/o{i}' for port in ports[1:5] for i in range(4)]
+    results = async_expand.expand_urls(busy + others, max_connections=20, max_per_host=4, timeout=TIMEOUT)
+    assert len(results) == len(busy) + len(others)
+
+    assert stats['peak'] == 20
+    assert max(stats['host_peak'].values()) == 4
+    # The other hosts are all resolved in the first round, while the busy host is still queued
+    start = min(arrival for arrival, _ in stats['arrivals'])
+    assert all(arrival - start < DELAY/2 for arrival, port in stats['arrivals'] if port != ports[0])
+
+
+def test_redirections_are_bounded(servers):
+    final_port, ports, _ = servers
+    url = f'http://127.0.0.1:{ports[0]}/drip/6'
+    start = time.monotonic()
+    results = async_expand.expand_urls([url], timeout=TIMEOUT, url_timeout=2*TIMEOUT)
+    # Timed out, so that it is not in the mapping
+    assert results == {}
+    assert time.monotonic() - start < 3*TIMEOUT
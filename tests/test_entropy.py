@@ -0,0 +1,38 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import entropy
+
+
+def sequential_te(X, Y):
+    # Port of `TE(X, Y)` in `Utils/entropy.jl`, summing the terms in the order of the states
+    N = len(X)
+    states = Counter((Y[t+1], Y[t], X[t]) for t in range(N - 1))
+    tot = 0.
+    for state in sorted(states):
+        state_proba = states[state] / (N - 1)
+        P_Yn_Xn = np.sum((Y == state[1]) & (X == state[2])) / N
+        P_Yn1_Yn = np.sum((Y[1:] == state[0]) & (Y[:-1] == state[1])) / (N - 1)
+        P_Yn = np.sum(Y == state[1]) / N
+        tot += state_proba * np.log2((state_proba / P_Yn_Xn) / (P_Yn1_Yn / P_Yn))
+    return tot
+
+
+@pytest.mark.parametrize('K', [1, 2, 3, 200])
+def test_transfer_entropy_matches_sequential(K):
+    rng = np.random.default_rng(K)
+    sources = rng.integers(0, K, (20, 60))
+    target = rng.integers(0, K, 60)
+    values = entropy.transfer_entropy(sources, target)
+    assert values.shape == (20,)
+    for source, value in zip(sources, values):
+        assert value == sequential_te(source, target)
+
+
+def test_transfer_entropy_checks_alphabet():
+    with pytest.raises(ValueError):
+        entropy.transfer_entropy(np.array([0, 1, 2]), np.array([0, 1, 1]), alphabet=2)
+    with pytest.raises(ValueError):
+        entropy.transfer_entropy(np.array([-1, 0, 1]), np.array([0, 1, 1]))
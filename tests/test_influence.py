@@ -0,0 +1,57 @@
+import functools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import influence
+import timeseries
+
+
+def lagged_correlation(x, y, lag=1):
+    return float(np.corrcoef(x[:-lag], y[lag:])[0, 1])
+
+
+@pytest.fixture(scope='module')
+def tweets():
+    rng = np.random.default_rng(0)
+    n = 2000
+    df = pd.DataFrame({'created_at': pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 86400, n), unit='s'),
+                       'actor': rng.integers(0, 30, n).astype(str), 'action': rng.choice(['RT', 'T'], n),
+                       'partition': rng.choice(['a', 'b'], n)})
+    # An actor with the same count in every time bin, whose standardized series is zero
+    constant = pd.DataFrame({'created_at': pd.date_range('2022-01-01 00:01', periods=12, freq='2h'),
+                             'actor': 'constant', 'action': 'T', 'partition': 'a'})
+    return pd.concat([df, constant], ignore_index=True)
+
+
+def test_sparse_active_matches_dense(tweets):
+    sparse = timeseries.observe_sparse(tweets, '2h')
+    dense = sparse.to_dense()
+    for m in range(len(sparse)):
+        assert np.array_equal(sparse.active(m), np.any(dense.values[m] != 0, axis=1))
+    assert not sparse.active(0)[sparse.actors[0].index('constant')].any()
+
+
+def test_sparse_graphs_match_dense(tweets):
+    sparse = timeseries.observe_sparse(tweets, '2h')
+    measure = functools.partial(lagged_correlation, lag=1)
+    from_sparse = influence.influence_graphs(sparse, measure, workers=2, block_size=7)
+    from_dense = influence.influence_graphs(sparse.to_dense(), measure, workers=2, block_size=7)
+    for graphs, expected in zip(from_sparse, from_dense):
+        np.testing.assert_array_equal(graphs, expected)
+
+
+def test_checkpoint_rejects_other_values(tweets, tmp_path):
+    sparse = timeseries.observe_sparse(tweets, '2h')
+    measure = functools.partial(lagged_correlation, lag=1)
+    checkpoint = str(tmp_path / 'checkpoint')
+    graphs = influence.influence_graphs(sparse, measure, workers=2, block_size=7, checkpoint=checkpoint)
+    resumed = influence.influence_graphs(sparse, measure, workers=2, block_size=7, checkpoint=checkpoint)
+    for graph, expected in zip(resumed, graphs):
+        np.testing.assert_array_equal(graph, expected)
+
+    # Same partitions, actors, times and actions, but other counts
+    sparse.counts = [counts + 1 for counts in sparse.counts]
+    with pytest.raises(ValueError):
+        influence.influence_graphs(sparse, measure, workers=2, block_size=7, checkpoint=checkpoint)
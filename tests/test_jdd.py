@@ -0,0 +1,125 @@
+import math
+
+import numpy as np
+import pytest
+
+import jdd
+
+
+def julia_jdd(source, target, B=10, D=5, tau=1):
+    # Line by line transcription of `jdd(source, target; distance_metric=SqEuclidean(), B, D, τ)`
+    # in CausalityTools 1.4.1 (with 1-based indices shifted by one)
+
+    def genembed(x):
+        # Lags 0, -τ, ..., -(D-1)τ
+        return np.array([[x[t - d*tau] for d in range(D)] for t in range((D-1)*tau, len(x))])
+
+    def pairwise(M):
+        # Distances.jl: upper triangle from the Gram matrix, clipped at 0, then mirrored
+        sa2 = np.sum(M**2, axis=1)
+        r = M @ M.T
+        n = len(M)
+        out = np.zeros((n, n))
+        for j in range(n):
+            for i in range(j):
+                out[i, j] = max(sa2[i] + sa2[j] - 2*r[i, j], 0.)
+                out[j, i] = out[i, j]
+        return out
+
+    def normalise_minmax(x, vmin, vmax):
+        return 0. if x == 0 else (x - vmin) / (vmax - vmin)
+
+    Dx, Dy = pairwise(genembed(source)), pairwise(genembed(target))
+    # Julia arrays are flattened in column-major order
+    Dx, Dy = Dx.ravel(order='F'), Dy.ravel(order='F')
+    Dx_min, Dx_max = Dx[Dx > 0].min(), Dx[Dx > 0].max()
+    Dy_min, Dy_max = Dy[Dy > 0].min(), Dy[Dy > 0].max()
+    Dx_norm, Dy_norm = np.zeros(len(Dx)), np.zeros(len(Dy))
+    for i in range(np.sum(Dx > 0)):
+        Dx_norm[i] = normalise_minmax(Dx[i], Dx_min, Dx_max)
+    for i in range(np.sum(Dy > 0)):
+        Dy_norm[i] = normalise_minmax(Dy[i], Dy_min, Dy_max)
+
+    mins = [2.] * (2*B)
+    for k, b in enumerate(range(1, 2*B + 1)):
+        bmin, bmax = (b-1) / (2*B), b / (2*B)
+        idxs = [i for i in range(len(Dx_norm)) if bmin <= Dx_norm[i] < bmax]
+        if len(idxs) > 0:
+            mins[k] = min(Dy_norm[i] for i in idxs)
+
+    return np.array([mins[B + i - 1] - mins[B - i] for i in range(1, B + 1)])
+
+
+def one_sample_t_statistic(x, mu0=0.):
+    return (np.mean(x) - mu0) / (np.std(x, ddof=1) / math.sqrt(len(x)))
+
+
+@pytest.fixture(scope='module')
+def series():
+    rng = np.random.default_rng(0)
+    # Small counts, with repeated embedding points (and exact distances)
+    counts = rng.poisson(0.8, (6, 40)).astype(np.float64)
+    # Standardized series, as in the influence graphs
+    normal = rng.normal(size=(6, 40)).cumsum(axis=1)
+    return counts, (normal - normal.mean(axis=1, keepdims=True)) / normal.std(axis=1, ddof=1, keepdims=True)
+
+
+def test_embed_matches_genembed():
+    x = np.arange(10.)
+    embedding = jdd.embed(x, D=3, tau=2)
+    assert embedding.shape == (1, 6, 3)
+    np.testing.assert_array_equal(embedding[0, 0], [4., 2., 0.])
+    np.testing.assert_array_equal(embedding[0, -1], [9., 7., 5.])
+
+
+def test_normalized_distances_only_normalizes_the_first_positive_count():
+    x = np.array([0., 1., 3., 7., 2.])
+    distances = jdd.normalized_distances(jdd.embed(x, D=1))[0]
+    # 5 distinct points: 20 positive distances, so that the last 5 entries are set to 0
+    assert distances.shape == (25,)
+    np.testing.assert_array_equal(distances[20:], 0.)
+    assert distances.max() == 1.
+    assert np.isnan(jdd.normalized_distances(jdd.embed(np.ones(8), D=2))).all()
+
+
+def test_deviations_match_julia_transcription(series):
+    measure = jdd.JointDistanceDistribution()
+    for values in series:
+        targets = measure.prepare(values)
+        for source in values[:3]:
+            deviations = measure.deviations(measure.prepare(source)[0], targets)
+            expected = np.stack([julia_jdd(source, target) for target in values])
+            np.testing.assert_allclose(deviations, expected, rtol=0, atol=1e-12)
+
+
+def test_pvalues_match_t_test(series):
+    measure = jdd.JointDistanceDistribution()
+    counts, _ = series
+    for source in counts[:3]:
+        for target in counts:
+            t = one_sample_t_statistic(julia_jdd(source, target))
+            assert measure(source, target) == pytest.approx(float(jdd._student_sf(np.array([t]), 9)[0]),
+                                                            rel=1e-12)
+
+
+def test_t_test_pvalue_known_values():
+    # 95% quantile of the Student distribution with 9 degrees of freedom
+    assert jdd._student_sf(np.array([1.833112932653]), 9)[0] == pytest.approx(0.05, rel=1e-9)
+    assert jdd._student_sf(np.array([0.]), 4)[0] == 0.5
+    pvalues = jdd.t_test_pvalue(np.array([[1., 1., 1.], [-1., -1., -1.], [1., np.nan, 2.]]))
+    assert pvalues[0] == 0. and pvalues[1] == 1. and np.isnan(pvalues[2])
+
+
+def test_batch_matches_single_pairs(series):
+    measure = jdd.JointDistanceDistribution()
+    for values in series:
+        targets = measure.prepare(values)
+        batched = measure.batch(values[:3], targets)
+        assert batched.shape == (3, len(values))
+        for i, source in enumerate(values[:3]):
+            np.testing.assert_array_equal(measure.batch(source, targets), batched[i])
+            for j, target in enumerate(values):
+                assert measure(source, target) == batched[i, j] or np.isnan(batched[i, j])
+
+    thresholded = jdd.JointDistanceDistribution(threshold=0.001).batch(series[1][0], measure.prepare(series[1]))
+    assert set(np.unique(thresholded)) <= {0., 1.}
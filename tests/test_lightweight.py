@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import lightweight
+import users
+
+
+def test_effective_categories_matches_row_wise():
+    df = pd.DataFrame({
+        'text': ['RT @alice: hello', 'RT @bob hi', 'quoting', 'quoting again', 'reply', 'plain',
+                 'RT @carol:RT @dave: nested'],
+        'category': [['retweeted'], ['retweeted'], ['quoted'], ['quoted', 'replied_to'], ['replied_to'],
+                     [], ['retweeted']],
+        'original_author': [['alice'], ['bob'], ['erin'], np.nan, ['frank'], np.nan, ['carol']],
+        })
+    lightweight.benchmark_effective_category(df, repeats=1)
+
+
+def test_effective_categories_without_any_author():
+    # In a chunk without quotes, retweets or replies, `original_author` is all NaN (float64)
+    df = pd.DataFrame({
+        'text': ['a tweet', 'RT @alice: hello', 'quoting'],
+        'category': [[], [], ['quoted']],
+        'original_author': [np.nan, np.nan, np.nan],
+        })
+    assert df['original_author'].dtype == np.float64
+    lightweight.benchmark_effective_category(df, repeats=1)
+    result = lightweight.effective_categories(df)
+    assert pd.isna(result[0]) and result[1] == 'alice' and result[2] == -1
+
+
+
+def test_match_news_without_any_domain():
+    index = pd.DataFrame({'class': ['T'], 'score': [100.]}, index=pd.Index(['nytimes.com'], name='domain'))
+    matches = lightweight.match_news(pd.Series([np.nan, np.nan]), index)
+    assert len(matches) == 0
+    matches = lightweight.match_news(pd.Series([np.nan, ['edition.nytimes.com']]), index)
+    assert matches.loc[1, 'news_class'] == 'T'
+
+
+def test_user_table_saved_once_before_recording(tmp_path, monkeypatch):
+    folder = tmp_path / 'processed'
+    folder.mkdir()
+    for name in ['a.json', 'b.json', 'c.json']:
+        (folder / name).write_text(name)
+
+    def fake_reduce(path, attributes):
+        if path.endswith('c.json'):
+            raise RuntimeError('corrupted file')
+        name = os.path.basename(path)
+        return pd.DataFrame({'id': [name], 'username': [f'user_{name}'], 'follower_count': [1],
+                             'retweet_from': [None]})
+
+    # The news table is part of the fingerprint of the manifest
+    news_table = tmp_path / 'news.csv'
+    news_table.write_text('domain,class,score\nnytimes.com,T,100\n')
+    monkeypatch.setattr(lightweight, 'NEWS_TABLE', str(news_table))
+
+    saves = []
+    monkeypatch.setattr(lightweight, 'reduce', fake_reduce)
+    monkeypatch.setattr(users.UserTable, 'save', lambda self, path: saves.append(list(self.usernames)))
+    with pytest.raises(RuntimeError):
+        lightweight.reduce_and_save(str(folder), incremental=True, user_table=True)
+
+    # Saved once, with the users of the files reduced before the failure, which are recorded
+    assert saves == [['user_a.json', 'user_b.json']]
+    record, key = lightweight._incremental_manifest(str(folder) + '_lightweight', lightweight.LIGHTWEIGHT_ATTRIBUTES,
+                                                    'json', None, True)
+    filenames = [str(folder / name) for name in ['a.json', 'b.json', 'c.json']]
+    outputs = [[str(tmp_path / 'processed_lightweight' / name)] for name in ['a.json', 'b.json', 'c.json']]
+    assert record.outdated(filenames, outputs, key) == [2]
+
+
+def test_reduce_df_does_not_extend_attributes(monkeypatch):
+    index = pd.DataFrame({'class': ['T'], 'score': [100.]}, index=pd.Index(['nytimes.com'], name='domain'))
+    monkeypatch.setattr(lightweight, 'load_news_index', lambda: index)
+    df = pd.DataFrame({
+        'text': ['a tweet', 'RT @alice: hello'],
+        'category': [[], ['retweeted']],
+        'original_author': [np.nan, ['alice']],
+        'created_at': ['2021-10-01', '2021-10-02'],
+        'username': ['bob', 'carol'],
+        'follower_count': [1, 2],
+        'sentiment': ['neutral', 'positive'],
+        'domain': [['nytimes.com'], np.nan],
+        })
+    expected = list(lightweight.LIGHTWEIGHT_ATTRIBUTES)
+    for _ in range(2):
+        reduced = lightweight.reduce_df(df.copy())
+        assert list(reduced.columns) == expected + ['retweet_from', 'effective_category', 'news_class', 'news_score']
+        assert len(reduced) == 1
+    assert lightweight.LIGHTWEIGHT_ATTRIBUTES == expected
@@ -0,0 +1,120 @@
+import json
+
+import pandas as pd
+import pytest
+
+import dedup
+import json_codec
+import lightweight
+import process
+
+
+NEWS_INDEX = pd.DataFrame({'class': ['T', 'U'], 'score': [100., 20.]},
+                          index=pd.Index(['nytimes.com', 'breitbart.com'], name='domain'))
+
+
+@pytest.fixture(autouse=True)
+def news_index(monkeypatch):
+    monkeypatch.setattr(lightweight, 'load_news_index', lambda *args, **kwargs: NEWS_INDEX)
+
+
+def raw_tweet(i: int, urls: list[str] = None, retweet: bool = False) -> dict:
+    tweet = {'id': str(10**18 + i), 'author_id': '1', 'created_at': f'2021-10-20T0{i % 10}:00:00.000Z',
+             'lang': 'en', 'text': ('RT @orig: ' if retweet else '') + 'hello world',
+             'author': {'username': f'user{i}', 'public_metrics': {'followers_count': i, 'tweet_count': 1}},
+             'entities': {'hashtags': [{'tag': 'cop26'}]}}
+    if urls is not None:
+        tweet['entities']['urls'] = [{'expanded_url': url} for url in urls]
+    if retweet:
+        tweet['referenced_tweets'] = [{'type': 'retweeted', 'text': 'hello world', 'author': {'username': 'orig'},
+                                       'entities': tweet['entities']}]
+    return tweet
+
+
+def write_raw(path, tweets: list[dict]) -> str:
+    with open(path, 'w') as file:
+        file.write(json.dumps({'query': 'test'}) + '\n\n')
+        for tweet in tweets:
+            file.write(json.dumps(tweet) + '\n')
+    return str(path)
+
+
+def test_fused_chunk_without_urls(tmp_path):
+    filename = write_raw(tmp_path / 'raw.json', [raw_tweet(i) for i in range(10)])
+    chunks = list(process.iter_lightweight(filename, try_expand=False, keep_processed=True))
+    processed = [dic for dics, _ in chunks for dic in dics]
+    reduced = [df for _, df in chunks if df is not None]
+    assert len(processed) == 10
+    assert sum(len(df) for df in reduced) == 0
+
+
+def test_fused_chunk_without_quotes(tmp_path):
+    # No quote, retweet or reply, so that `original_author` is all NaN
+    tweets = [raw_tweet(i, urls=['https://www.nytimes.com/a']) for i in range(10)]
+    filename = write_raw(tmp_path / 'raw.json', tweets)
+    chunks = list(process.iter_lightweight(filename, try_expand=False))
+    reduced = pd.concat([df for _, df in chunks if df is not None])
+    assert len(reduced) == 10
+    assert (reduced['news_class'] == 'T').all()
+    assert (reduced['effective_category'] == 'tweet').all()
+
+
+def test_fused_matches_two_pass(tmp_path):
+    tweets = [raw_tweet(i, urls=['https://breitbart.com/x'] if i % 3 == 0 else None, retweet=i % 2 == 0)
+              for i in range(30)]
+    filename = write_raw(tmp_path / 'raw.json', tweets)
+    fused = pd.concat([df for _, df in process.iter_lightweight(filename, try_expand=False) if df is not None])
+    two_pass = lightweight.reduce_df(process.process_tweets(filename, try_expand=False))
+    pd.testing.assert_frame_equal(fused.reset_index(drop=True), two_pass.reset_index(drop=True),
+                                  check_dtype=False)
+
+
+def test_parallel_dedup_drops_tweets_claimed_by_other_shards(tmp_path):
+    # Both files are split into many shards, and the second one overlaps the first
+    first = [raw_tweet(i, urls=['https://www.nytimes.com/a']) for i in range(20)]
+    first.append(raw_tweet(3, urls=['https://www.nytimes.com/a']))
+    second = [raw_tweet(i, urls=['https://www.nytimes.com/a']) for i in range(10, 30)]
+    filenames = [write_raw(tmp_path / 'first.json', first), write_raw(tmp_path / 'second.json', second)]
+    new_filenames = [str(tmp_path / 'first_processed.json'), str(tmp_path / 'second_processed.json')]
+    lightweight_filenames = [str(tmp_path / 'first_lightweight.json'), str(tmp_path / 'second_lightweight.json')]
+
+    index = dedup.TweetIndex(str(tmp_path / 'index.npz'))
+    index.save()
+    process.process_and_save_parallel(filenames, new_filenames, try_expand=False, workers=2, shard_size=1000,
+                                      lightweight_filenames=lightweight_filenames, attributes=['id', 'username'],
+                                      callback=lambda i: index.merge(), index=index)
+
+    expected = [list(range(20)), list(range(20, 30))]
+    for outputs in (new_filenames, lightweight_filenames):
+        for filename, ids in zip(outputs, expected):
+            df = json_codec.read_json_lines(filename)
+            assert [int(tweet_id) - 10**18 for tweet_id in df['id']] == ids
+    assert len(index) == 30
+
+
+def test_bounded_imap_limits_tasks_in_flight():
+
+    class Result(object):
+
+        def __init__(self, pool, value):
+            self.pool, self.value = pool, value
+
+        def get(self):
+            self.pool.in_flight -= 1
+            return self.value
+
+    class Pool(object):
+        # Runs tasks immediately, counting the results submitted and not yet retrieved
+        in_flight, most = 0, 0
+
+        def apply_async(self, func, args):
+            self.in_flight += 1
+            self.most = max(self.most, self.in_flight)
+            return Result(self, func(*args))
+
+    pool = Pool()
+    results = process._bounded_imap(pool, lambda x: x**2, range(20), 4)
+    assert [next(results) for _ in range(3)] == [0, 1, 4]
+    assert pool.in_flight == 4
+    assert list(results) == [x**2 for x in range(3, 20)]
+    assert pool.most == 4 and pool.in_flight == 0
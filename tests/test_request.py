@@ -0,0 +1,98 @@
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+import requests
+
+import fetcher
+import request
+from checkpoint import Checkpoint
+
+# Pages of the fake search endpoint: pagination token -> (tweet ids, next token)
+PAGES = {None: ([0, 1], 't1'), 't1': ([2, 3], 't2'), 't2': ([4, 5], None)}
+
+
+@pytest.fixture
+def search_server(monkeypatch):
+    """
+    Serve the `PAGES` of a fake "search all" endpoint, recording the parameters of each
+    request. Tokens in `server.failing` are answered once with an error.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            params = {key: values[0] for key, values in parse_qs(urlsplit(self.path).query).items()}
+            server.received.append(params)
+            token = params.get('next_token')
+            if token in server.failing:
+                server.failing.remove(token)
+                self.send_response(400)
+                self.end_headers()
+                return
+            ids, next_token = PAGES[token]
+            page = {'data': [{'id': str(i), 'text': f'tweet {i}', 'author_id': '1'} for i in ids],
+                    'includes': {'users': [{'id': '1', 'username': 'someone'}]},
+                    'meta': {'result_count': len(ids)}}
+            if next_token is not None:
+                page['meta']['next_token'] = next_token
+            body = json.dumps(page).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.received = []
+    server.failing = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(request, 'SEARCH_URL', f'http://127.0.0.1:{server.server_address[1]}/2/tweets/search/all')
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get_client():
+    # A fast token bucket, so that pages are not spaced by the rate limit
+    return fetcher.PooledTwarc2(bucket=fetcher.TokenBucket(rate=1000, capacity=1000), bearer_token='token')
+
+
+START = datetime(2021, 10, 1, tzinfo=timezone.utc)
+END = datetime(2021, 10, 5, tzinfo=timezone.utc)
+
+
+def test_search_pages_follows_next_token(search_server):
+    pages = list(request.search_pages(get_client(), 'cop26', START, END, 2))
+    assert [[tweet['id'] for tweet in page['data']] for page in pages] == [['0', '1'], ['2', '3'], ['4', '5']]
+    first = search_server.received[0]
+    assert first['query'] == 'cop26' and first['max_results'] == '2'
+    assert first['start_time'] == '2021-10-01T00:00:00+00:00' and 'next_token' not in first
+    assert [params.get('next_token') for params in search_server.received] == [None, 't1', 't2']
+
+
+def test_query_resumes_from_checkpoint(search_server, tmp_path):
+    filename = str(tmp_path / 'interval.json')
+    checkpoint = Checkpoint(str(tmp_path / '.checkpoint.json'), {'query': 'cop26'})
+    search_server.failing.add('t2')
+    with pytest.raises(requests.exceptions.HTTPError):
+        request.query_API(filename, 'cop26', START, END, 2, 10, checkpoint=checkpoint, client=get_client())
+    assert checkpoint.state(filename)['next_token'] == 't2'
+    assert checkpoint.state(filename)['pages'] == 2
+
+    # Resume in the middle of the interval, from the checkpoint on disk
+    search_server.received.clear()
+    checkpoint = Checkpoint(str(tmp_path / '.checkpoint.json'), {'query': 'cop26'})
+    request.query_API(filename, 'cop26', START, END, 2, 10, checkpoint=checkpoint, client=get_client())
+    assert [params.get('next_token') for params in search_server.received] == ['t2']
+    with open(filename) as file:
+        tweets = [json.loads(line) for line in file]
+    assert [tweet['id'] for tweet in tweets] == [str(i) for i in range(6)]
+    assert checkpoint.state(filename)['done'] and checkpoint.state(filename)['tweets'] == 6
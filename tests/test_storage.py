@@ -0,0 +1,20 @@
+import pandas as pd
+import pyarrow.parquet as pq
+
+import storage
+
+
+def test_parquet_sink_sorts_and_partitions_by_day(tmp_path):
+    df = pd.DataFrame({
+        'id': ['3', '1', '2', '4'],
+        'created_at': ['2021-10-21T10:00:00.000Z', '2021-10-20T12:00:00.000Z',
+                       '2021-10-20T08:00:00.000Z', '2021-10-21T01:00:00.000Z'],
+        'lang': ['en', 'fr', 'en', 'en'],
+        })
+    with storage.ParquetSink(str(tmp_path), 'tweets') as sink:
+        sink.write(df)
+
+    first = pq.read_table(tmp_path / 'day=2021-10-20' / 'tweets.parquet').to_pandas()
+    second = pq.read_table(tmp_path / 'day=2021-10-21' / 'tweets.parquet').to_pandas()
+    assert first['id'].tolist() == ['2', '1']
+    assert second['id'].tolist() == ['4', '3']
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import surrogates
+
+
+def discrete_series(rng):
+    source = rng.integers(0, 3, 60)
+    # Targets following the source with more or less noise, so that some edges are accepted
+    keep = rng.random((30, 60)) < np.linspace(0, 1, 30)[:, None]
+    return source, np.where(keep, np.roll(source, 1), rng.integers(0, 3, (30, 60)))
+
+
+def continuous_series(rng):
+    source = np.sin(np.arange(200) / 5) + 0.3*rng.normal(size=200)
+    targets = np.roll(source, 1) + np.linspace(0, 3, 30)[:, None]*rng.normal(size=(30, 200))
+    # Standardized series, as given to the joint distance distribution
+    return (source - source.mean()) / source.std(), (targets - targets.mean(axis=1, keepdims=True)) / \
+        targets.std(axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize('test, series', [(surrogates.simple_te(Nsurro=25), discrete_series),
+                                          (surrogates.joint_distance_distribution(threshold=0.01, Nsurro=25),
+                                           continuous_series)])
+def test_stepped_limit_matches_full_evaluation(test, series):
+    source, targets = series(np.random.default_rng(0))
+    full = surrogates.SurrogateTest(test.measure, test.threshold, test.comparator,
+                                    np.max if test.limit == 'max' else np.min, test.scale, test.Nsurro, test.seed)
+    prepared = test.prepare(targets)
+    expected = full.batch(source, prepared)
+    # Some edges rejected by the threshold, some by the surrogates, and some accepted
+    candidates = full._passes(test.measure.batch(source, prepared), test.threshold)
+    assert 0 < expected.sum() < candidates.sum() < len(targets)
+    for step in (1, 7, 25, 100):
+        test.step = step
+        np.testing.assert_array_equal(test.batch(source, prepared), expected)
+
+
+def test_permutation_bank_is_reproducible():
+    bank = surrogates.permutation_bank(50, 20, seed=3)
+    assert bank.shape == (20, 50)
+    assert all(sorted(permutation) == list(range(50)) for permutation in bank)
+    # Generated again (not from the cache) with the same seed
+    surrogates.permutation_bank.cache_clear()
+    np.testing.assert_array_equal(surrogates.permutation_bank(50, 20, seed=3), bank)
+    assert not np.array_equal(surrogates.permutation_bank(50, 20, seed=4), bank)
+    with pytest.raises(ValueError):
+        bank[0, 0] = 1